@@ -0,0 +1,61 @@
+"""Benchmark repository tree rendering on synthetic monorepo listings.
+
+Compares the compact trie rendering against the plain newline-joined path
+list it replaces, for trees of 1k to 500k paths.
+
+Usage: python benchmarks/bench_repo_tree.py [--budget TOKENS]
+"""
+
+import argparse
+import random
+import time
+from typing import List
+
+from storymachine.repo_tree import DEFAULT_TOKEN_BUDGET, estimate_tokens, render_tree
+
+SIZES = [1_000, 10_000, 100_000, 500_000]
+EXTENSIONS = [".py", ".ts", ".tsx", ".go", ".md", ".json", ".yaml", ".png"]
+
+
+def synthetic_paths(count: int, seed: int = 0) -> List[str]:
+    """Generate a monorepo-like listing: services with nested modules.
+
+    Directories hold about 20 files each, similar to large real repositories.
+    """
+    rng = random.Random(seed)
+    services = max(count // 2_000, 5)
+    paths = []
+    for i in range(count):
+        service = f"services/svc{rng.randrange(services)}"
+        depth = rng.randrange(1, 4)
+        module = "/".join(f"mod{rng.randrange(4)}" for _ in range(depth))
+        ext = rng.choice(EXTENSIONS)
+        paths.append(f"{service}/src/{module}/file{i}{ext}")
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=int, default=DEFAULT_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    print(
+        f"{'paths':>8} {'joined tokens':>14} {'tree tokens':>12} "
+        f"{'tree lines':>11} {'render ms':>10}"
+    )
+    for size in SIZES:
+        paths = synthetic_paths(size)
+        joined_tokens = estimate_tokens("\n".join(paths))
+
+        start = time.perf_counter()
+        text = render_tree(paths, token_budget=args.budget)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        print(
+            f"{size:>8} {joined_tokens:>14} {estimate_tokens(text):>12} "
+            f"{text.count(chr(10)) + 1:>11} {elapsed_ms:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,29 @@
 """Individual workflow activities for StoryMachine."""
 
-import itertools
+import asyncio
 import json
-import sys
-import time
-from contextlib import contextmanager
-from threading import Event, Thread
-from typing import List
-
-from openai.types.responses import (
-    ToolParam,
-    ResponseOutputMessage,
-)
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
 
 from .ai import (
     get_prompt,
-    call_ai_api,
-    call_openai_api,
+    call_ai_api_async,
     extract_reasoning_summaries,
     display_reasoning_summaries,
 )
 from .types import FeedbackResponse, Story, WorkflowInput, FeedbackStatus
 from .logging import get_logger
+from . import metrics
 
+if TYPE_CHECKING:
+    from openai.types.responses import ToolParam
 
-@contextmanager
-def spinner(text="Loading", delay=0.1, stream=sys.stderr):
-    """Display a spinner while executing code."""
-    stop = Event()
-
-    def run():
-        stream.write("\x1b[?25l")  # hide cursor
-        for c in itertools.cycle("|/-\\"):
-            if stop.is_set():
-                break
-            stream.write(f"\r{c} {text}")
-            stream.flush()
-            time.sleep(delay)
-
-    t = Thread(target=run, daemon=True)
-    t.start()
-    try:
-        yield
-    finally:
-        stop.set()
-        t.join()
-        stream.write("\r\x1b[2K\x1b[?25h")  # clear line + show cursor
-        stream.flush()
+    from .repo_cache import RepoContextCache
 
 
-CREATE_STORIES_TOOL: ToolParam = {
+CREATE_STORIES_TOOL: "ToolParam" = {
     "type": "function",
     "name": "create_stories",
     "description": "Create a list of user stories",
@@ -89,6 +63,13 @@ CREATE_STORIES_TOOL: ToolParam = {
 
 def parse_stories_from_response(response) -> List[Story]:
     """Parse stories from AI response."""
+    stories = _parse_stories(response)
+    if not stories:
+        metrics.PARSE_FAILURES.inc(provider=metrics.model_labels()["provider"])
+    return stories
+
+
+def _parse_stories(response) -> List[Story]:
     logger = get_logger()
 
     # If response is a string (from ZhipuAI), parse JSON from it
@@ -128,7 +109,7 @@ def parse_text_from_response(response) -> str:
     if hasattr(response, 'output'):
         text_content = ""
         for item in response.output:
-            if isinstance(item, ResponseOutputMessage):
+            if getattr(item, "type", None) == "message":
                 # ResponseOutputMessage has a 'content' field that contains text parts
                 for content_part in item.content:
                     if hasattr(content_part, "text"):
@@ -143,16 +124,55 @@ def parse_text_from_response(response) -> str:
     return str(response)
 
 
-async def get_codebase_context(workflow_input: WorkflowInput) -> str:
-    """Get codebase context questions based on PRD and tech spec."""
-    from ask_github import ask, list_tree
+async def answer_repo_questions_locally(
+    root: Path, file_paths: List[str], repo_structure: str, questions: str
+) -> str:
+    """Answer codebase questions from files read out of a local checkout."""
+    from .local_repo import MAX_EXCERPT_FILES, read_excerpts, select_files
 
-    from .config import Settings
+    logger = get_logger()
+    selected = select_files(file_paths, questions, MAX_EXCERPT_FILES)
+    repo_files = await asyncio.to_thread(read_excerpts, root, selected)
+    logger.info(
+        "local_repo_files_read", file_count=len(selected), files_length=len(repo_files)
+    )
+
+    prompt = get_prompt(
+        "repo_answers.md",
+        questions=questions,
+        repo_structure=repo_structure,
+        repo_files=repo_files,
+    )
+    return parse_text_from_response(await call_ai_api_async(prompt))
+
+
+async def get_codebase_context(workflow_input: WorkflowInput) -> str:
+    """Get codebase context questions based on PRD and tech spec.
+
+    Git, file system and ask-github calls are blocking and run in worker
+    threads; model calls are awaited directly.
+    """
+    from .session import get_settings
+    from .deadline import clamp
+    from .local_repo import list_local_tree, local_repo_path, read_head
+    from .relevance import document_terms, focus_note, rank_paths
+    from .repo_questions import (
+        NO_ANSWER,
+        answer_questions,
+        merge_answers,
+        run_blocking,
+        split_questions,
+    )
+    from .repo_cache import RepoContextCache, resolve_commit_sha
+    from .repo_tree import render_tree
 
     logger = get_logger()
-    settings = Settings()  # pyright: ignore[reportCallIssue]
+    settings = get_settings()
     logger.info("codebase_context_started")
 
+    # A local checkout is walked and read directly, without network access
+    local_root = local_repo_path(workflow_input.repo_url)
+
     # Step 1: Determine which token to use based on repo URL
     token = None
     if "gitlab" in workflow_input.repo_url.lower():
@@ -160,12 +180,61 @@ async def get_codebase_context(workflow_input: WorkflowInput) -> str:
     else:
         token = settings.github_token
 
-    # Step 2: Get repository tree structure (only files/blobs)
-    tree = list_tree(workflow_input.repo_url, token=token)
+    # Tree and context are cached per commit; without a SHA nothing is reused.
+    # Local working trees may be dirty, so they are never cached.
+    cache = RepoContextCache(
+        Path(settings.repo_cache_dir), settings.repo_cache_max_entries
+    )
+    commit_sha = (
+        None
+        if local_root
+        else await asyncio.to_thread(resolve_commit_sha, workflow_input.repo_url, token)
+    )
+    cache_sha = None if workflow_input.refresh_repo_context else commit_sha
+
+    # Step 2: Get repository tree structure (only files/blobs). Cache entries
+    # can be large, so they are read and written off the event loop too
+    tree = (
+        await asyncio.to_thread(cache.get_tree, workflow_input.repo_url, cache_sha)
+        if cache_sha
+        else None
+    )
+    if tree is None and local_root:
+        tree = await asyncio.to_thread(list_local_tree, local_root)
+    elif tree is None:
+        from ask_github import list_tree
+
+        tree = await asyncio.to_thread(list_tree, workflow_input.repo_url, token=token)
+        if commit_sha:
+            await asyncio.to_thread(
+                cache.put_tree, workflow_input.repo_url, commit_sha, tree
+            )
     file_paths = [item["path"] for item in tree if item.get("type") == "blob"]
-    repo_structure = "\n".join(file_paths)
+
+    # Keep only the files that share terms with the PRD and tech spec; if
+    # nothing matches (e.g. no English terms), fall back to the whole tree
+    relevant_paths: List[str] = []
+    if settings.repo_relevant_files > 0:
+        # Ranking may read file heads from disk
+        ranked = await asyncio.to_thread(
+            rank_paths,
+            file_paths,
+            document_terms(
+                workflow_input.prd_content, workflow_input.tech_spec_content
+            ),
+            read_head=partial(read_head, local_root) if local_root else None,
+        )
+        relevant_paths = ranked[: settings.repo_relevant_files]
+    repo_structure = await asyncio.to_thread(
+        render_tree, relevant_paths or file_paths, settings.repo_tree_token_budget
+    )
     logger.info(
-        "repo_tree_retrieved", total_items=len(tree), file_count=len(file_paths)
+        "repo_tree_retrieved",
+        total_items=len(tree),
+        file_count=len(file_paths),
+        relevant_file_count=len(relevant_paths),
+        local=bool(local_root),
+        structure_length=len(repo_structure),
     )
 
     # Step 3: Generate questions based on PRD, tech spec, and repo structure
@@ -176,40 +245,247 @@ async def get_codebase_context(workflow_input: WorkflowInput) -> str:
         repo_structure=repo_structure,
     )
 
-    response = call_ai_api(prompt)
+    max_chars = settings.repo_context_max_chars
+    if cache_sha:
+        cached_digest = (
+            await asyncio.to_thread(
+                cache.get_digest, workflow_input.repo_url, cache_sha, prompt, max_chars
+            )
+            if max_chars > 0
+            else None
+        )
+        if cached_digest is not None:
+            metrics.CACHE_HITS.inc(cache="repo_context")
+            logger.info(
+                "codebase_digest_cache_hit",
+                commit_sha=cache_sha,
+                digest_length=len(cached_digest),
+            )
+            return cached_digest
+
+        cached_context = await asyncio.to_thread(
+            cache.get_context, workflow_input.repo_url, cache_sha, prompt
+        )
+        if cached_context is not None:
+            metrics.CACHE_HITS.inc(cache="repo_context")
+            logger.info(
+                "codebase_context_cache_hit",
+                commit_sha=cache_sha,
+                response_length=len(cached_context),
+            )
+            return await _digest_repo_context(
+                cached_context,
+                max_chars,
+                cache,
+                workflow_input.repo_url,
+                cache_sha,
+                prompt,
+            )
+        metrics.CACHE_MISSES.inc(cache="repo_context")
+
+    response = await call_ai_api_async(prompt)
     questions = parse_text_from_response(response)
 
     logger.info("codebase_questions_generated", questions_length=len(questions))
 
-    # Step 4: Use ask-github to query the repository
-    codebase_context = ask(
-        repo_url=workflow_input.repo_url,
-        prompt=questions,
-        token=token,
-        max_iterations=100,
-    )
+    # Step 4: Answer each question concurrently, from local files or by
+    # querying the repository with ask-github
+    question_items = split_questions(questions)
+    executor: Optional[ThreadPoolExecutor] = None
+    if local_root:
+        answer_paths = relevant_paths or file_paths
+
+        async def answer_one(question: str) -> str:
+            return await answer_repo_questions_locally(
+                local_root, answer_paths, repo_structure, question
+            )
+    else:
+        from ask_github import ask
+
+        # Pointing the agent at the relevant files saves exploration iterations
+        focus = focus_note(relevant_paths) if relevant_paths else ""
+        # ask-github is a blocking library that can't be interrupted: it gets
+        # threads of its own, so questions past their budget don't take the
+        # default executor's threads that provider calls run on
+        executor = ThreadPoolExecutor(
+            max_workers=max(settings.repo_question_concurrency, 1),
+            thread_name_prefix="ask-github",
+        )
+
+        async def answer_one(question: str) -> str:
+            # The agent stops as soon as it has an answer; the iteration
+            # budget only bounds questions it can't settle.
+            return await run_blocking(
+                executor,
+                partial(
+                    ask,
+                    repo_url=workflow_input.repo_url,
+                    prompt=question + focus,
+                    token=token,
+                    max_iterations=settings.repo_question_max_iterations,
+                ),
+            )
+
+    try:
+        answers = await answer_questions(
+            question_items,
+            answer_one,
+            concurrency=settings.repo_question_concurrency,
+            timeout=clamp(settings.repo_question_timeout),
+        )
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
+    codebase_context = merge_answers(question_items, answers)
+
+    # Context with unanswered questions is used for this run only: caching
+    # it would keep a slow run's gaps until --refresh-repo-context
+    unanswered = answers.count(NO_ANSWER)
+    if unanswered:
+        logger.warning("codebase_context_incomplete", unanswered=unanswered)
+        commit_sha = None
+    if commit_sha:
+        await asyncio.to_thread(
+            cache.put_context,
+            workflow_input.repo_url,
+            commit_sha,
+            prompt,
+            codebase_context,
+        )
 
     logger.info(
         "codebase_context_completed",
+        question_count=len(question_items),
         response_length=len(codebase_context),
         response=codebase_context,
     )
-    return codebase_context
+    return await _digest_repo_context(
+        codebase_context,
+        max_chars,
+        cache,
+        workflow_input.repo_url,
+        commit_sha,
+        prompt,
+    )
+
 
+async def compact_repo_context(repo_context: str, max_chars: int) -> str:
+    """Condense repository context into a digest of at most ``max_chars``."""
+    from .repo_digest import deduplicate_context, truncate_context
+
+    logger = get_logger()
+    digest = deduplicate_context(repo_context)
+
+    # Only ask the model to condense what deduplication couldn't shrink enough
+    if len(digest) > max_chars:
+        prompt = get_prompt(
+            "compact_repo_context.md", max_chars=max_chars, repo_context=digest
+        )
+        digest = parse_text_from_response(await call_ai_api_async(prompt))
+    digest = truncate_context(digest, max_chars)
 
-def problem_break_down(
+    logger.info(
+        "repo_context_compacted",
+        raw_length=len(repo_context),
+        digest_length=len(digest),
+    )
+    return digest
+
+
+async def _digest_repo_context(
+    repo_context: str,
+    max_chars: int,
+    cache: "RepoContextCache",
+    repo_url: str,
+    commit_sha: Optional[str],
+    questions_prompt: str,
+) -> str:
+    """Compact repository context and cache the digest next to the raw answer."""
+    if max_chars <= 0:
+        return repo_context
+    digest = await compact_repo_context(repo_context, max_chars)
+    if commit_sha:
+        await asyncio.to_thread(
+            cache.put_digest, repo_url, commit_sha, questions_prompt, max_chars, digest
+        )
+    return digest
+
+
+async def revise_stories(
+    stories: List[Story], comments: str, repo_context: str = ""
+) -> Optional[List[Story]]:
+    """Apply ``comments`` to the stories they refer to.
+
+    Only the affected stories are sent in full, with a title index of the
+    rest; the model returns edit operations. Returns None when the reply
+    can't be parsed, so the caller can regenerate the list instead.
+    """
+    from .revision import (
+        affected_stories,
+        apply_operations,
+        parse_operations,
+        story_details,
+        story_index,
+    )
+
+    logger = get_logger()
+    affected = affected_stories(comments, stories)
+    # A comment that names no story may concern any of them
+    selected = affected or list(range(len(stories)))
+    logger.info("story_revision_started", affected=len(affected), total=len(stories))
+    prompt = get_prompt(
+        "revise_stories_zh.md",
+        comments=comments,
+        story_index=story_index(stories, selected) or "（无）",
+        affected_stories=story_details(stories, selected),
+    )
+    if repo_context:
+        prompt += f"\n<repository_context>\n{repo_context}\n</repository_context>\n"
+
+    # The prompt carries everything the revision needs
+    response = await call_ai_api_async(prompt, with_history=False)
+    operations = parse_operations(parse_text_from_response(response))
+    if operations is None:
+        logger.warning("story_revision_unparsed")
+        return None
+    revised = apply_operations(stories, operations)
+    if not revised:
+        logger.warning("story_revision_empty")
+        return None
+    logger.info(
+        "story_revision_completed", operations=len(operations), stories=len(revised)
+    )
+    return revised
+
+
+async def problem_break_down(
     workflow_input: WorkflowInput,
     stories: List[Story],
     comments: str = "",
+    repo_context: str = "",
 ) -> List[Story]:
-    """Break down the problem into user stories."""
+    """Break down the problem into user stories.
+
+    ``repo_context`` is added to a revision when the stories were first drafted
+    without it.
+    """
     logger = get_logger()
     is_revision = bool(stories)
     logger.info("problem_breakdown_started", is_revision=is_revision)
 
     if stories:
-        # If stories exist, this is a revision - use iterating on stories prompt
+        revised = await revise_stories(stories, comments, repo_context)
+        if revised is not None:
+            return revised
+        # Fall back to regenerating the whole list, which is included so the
+        # revision doesn't depend on what the conversation memory kept
+        from .revision import story_details
+
+        current = story_details(stories, list(range(len(stories))))
         prompt = get_prompt("iterating_on_stories_zh.md", comments=comments)
+        prompt += f"\n<stories>\n{current}\n</stories>\n"
+        if repo_context:
+            prompt += f"\n<repository_context>\n{repo_context}\n</repository_context>\n"
     else:
         # Initial story generation - use optimized Chinese prompt for ZhipuAI
         prompt = get_prompt(
@@ -221,7 +497,7 @@ def problem_break_down(
 
     # Call AI API and parse response
     # For ZhipuAI, don't pass tools to encourage direct JSON response
-    response = call_ai_api(prompt)
+    response = await call_ai_api_async(prompt)
 
     # Display reasoning summaries (only for OpenAI responses)
     if not isinstance(response, str):
@@ -231,7 +507,7 @@ def problem_break_down(
     return parse_stories_from_response(response)
 
 
-def enrich_context(
+async def enrich_context(
     story: Story,
     workflow_input: WorkflowInput,
     comments: str = "",
@@ -256,7 +532,7 @@ def enrich_context(
 
     # Call AI API and parse response
     # For ZhipuAI, don't pass tools to encourage direct JSON response
-    response = call_ai_api(prompt)
+    response = await call_ai_api_async(prompt)
 
     # Display reasoning summaries (only for OpenAI responses)
     if not isinstance(response, str):
@@ -269,7 +545,7 @@ def enrich_context(
     return updated_stories[0] if updated_stories else story
 
 
-def define_acceptance_criteria(
+async def define_acceptance_criteria(
     story: Story,
     comments: str = "",
 ) -> Story:
@@ -288,7 +564,7 @@ def define_acceptance_criteria(
 
     # Call AI API and parse response
     # For ZhipuAI, don't pass tools to encourage direct JSON response
-    response = call_ai_api(prompt)
+    response = await call_ai_api_async(prompt)
 
     # Display reasoning summaries (only for OpenAI responses)
     if not isinstance(response, str):
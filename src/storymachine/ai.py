@@ -1,125 +1,98 @@
 """AI utilities abstraction for StoryMachine supporting multiple providers."""
 
+import asyncio
+import hashlib
+import importlib
+import json
+import random
+import sys
 import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, List, Optional, Union
-
-from openai import OpenAI
-from openai.types.responses import (
-    ToolParam,
-    Response,
-    ResponseReasoningItem,
-    ResponseFunctionToolCall,
-)
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, TextIO, Union
 
-from .config import Settings
+from . import memory, metrics
+from .deadline import remaining
 from .logging import get_logger
+from .session import get_settings
+from .singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    from openai.types.responses import Response, ToolParam
+
+# Provider modules are imported on first use so that only the SDK of the
+# configured provider is ever loaded. Each module exposes
+# ``call_api(prompt, tools, history)`` and its awaitable counterpart
+# ``call_api_async``; ``history`` is a list of chat messages to send first.
+# ``CONNECTION_ERRORS`` lists the SDK's errors for requests that got no
+# response, which are retried like HTTP 408, 409, 429 and 5xx responses.
+PROVIDERS: Dict[str, str] = {
+    "openai": "storymachine.ai_openai",
+    "zhipuai": "storymachine.ai_zhipuai",
+}
+
+# Provider SDK packages, used for a helpful message when one is missing
+PROVIDER_PACKAGES: Dict[str, str] = {
+    "openai": "openai",
+    "zhipuai": "zhipuai",
+}
+
+# Names that used to live in this module and now belong to the OpenAI provider
+_OPENAI_ATTRIBUTES = {
+    "call_openai_api",
+    "supports_reasoning_parameters",
+}
+
+
+def get_provider(name: str) -> ModuleType:
+    """Import and return the provider module registered under ``name``."""
+    if name not in PROVIDERS:
+        raise ValueError(
+            f"Unknown API provider: {name!r} (expected one of {', '.join(PROVIDERS)})"
+        )
+    try:
+        return importlib.import_module(PROVIDERS[name])
+    except ImportError as e:
+        package = PROVIDER_PACKAGES[name]
+        raise ImportError(
+            f"{name} provider is not available. Install with: pip install {package}"
+        ) from e
 
-# Import ZhipuAI support
-try:
-    from .ai_zhipuai import (
-        call_zhipuai_api,
-        get_zhipu_client,
-        format_tools_for_zhipuai,
-        parse_stories_from_zhipuai_response,
-        ZhipuAIResponse
-    )
-    ZHIPUAI_AVAILABLE = True
-except ImportError:
-    ZHIPUAI_AVAILABLE = False
-
-# Global conversation state
-conversation_id: Optional[str] = None
-
-
-def supports_reasoning_parameters(model: str) -> bool:
-    """Check if the model supports reasoning and text parameters."""
-    reasoning_capable_models = {
-        "o1-preview",
-        "o1-mini",
-        "o1",
-        "o3-mini",
-        "o3",
-        "o4-mini",
-        "gpt-5",
-        "gpt-5-mini",
-        "gpt-5-nano",
-        "codex-mini-latest",
-    }
 
-    return (
-        model in reasoning_capable_models
-        or model.startswith("o1-")
-        or model.startswith("o3-")
-        or model.startswith("o4-")
-        or model.startswith("codex-")
-        or (model.startswith("gpt-5") and not model.startswith("gpt-5-chat"))
-    )
+def __getattr__(name: str) -> Any:
+    """Lazily forward OpenAI-specific names to the OpenAI provider module."""
+    if name in _OPENAI_ATTRIBUTES:
+        return getattr(get_provider("openai"), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-def get_or_create_conversation() -> str:
-    """Get existing conversation ID or create a new one."""
-    global conversation_id
-    if conversation_id is None:
-        logger = get_logger()
-        settings = Settings()  # pyright: ignore[reportCallIssue]
-        client = OpenAI(api_key=settings.openai_api_key)
-        conversation = client.conversations.create()
-        conversation_id = conversation.id
-        logger.info("conversation_created", conversation_id=conversation_id)
-    return conversation_id
+PROMPTS_DIR = Path(__file__).parent / "prompts"
 
 
-def get_prompt(filename: str, **kwargs: Any) -> str:
-    """Load and format a prompt template from the prompts directory."""
-    prompt_file = Path(__file__).parent / "prompts" / filename
+@lru_cache(maxsize=None)
+def load_prompt_template(filename: str) -> str:
+    """Read a prompt template once and keep it in the prompt registry."""
+    prompt_file = PROMPTS_DIR / filename
     # Explicitly use UTF-8 encoding to handle Chinese characters
     with open(prompt_file, 'r', encoding='utf-8') as f:
-        prompt_template = f.read()
-    return prompt_template.format(**kwargs)
-
-
-def _create_and_parse_response(
-    client: OpenAI, params: dict, logger, log_prefix: str
-) -> Response:
-    """Create response, parse it, log it, and return with parsed attributes."""
-    # Create response using responses.create()
-    response = client.responses.create(**params)
-
-    # Extract reasoning summaries and function calls using proper types
-    reasoning_items = [
-        item for item in response.output if isinstance(item, ResponseReasoningItem)
-    ]
-    function_calls = [
-        item for item in response.output if isinstance(item, ResponseFunctionToolCall)
-    ]
-
-    reasoning_summaries = []
-    for reasoning_item in reasoning_items:
-        if reasoning_item.summary:
-            for summary_part in reasoning_item.summary:
-                if hasattr(summary_part, "text"):
-                    reasoning_summaries.append(summary_part.text)
-
-    # Log response details
-    logger.info(
-        f"{log_prefix}_response",
-        status="success",
-        tool_calls=len(function_calls),
-        reasoning_items=len(reasoning_items),
-        reasoning_summary_length=sum(len(s) for s in reasoning_summaries),
-        response_output=[item.dict() for item in response.output],
-    )
+        return f.read()
 
-    # Attach parsed data to response using setattr for type safety
-    setattr(response, "_reasoning_items", reasoning_items)
-    setattr(response, "_function_calls", function_calls)
-    setattr(response, "_reasoning_summaries", reasoning_summaries)
 
-    return response
+def preload_prompts() -> None:
+    """Load every prompt template into the registry (used by the daemon)."""
+    for prompt_file in PROMPTS_DIR.glob("*.md"):
+        load_prompt_template(prompt_file.name)
+
+
+def get_prompt(filename: str, **kwargs: Any) -> str:
+    """Load and format a prompt template from the prompts directory."""
+    return load_prompt_template(filename).format(**kwargs)
 
 
-def extract_reasoning_summaries(response: Response) -> List[str]:
+def extract_reasoning_summaries(response: "Response") -> List[str]:
     """Extract reasoning summary text from OpenAI response."""
     # Check if we have combined reasoning summaries from multiple API calls
     if hasattr(response, "_combined_reasoning_summaries"):
@@ -132,165 +105,220 @@ def extract_reasoning_summaries(response: Response) -> List[str]:
     # Fallback to extracting from response output
     summaries = []
     for item in response.output:
-        if isinstance(item, ResponseReasoningItem) and item.summary:
-            for summary_part in item.summary:
+        if getattr(item, "type", None) == "reasoning" and item.summary:  # pyright: ignore[reportAttributeAccessIssue]
+            for summary_part in item.summary:  # pyright: ignore[reportAttributeAccessIssue]
                 if hasattr(summary_part, "text"):
                     summaries.append(summary_part.text)
     return summaries
 
 
+# Where display_reasoning_summaries sends summaries in the current context: a
+# stream, or a list collecting them to be displayed later (stdout if unset)
+_reasoning_sink: ContextVar[Optional[Union[TextIO, List[str]]]] = ContextVar(
+    "reasoning_sink", default=None
+)
+
+
+@contextmanager
+def reasoning_summaries_to(sink: Union[TextIO, List[str]]) -> Iterator[None]:
+    """Send reasoning summaries displayed in the block to ``sink``.
+
+    A list collects them instead, for work whose output would get in the way
+    (say of a prompt) if shown as soon as it is ready.
+    """
+    token = _reasoning_sink.set(sink)
+    try:
+        yield
+    finally:
+        _reasoning_sink.reset(token)
+
+
 def display_reasoning_summaries(summaries: List[str]) -> None:
     """Display reasoning summaries on CLI in a formatted way."""
     if not summaries:
         return
+    sink = _reasoning_sink.get()
+    if isinstance(sink, list):
+        sink.extend(summaries)
+        return
 
-    print("\n🧠 Model Reasoning:")
-    print("─" * 60)
+    rule = "─" * 60
+    lines = ["", "🧠 Model Reasoning:", rule]
     for i, summary in enumerate(summaries):
         if i > 0:
-            print("─" * 60)
-        print(summary)
-    print("─" * 60)
-    print()
+            lines.append(rule)
+        lines.append(summary)
+    lines.extend([rule, "", ""])
+    # One write, so concurrent stages can't interleave their blocks
+    stream = sink or sys.stdout
+    stream.write("\n".join(lines))
+    stream.flush()
 
 
-def call_ai_api(
-    prompt: str,
-    tools: Optional[List[ToolParam]] = None,
-) -> Union[Response, str]:
-    """Call AI API using the configured provider."""
-    settings = Settings()  # pyright: ignore[reportCallIssue]
+def _provider() -> ModuleType:
+    """The configured provider module, once its API key is known to be set."""
+    settings = get_settings()
 
     if settings.api_provider == "zhipuai":
-        if not ZHIPUAI_AVAILABLE:
-            raise ImportError("ZhipuAI is not available. Install with: pip install zhipuai")
         if not settings.zhipuai_api_key:
             raise ValueError("ZhipuAI API key is required when using ZhipuAI provider")
-        return call_zhipuai_api(prompt, tools)
+        return get_provider("zhipuai")
+    # Default to OpenAI
+    if not settings.openai_api_key:
+        raise ValueError("OpenAI API key is required when using OpenAI provider")
+    return get_provider("openai")
+
+
+# Identical requests in flight at the same time, from any session, thread or
+# task, share one provider call
+_flights = SingleFlight()
+
+
+def _request_key(
+    prompt: str, tools: Optional[List["ToolParam"]], history: Optional[List[Dict]]
+) -> str:
+    """Identify a request by everything that is sent to the provider."""
+    settings = get_settings()
+    request = {
+        "provider": settings.api_provider,
+        "model": settings.model,
+        "reasoning_effort": settings.reasoning_effort,
+        "prompt": prompt,
+        "tools": tools,
+        "history": history,
+    }
+    encoded = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+# Backoff between attempts of a model call, as in the provider SDKs
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+
+def _status(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_delay(
+    provider: ModuleType, error: Exception, retries: int
+) -> Optional[float]:
+    """Seconds to wait before retrying a call that raised ``error``, or None.
+
+    Like the SDKs, this honours the server's x-should-retry and Retry-After
+    headers. A retry that would outlast the current deadline isn't made.
+    """
+    if retries >= get_settings().provider_max_retries:
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    should_retry = headers.get("x-should-retry")
+    status = _status(error)
+    if should_retry in ("true", "false"):
+        retryable = should_retry == "true"
+    elif status is not None:
+        retryable = status in (408, 409, 429) or status >= 500
     else:
-        # Default to OpenAI
-        if not settings.openai_api_key:
-            raise ValueError("OpenAI API key is required when using OpenAI provider")
-        return call_openai_api(prompt, tools)
+        retryable = isinstance(error, getattr(provider, "CONNECTION_ERRORS", ()))
+    if not retryable:
+        return None
+    try:
+        delay = float(headers.get("retry-after", ""))
+    except ValueError:
+        delay = -1
+    if not 0 <= delay <= 60:
+        delay = min(RETRY_BASE_DELAY * 2**retries, RETRY_MAX_DELAY)
+        delay *= 1 - 0.25 * random.random()
+    left = remaining()
+    if left is not None and delay >= left:
+        return None
+    return delay
+
+
+def _retrying(error: Exception, delay: float, retries: int) -> None:
+    metrics.RETRIES.inc(kind="provider")
+    get_logger().warning(
+        "provider_call_retry",
+        error=type(error).__name__,
+        status=_status(error),
+        attempt=retries + 1,
+        delay=round(delay, 3),
+    )
 
 
-def call_openai_api(
-    prompt: str,
-    tools: Optional[List[ToolParam]] = None,
-) -> Response:
-    """Call OpenAI API using the Responses API with proper context management."""
-    start_time = time.time()
-    logger = get_logger()
-    settings = Settings()  # pyright: ignore[reportCallIssue]
-    client = OpenAI(api_key=settings.openai_api_key)
-    model = settings.model
-
-    # Build request parameters for responses.create()
-    create_params = {
-        "model": model,
-        "input": [{"role": "user", "content": prompt}],
-        "conversation": get_or_create_conversation(),
-    }
+def coalescing_stats() -> Dict[str, int]:
+    """Provider calls made and requests served by an identical call in flight."""
+    return _flights.stats()
 
-    # Add tools and tool_choice only if tools are provided
-    if tools:
-        create_params["tools"] = tools
-        create_params["tool_choice"] = "required"
-
-    # Add reasoning parameters for supported models
-    if supports_reasoning_parameters(model):
-        create_params["reasoning"] = {
-            "effort": settings.reasoning_effort,
-            "summary": "auto",
-        }
-        create_params["text"] = {"verbosity": "low"}
-
-    logger.info(
-        "openai_request",
-        model=model,
-        conversation_id=create_params["conversation"],
-        method="responses.create",
-        request_params={
-            k: v
-            if k != "tools"
-            else [tool.dict() if hasattr(tool, "dict") else tool for tool in v]
-            for k, v in create_params.items()
-        },
-    )
 
-    # Create and parse initial response
-    response = _create_and_parse_response(client, create_params, logger, "openai")
-
-    function_calls = getattr(response, "_function_calls", [])
-    if function_calls:
-        # Create function call outputs (empty since we don't execute them)
-        function_outputs = []
-        for func_call in function_calls:
-            function_outputs.append(
-                {
-                    "type": "function_call_output",
-                    "call_id": func_call.call_id,
-                    "output": "",
-                }
-            )
-
-        # Build follow-up input with just function outputs
-        # Let conversation parameter handle reasoning context automatically
-        followup_input = function_outputs
-
-        followup_create_params = {
-            "model": model,
-            "input": followup_input,
-            "conversation": get_or_create_conversation(),
-        }
-
-        # Add reasoning parameters for supported models
-        if supports_reasoning_parameters(model):
-            followup_create_params["reasoning"] = {
-                "effort": settings.reasoning_effort,
-                "summary": "auto",
-            }
-            followup_create_params["text"] = {"verbosity": "low"}
-
-        logger.info(
-            "openai_followup_request",
-            model=model,
-            conversation_id=get_or_create_conversation(),
-            method="responses.create",
-            input_items=len(followup_input),
-            function_outputs_included=len(function_outputs),
-            request_params={
-                k: v
-                if k != "tools"
-                else [tool.dict() if hasattr(tool, "dict") else tool for tool in v]
-                if "tools" in followup_create_params
-                else v
-                for k, v in followup_create_params.items()
-            },
-        )
+def call_ai_api(
+    prompt: str,
+    tools: Optional[List["ToolParam"]] = None,
+    with_history: bool = True,
+) -> Union["Response", str]:
+    """Call AI API using the configured provider.
+
+    Inside a memory topic the topic's history is sent along (unless
+    ``with_history`` is False) and the turn is remembered. A request identical
+    to one already in flight waits for that call's response.
+    """
+    scope = memory.current()
+    history = scope[0].history(scope[1]) if scope and with_history else None
+    provider = _provider()
+
+    def call() -> Union["Response", str]:
+        retries = 0
+        while True:
+            try:
+                with metrics.provider_call():
+                    return provider.call_api(prompt, tools, history)
+            except Exception as e:
+                delay = _retry_delay(provider, e, retries)
+                if delay is None:
+                    raise
+                _retrying(e, delay, retries)
+                time.sleep(delay)
+                retries += 1
+
+    if get_settings().coalesce_requests:
+        response = _flights.do(_request_key(prompt, tools, history), call)
+    else:
+        response = call()
+    if scope:
+        scope[0].record(scope[1], prompt, memory.reply_text(response))
+    return response
 
-        # Create and parse follow-up response
-        followup_response = _create_and_parse_response(
-            client, followup_create_params, logger, "openai_followup"
-        )
 
-        # Combine reasoning summaries from both responses for display
-        response_summaries = getattr(response, "_reasoning_summaries", [])
-        followup_summaries = getattr(followup_response, "_reasoning_summaries", [])
-        combined_summaries = response_summaries + followup_summaries
-        setattr(followup_response, "_combined_reasoning_summaries", combined_summaries)
-
-        # Add original function calls to final response for story parsing
-        # (They're in input context but we need them in output for parse_stories_from_response)
-        original_function_calls = getattr(response, "_function_calls", [])
-        if original_function_calls:
-            followup_response.output.extend(original_function_calls)
-
-        duration = time.time() - start_time
-        logger.info("openai_api_duration", duration_seconds=duration)
-        return followup_response
-
-    # Store reasoning summaries for display (already attached by helper function)
-    duration = time.time() - start_time
-    logger.info("openai_api_duration", duration_seconds=duration)
+async def call_ai_api_async(
+    prompt: str,
+    tools: Optional[List["ToolParam"]] = None,
+    with_history: bool = True,
+) -> Union["Response", str]:
+    """Call AI API using the configured provider, without blocking the loop."""
+    scope = memory.current()
+    history = scope[0].history(scope[1]) if scope and with_history else None
+    provider = _provider()
+
+    async def call() -> Union["Response", str]:
+        retries = 0
+        while True:
+            try:
+                with metrics.provider_call():
+                    return await provider.call_api_async(prompt, tools, history)
+            except Exception as e:
+                delay = _retry_delay(provider, e, retries)
+                if delay is None:
+                    raise
+                _retrying(e, delay, retries)
+                await asyncio.sleep(delay)
+                retries += 1
+
+    if get_settings().coalesce_requests:
+        response = await _flights.do_async(_request_key(prompt, tools, history), call)
+    else:
+        response = await call()
+    if scope:
+        scope[0].record(scope[1], prompt, memory.reply_text(response))
     return response
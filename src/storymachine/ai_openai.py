@@ -0,0 +1,289 @@
+"""AI utilities and OpenAI abstraction for StoryMachine."""
+
+import time
+from functools import lru_cache
+from typing import List, Optional
+
+from openai import APIConnectionError, AsyncOpenAI, OpenAI
+from openai.types.responses import (
+    ToolParam,
+    Response,
+    ResponseReasoningItem,
+    ResponseFunctionToolCall,
+)
+
+from .config import Settings
+from .session import get_settings
+from .deadline import timeout_kwargs
+from .logging import get_logger
+from .progress import add_tokens
+
+
+def supports_reasoning_parameters(model: str) -> bool:
+    """Check if the model supports reasoning and text parameters."""
+    reasoning_capable_models = {
+        "o1-preview",
+        "o1-mini",
+        "o1",
+        "o3-mini",
+        "o3",
+        "o4-mini",
+        "gpt-5",
+        "gpt-5-mini",
+        "gpt-5-nano",
+        "codex-mini-latest",
+    }
+
+    return (
+        model in reasoning_capable_models
+        or model.startswith("o1-")
+        or model.startswith("o3-")
+        or model.startswith("o4-")
+        or model.startswith("codex-")
+        or (model.startswith("gpt-5") and not model.startswith("gpt-5-chat"))
+    )
+
+
+# Failures without an HTTP status that are worth retrying; the clients
+# don't retry themselves, ai.py does and counts every attempt
+CONNECTION_ERRORS = (APIConnectionError,)
+
+
+@lru_cache(maxsize=None)
+def get_client(api_key: Optional[str]) -> OpenAI:
+    """Return a shared OpenAI client per API key so connections are reused."""
+    return OpenAI(api_key=api_key, max_retries=0)
+
+
+@lru_cache(maxsize=None)
+def get_async_client(api_key: Optional[str]) -> AsyncOpenAI:
+    """Return a shared async OpenAI client per API key."""
+    return AsyncOpenAI(api_key=api_key, max_retries=0)
+
+
+def _parse_response(response: Response, logger, log_prefix: str) -> Response:
+    """Parse a response, log it, and return it with parsed attributes."""
+    # Extract reasoning summaries and function calls using proper types
+    reasoning_items = [
+        item for item in response.output if isinstance(item, ResponseReasoningItem)
+    ]
+    function_calls = [
+        item for item in response.output if isinstance(item, ResponseFunctionToolCall)
+    ]
+
+    reasoning_summaries = []
+    for reasoning_item in reasoning_items:
+        if reasoning_item.summary:
+            for summary_part in reasoning_item.summary:
+                if hasattr(summary_part, "text"):
+                    reasoning_summaries.append(summary_part.text)
+
+    # Log response details
+    logger.info(
+        f"{log_prefix}_response",
+        status="success",
+        tool_calls=len(function_calls),
+        reasoning_items=len(reasoning_items),
+        reasoning_summary_length=sum(len(s) for s in reasoning_summaries),
+        response_output=[item.dict() for item in response.output],
+    )
+
+    usage = getattr(response, "usage", None)
+    add_tokens(getattr(usage, "total_tokens", None))
+
+    # Attach parsed data to response using setattr for type safety
+    setattr(response, "_reasoning_items", reasoning_items)
+    setattr(response, "_function_calls", function_calls)
+    setattr(response, "_reasoning_summaries", reasoning_summaries)
+
+    return response
+
+
+def _create_and_parse_response(
+    client: OpenAI, params: dict, logger, log_prefix: str
+) -> Response:
+    """Create response, parse it, log it, and return with parsed attributes."""
+    response = client.responses.create(**params, **timeout_kwargs())
+    return _parse_response(response, logger, log_prefix)
+
+
+async def _create_and_parse_response_async(
+    client: AsyncOpenAI, params: dict, logger, log_prefix: str
+) -> Response:
+    """Async counterpart of _create_and_parse_response."""
+    # The request is aborted when the deadline passes or the task is cancelled
+    response = await client.responses.create(**params, **timeout_kwargs())
+    return _parse_response(response, logger, log_prefix)
+
+
+def _create_params(
+    settings: Settings,
+    input_items: list,
+    tools=None,
+    previous_response_id: Optional[str] = None,
+) -> dict:
+    """Build responses.create() parameters for the configured model."""
+    create_params: dict = {"model": settings.model, "input": input_items}
+    if previous_response_id:
+        # Follow-ups answer the tool calls of the response they continue
+        create_params["previous_response_id"] = previous_response_id
+
+    # Add tools and tool_choice only if tools are provided
+    if tools:
+        create_params["tools"] = tools
+        create_params["tool_choice"] = "required"
+
+    # Add reasoning parameters for supported models
+    if supports_reasoning_parameters(settings.model):
+        create_params["reasoning"] = {
+            "effort": settings.reasoning_effort,
+            "summary": "auto",
+        }
+        create_params["text"] = {"verbosity": "low"}
+    return create_params
+
+
+def _loggable_params(create_params: dict) -> dict:
+    return {
+        k: v
+        if k != "tools"
+        else [tool.dict() if hasattr(tool, "dict") else tool for tool in v]
+        for k, v in create_params.items()
+    }
+
+
+def _function_outputs(response: Response) -> list:
+    """Empty outputs for the response's function calls (we don't execute them)."""
+    return [
+        {
+            "type": "function_call_output",
+            "call_id": func_call.call_id,
+            "output": "",
+        }
+        for func_call in getattr(response, "_function_calls", [])
+    ]
+
+
+def _merge_followup(response: Response, followup_response: Response) -> Response:
+    """Carry the first response's reasoning and function calls into the follow-up."""
+    # Combine reasoning summaries from both responses for display
+    response_summaries = getattr(response, "_reasoning_summaries", [])
+    followup_summaries = getattr(followup_response, "_reasoning_summaries", [])
+    combined_summaries = response_summaries + followup_summaries
+    setattr(followup_response, "_combined_reasoning_summaries", combined_summaries)
+
+    # Add original function calls to final response for story parsing
+    # (They're in input context but we need them in output for parse_stories_from_response)
+    original_function_calls = getattr(response, "_function_calls", [])
+    if original_function_calls:
+        followup_response.output.extend(original_function_calls)
+    return followup_response
+
+
+def call_openai_api(
+    prompt: str,
+    tools: Optional[List[ToolParam]] = None,
+    history: Optional[List[dict]] = None,
+) -> Response:
+    """Call OpenAI API using the Responses API.
+
+    ``history`` is sent before the prompt; nothing else of earlier calls is.
+    """
+    start_time = time.time()
+    logger = get_logger()
+    settings = get_settings()
+    client = get_client(settings.openai_api_key)
+
+    create_params = _create_params(
+        settings, [*(history or []), {"role": "user", "content": prompt}], tools
+    )
+    logger.info(
+        "openai_request",
+        model=settings.model,
+        history_messages=len(history or []),
+        method="responses.create",
+        request_params=_loggable_params(create_params),
+    )
+
+    # Create and parse initial response
+    response = _create_and_parse_response(client, create_params, logger, "openai")
+
+    function_outputs = _function_outputs(response)
+    if function_outputs:
+        followup_create_params = _create_params(
+            settings, function_outputs, previous_response_id=response.id
+        )
+        logger.info(
+            "openai_followup_request",
+            model=settings.model,
+            previous_response_id=response.id,
+            method="responses.create",
+            input_items=len(function_outputs),
+            function_outputs_included=len(function_outputs),
+            request_params=_loggable_params(followup_create_params),
+        )
+
+        # Create and parse follow-up response
+        followup_response = _create_and_parse_response(
+            client, followup_create_params, logger, "openai_followup"
+        )
+        response = _merge_followup(response, followup_response)
+
+    duration = time.time() - start_time
+    logger.info("openai_api_duration", duration_seconds=duration)
+    return response
+
+
+async def call_openai_api_async(
+    prompt: str,
+    tools: Optional[List[ToolParam]] = None,
+    history: Optional[List[dict]] = None,
+) -> Response:
+    """Call the OpenAI Responses API without blocking the event loop."""
+    start_time = time.time()
+    logger = get_logger()
+    settings = get_settings()
+    client = get_async_client(settings.openai_api_key)
+
+    create_params = _create_params(
+        settings, [*(history or []), {"role": "user", "content": prompt}], tools
+    )
+    logger.info(
+        "openai_request",
+        model=settings.model,
+        history_messages=len(history or []),
+        method="responses.create",
+        request_params=_loggable_params(create_params),
+    )
+
+    response = await _create_and_parse_response_async(
+        client, create_params, logger, "openai"
+    )
+
+    function_outputs = _function_outputs(response)
+    if function_outputs:
+        followup_create_params = _create_params(
+            settings, function_outputs, previous_response_id=response.id
+        )
+        logger.info(
+            "openai_followup_request",
+            model=settings.model,
+            previous_response_id=response.id,
+            method="responses.create",
+            input_items=len(function_outputs),
+            function_outputs_included=len(function_outputs),
+            request_params=_loggable_params(followup_create_params),
+        )
+        followup_response = await _create_and_parse_response_async(
+            client, followup_create_params, logger, "openai_followup"
+        )
+        response = _merge_followup(response, followup_response)
+
+    duration = time.time() - start_time
+    logger.info("openai_api_duration", duration_seconds=duration)
+    return response
+
+
+# Provider entry points used by the registry in ai.py
+call_api = call_openai_api
+call_api_async = call_openai_api_async
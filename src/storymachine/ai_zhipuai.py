@@ -1,19 +1,34 @@
 """AI utilities and ZhipuAI abstraction for StoryMachine."""
 
+import asyncio
 import json
 import time
+from functools import lru_cache
 from typing import Any, Dict, List, Optional, Union
 
-from zhipuai import ZhipuAI
+from zhipuai import APIConnectionError, ZhipuAI
 
-from .config import Settings
+from .session import get_settings
+from .deadline import timeout_kwargs
 from .logging import get_logger
+from .progress import add_tokens
+
+
+# Failures without an HTTP status that are worth retrying; the client
+# doesn't retry itself, ai.py does and counts every attempt
+CONNECTION_ERRORS = (APIConnectionError,)
+
+
+@lru_cache(maxsize=None)
+def _client_for_key(api_key: Optional[str]) -> ZhipuAI:
+    """Return a shared ZhipuAI client per API key so connections are reused."""
+    return ZhipuAI(api_key=api_key, max_retries=0)
 
 
 def get_zhipu_client() -> ZhipuAI:
     """Get ZhipuAI client with proper authentication."""
-    settings = Settings()  # pyright: ignore[reportCallIssue]
-    return ZhipuAI(api_key=settings.zhipuai_api_key)
+    settings = get_settings()
+    return _client_for_key(settings.zhipuai_api_key)
 
 
 def format_tools_for_zhipuai(tools: Optional[List[Dict]]) -> Optional[List[Dict]]:
@@ -95,14 +110,23 @@ def parse_stories_from_zhipuai_response(response_content: str) -> List[Dict]:
         return []
 
 
+def _total_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
 def call_zhipuai_api(
     prompt: str,
     tools: Optional[List[Dict]] = None,
+    history: Optional[List[Dict]] = None,
 ) -> str:
-    """Call ZhipuAI API using the chat completion API."""
+    """Call ZhipuAI API using the chat completion API.
+
+    ``history`` is sent before the prompt, as the chat API keeps no state.
+    """
     start_time = time.time()
     logger = get_logger()
-    settings = Settings()  # pyright: ignore[reportCallIssue]
+    settings = get_settings()
 
     if not settings.zhipuai_api_key:
         raise ValueError("ZhipuAI API key is required when using ZhipuAI provider")
@@ -111,7 +135,8 @@ def call_zhipuai_api(
 
     # Build request parameters
     messages = [
-        {"role": "user", "content": prompt}
+        *(history or []),
+        {"role": "user", "content": prompt},
     ]
 
     # Format tools for ZhipuAI
@@ -138,7 +163,10 @@ def call_zhipuai_api(
 
     try:
         # Create the chat completion
-        response = client.chat.completions.create(**request_params)
+        # The SDK call can't be cancelled from the event loop, so the time
+        # left before the deadline bounds the request itself
+        response = client.chat.completions.create(**request_params, **timeout_kwargs())
+        add_tokens(_total_tokens(response))
 
         # Extract the response content
         content = response.choices[0].message.content
@@ -171,8 +199,10 @@ def call_zhipuai_api(
                 messages=messages,
                 temperature=0.7,
                 max_tokens=4000,
+                **timeout_kwargs(),
             )
 
+            add_tokens(_total_tokens(followup_response))
             content = followup_response.choices[0].message.content
 
         duration = time.time() - start_time
@@ -194,11 +224,9 @@ def supports_reasoning_parameters(model: str) -> bool:
 
 def get_prompt(filename: str, **kwargs: Any) -> str:
     """Load and format a prompt template from the prompts directory."""
-    from pathlib import Path
+    from .ai import load_prompt_template
 
-    prompt_file = Path(__file__).parent / "prompts" / filename
-    prompt_template = prompt_file.read_text()
-    return prompt_template.format(**kwargs)
+    return load_prompt_template(filename).format(**kwargs)
 
 
 def display_reasoning_summaries(summaries: List[str]) -> None:
@@ -230,4 +258,22 @@ class ZhipuAIResponse:
                         'type': 'function_call',
                         'name': tool_call.function.name,
                         'arguments': tool_call.function.arguments
-                    })
\ No newline at end of file
+                    })
+
+
+async def call_zhipuai_api_async(
+    prompt: str,
+    tools: Optional[List[Dict]] = None,
+    history: Optional[List[Dict]] = None,
+) -> str:
+    """Call ZhipuAI API without blocking the event loop.
+
+    The zhipuai SDK only offers a blocking chat client, so the call runs in a
+    worker thread.
+    """
+    return await asyncio.to_thread(call_zhipuai_api, prompt, tools, history)
+
+
+# Provider entry points used by the registry in ai.py
+call_api = call_zhipuai_api
+call_api_async = call_zhipuai_api_async
@@ -4,14 +4,23 @@ import argparse
 import asyncio
 import sys
 from pathlib import Path
+from .deadline import EXIT_TIMEOUT, DeadlineExceeded, run_with_deadline
+from .story_output import FORMATS, StoryWriter, format_stories_text
 from .types import WorkflowInput
 from .workflow import generate_stories_auto
 from .config import Settings
+from .daemon import forward
+from . import metrics
 
 
 def main():
     """Auto CLI entry point for StoryMachine - non-interactive mode."""
 
+    # Hand the invocation to a warm daemon when one is running
+    exit_code = forward("auto_cli", sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+
     parser = argparse.ArgumentParser(
         description="StoryMachine Auto - Generate user stories from PRD without interaction"
     )
@@ -31,7 +40,24 @@ def main():
         "--repo",
         type=str,
         required=False,
-        help="GitHub repository URL (e.g., https://github.com/owner/repo) (optional)",
+        help="GitHub repository URL (e.g., https://github.com/owner/repo) or local checkout path (optional)",
+    )
+    parser.add_argument(
+        "--refresh-repo-context",
+        action="store_true",
+        help="Ignore cached repository context and query the repository again",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        required=False,
+        metavar="SECONDS",
+        help="Abort the run after this many seconds (default: STORYMACHINE_RUN_TIMEOUT, 0 for none)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Draft stories while codebase context is gathered in the background",
     )
     parser.add_argument(
         "--output",
@@ -39,9 +65,18 @@ def main():
         required=False,
         help="Output file path (optional, defaults to console)",
     )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="text",
+        help="Output format; each story is written as soon as it is finished (default: text)",
+    )
 
     args = parser.parse_args()
 
+    # Keep stdout clean for machine-readable output
+    info = sys.stderr if args.format != "text" and not args.output else sys.stdout
+
     prd_path = Path(args.prd)
 
     if not prd_path.exists():
@@ -49,7 +84,7 @@ def main():
         sys.exit(1)
 
     # Read file contents with UTF-8 encoding
-    prd_content = prd_path.read_text(encoding='utf-8')
+    prd_content = prd_path.read_text(encoding="utf-8")
 
     # Handle optional parameters
     tech_spec_content = ""
@@ -58,77 +93,69 @@ def main():
         if not tech_spec_path.exists():
             print(f"Error: Tech spec file not found: {tech_spec_path}", file=sys.stderr)
             sys.exit(1)
-        tech_spec_content = tech_spec_path.read_text(encoding='utf-8')
-        print(f"Using technical specification: {tech_spec_path}")
+        tech_spec_content = tech_spec_path.read_text(encoding="utf-8")
+        print(f"Using technical specification: {tech_spec_path}", file=info)
     else:
-        print("No technical specification provided - will work with PRD only")
+        print(
+            "No technical specification provided - will work with PRD only", file=info
+        )
 
     repo_url = args.repo or ""
     if args.repo:
-        print(f"Using repository: {args.repo}")
+        print(f"Using repository: {args.repo}", file=info)
     else:
-        print("No repository provided - will work without codebase context")
+        print("No repository provided - will work without codebase context", file=info)
 
     # Create workflow input
     workflow_input = WorkflowInput(
         prd_content=prd_content,
         tech_spec_content=tech_spec_content,
         repo_url=repo_url,
+        refresh_repo_context=args.refresh_repo_context,
+        pipeline=args.pipeline,
     )
 
     # Display current configuration
     settings = Settings()  # pyright: ignore[reportCallIssue]
-    print(f"Model: {settings.model}")
-    print(f"Reasoning Effort: {settings.reasoning_effort}")
-    print()
+    timeout = settings.run_timeout if args.timeout is None else args.timeout
+    print(f"Model: {settings.model}", file=info)
+    print(f"Reasoning Effort: {settings.reasoning_effort}", file=info)
+    print(file=info)
 
     # Generate stories automatically
-    print("🚀 Starting automatic user story generation...\n")
+    print("🚀 Starting automatic user story generation...\n", file=info)
 
+    output_file = open(args.output, "w", encoding="utf-8") if args.output else None
     try:
-        stories = asyncio.run(generate_stories_auto(workflow_input))
-
-        # Output results
-        output_content = format_stories_output(stories)
+        if output_file is None and args.format == "text":
+            print("\n" + "=" * 60)
+            print("📋 GENERATED USER STORIES")
+            print("=" * 60)
+        writer = StoryWriter(output_file or sys.stdout, args.format)
+        asyncio.run(
+            run_with_deadline(generate_stories_auto(workflow_input, writer), timeout)
+        )
 
         if args.output:
-            output_path = Path(args.output)
-            output_path.write_text(output_content, encoding='utf-8')
-            print(f"\n✅ User stories saved to: {output_path}")
-        else:
-            print("\n" + "="*60)
-            print("📋 GENERATED USER STORIES")
-            print("="*60)
-            print(output_content)
+            print(f"\n✅ User stories saved to: {args.output}", file=info)
 
+    except DeadlineExceeded as e:
+        # Distinct status so schedulers can tell a timeout from a failure
+        print(f"\n⏱️ Timed out: {str(e)}", file=sys.stderr)
+        sys.exit(EXIT_TIMEOUT)
     except Exception as e:
         print(f"\n❌ Error generating stories: {str(e)}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        if output_file is not None:
+            output_file.close()
+        metrics.export(settings)
 
 
 def format_stories_output(stories):
     """Format stories for output."""
-    if not stories:
-        return "No stories were generated."
-
-    output = f"Generated {len(stories)} user stories:\n\n"
-
-    for i, story in enumerate(stories, 1):
-        output += f"{i}. {story.title}\n"
-        output += "   Acceptance Criteria:\n"
-        for j, ac in enumerate(story.acceptance_criteria, 1):
-            output += f"     {j}. {ac}\n"
-        if story.enriched_context:
-            output += "   Context:\n"
-            # Format context with proper indentation
-            context_lines = story.enriched_context.split('\n')
-            for line in context_lines:
-                if line.strip():
-                    output += f"     {line}\n"
-        output += "\n"
-
-    return output
+    return format_stories_text(stories)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
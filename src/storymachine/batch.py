@@ -0,0 +1,112 @@
+"""Batch runs: stories for many PRDs, generated by the workers of a queue.
+
+The batch runner submits one job per PRD and waits for the workers, which
+may run on several hosts sharing the queue, to finish them. Jobs are keyed
+by their input, so submitting a batch again (say after the runner was
+interrupted) picks up the existing jobs instead of running them twice.
+
+A job's stories are published once, by the queue: only the worker holding
+the job's current lease can record them. The runner then writes each result
+to ``<output>/<prd name>.json`` with an atomic rename, so readers never see
+a partial file and rewriting a result that is already there changes nothing.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from .job_queue import CANCELLED, FAILED, SUCCEEDED, Priority, QueueBackend, QueuedJob
+from .logging import get_logger
+from .types import WorkflowInput
+
+FINISHED = {SUCCEEDED, FAILED, CANCELLED}
+
+
+def job_key(workflow_input: WorkflowInput) -> str:
+    """Identify a batch job by everything that determines its stories."""
+    digest = hashlib.sha256()
+    for part in (
+        workflow_input.prd_content,
+        workflow_input.tech_spec_content,
+        workflow_input.repo_url,
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return f"batch:{digest.hexdigest()}"
+
+
+def submit_batch(
+    queue: QueueBackend,
+    prd_paths: List[Path],
+    tech_spec_content: str = "",
+    repo_url: str = "",
+    priority: Priority = Priority.BATCH,
+    pipeline: bool = False,
+) -> Dict[Path, str]:
+    """Queue a job per PRD; returns the job id of each PRD."""
+    names = [path.stem for path in prd_paths]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"PRD file names must be unique: {', '.join(duplicates)}")
+    jobs: Dict[Path, str] = {}
+    for path in prd_paths:
+        workflow_input = WorkflowInput(
+            prd_content=path.read_text(encoding="utf-8"),
+            tech_spec_content=tech_spec_content,
+            repo_url=repo_url,
+            pipeline=pipeline,
+        )
+        jobs[path] = queue.enqueue(
+            workflow_input, priority, key=job_key(workflow_input)
+        )
+    get_logger().info("batch_submitted", jobs=len(jobs))
+    return jobs
+
+
+def publish(job: QueuedJob, path: Path) -> None:
+    """Write a succeeded job's stories to ``path`` atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    temporary.write_text(
+        json.dumps(job.result or [], ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    os.replace(temporary, path)
+
+
+def wait_and_publish(
+    queue: QueueBackend,
+    jobs: Dict[Path, str],
+    output_dir: Path,
+    poll_interval: float = 1.0,
+    timeout: float = 0,
+) -> Dict[Path, QueuedJob]:
+    """Wait for the batch's jobs and publish each as it succeeds.
+
+    Returns the final state of every job; jobs still unfinished when
+    ``timeout`` (0 for none) runs out are returned as they are.
+    """
+    logger = get_logger()
+    deadline = time.monotonic() + timeout if timeout else None
+    pending = dict(jobs)
+    finished: Dict[Path, QueuedJob] = {}
+    while pending:
+        for path, job_id in list(pending.items()):
+            job = queue.get(job_id)
+            if job is None or job.status not in FINISHED:
+                continue
+            del pending[path]
+            finished[path] = job
+            if job.status == SUCCEEDED:
+                publish(job, output_dir / f"{path.stem}.json")
+            logger.info("batch_job_finished", prd=str(path), status=job.status)
+        if not pending or (deadline is not None and time.monotonic() >= deadline):
+            break
+        time.sleep(poll_interval)
+    for path, job_id in pending.items():
+        current = queue.get(job_id)
+        if current is not None:
+            finished[path] = current
+    return finished
@@ -2,22 +2,49 @@ import argparse
 import asyncio
 import sys
 from pathlib import Path
+from .deadline import EXIT_TIMEOUT, DeadlineExceeded, run_with_deadline
+from .journal import RunJournal, decode_input
 from .types import WorkflowInput
 from .workflow import w1
 from .config import Settings
+from .daemon import forward
+from . import metrics
+
+
+def _run(workflow_input: WorkflowInput, journal: RunJournal, timeout: float) -> None:
+    """Run the workflow, exiting with a resumable status on timeout or Ctrl-C."""
+    try:
+        asyncio.run(run_with_deadline(w1(workflow_input, journal), timeout))
+    except DeadlineExceeded as e:
+        print(f"\nError: {e}", file=sys.stderr)
+        print(f"Continue with --resume {journal.run_id}", file=sys.stderr)
+        sys.exit(EXIT_TIMEOUT)
+    except KeyboardInterrupt:
+        print(
+            f"\nInterrupted. Continue with --resume {journal.run_id}", file=sys.stderr
+        )
+        sys.exit(130)
+    finally:
+        journal.close()
+        metrics.export(Settings())  # pyright: ignore[reportCallIssue]
 
 
 def main():
     """Main CLI entry point for StoryMachine."""
 
+    # Hand the invocation to a warm daemon when one is running
+    exit_code = forward("cli", sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+
     parser = argparse.ArgumentParser(
         description="StoryMachine - Generate context-enriched user stories from PRD and tech spec"
     )
     parser.add_argument(
         "--prd",
         type=str,
-        required=True,
-        help="Path to the Product Requirements Document (PRD) file",
+        required=False,
+        help="Path to the Product Requirements Document (PRD) file (required unless --resume)",
     )
     parser.add_argument(
         "--tech-spec",
@@ -29,11 +56,58 @@ def main():
         "--repo",
         type=str,
         required=False,
-        help="GitHub repository URL (e.g., https://github.com/owner/repo) (optional)",
+        help="GitHub repository URL (e.g., https://github.com/owner/repo) or local checkout path (optional)",
+    )
+    parser.add_argument(
+        "--refresh-repo-context",
+        action="store_true",
+        help="Ignore cached repository context and query the repository again",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Draft stories while codebase context is gathered in the background",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        required=False,
+        metavar="RUN_ID",
+        help="Resume an interrupted run from its last checkpoint",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        required=False,
+        metavar="SECONDS",
+        help="Abort the run after this many seconds (default: STORYMACHINE_RUN_TIMEOUT, 0 for none)",
     )
 
     args = parser.parse_args()
 
+    settings = Settings()  # pyright: ignore[reportCallIssue]
+    run_dir = Path(settings.run_dir)
+    timeout = settings.run_timeout if args.timeout is None else args.timeout
+
+    if args.resume:
+        try:
+            journal = RunJournal.resume(run_dir, args.resume)
+        except FileNotFoundError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        if "input" not in journal:
+            print(f"Error: Run {args.resume} has no recorded input", file=sys.stderr)
+            sys.exit(1)
+        print(f"Resuming run: {journal.run_id}")
+        print(f"Model: {settings.model}")
+        print(f"Reasoning Effort: {settings.reasoning_effort}")
+        print()
+        _run(decode_input(journal.get("input")), journal, timeout)
+        return
+
+    if not args.prd:
+        parser.error("--prd is required unless --resume is given")
+
     prd_path = Path(args.prd)
 
     if not prd_path.exists():
@@ -66,15 +140,19 @@ def main():
         prd_content=prd_content,
         tech_spec_content=tech_spec_content,
         repo_url=repo_url,
+        refresh_repo_context=args.refresh_repo_context,
+        pipeline=args.pipeline,
     )
 
+    journal = RunJournal.create(run_dir)
+    print(f"Run ID: {journal.run_id} (continue with --resume {journal.run_id})")
+
     # Display current configuration
-    settings = Settings()  # pyright: ignore[reportCallIssue]
     print(f"Model: {settings.model}")
     print(f"Reasoning Effort: {settings.reasoning_effort}")
     print()
 
-    asyncio.run(w1(workflow_input))
+    _run(workflow_input, journal, timeout)
 
 
 if __name__ == "__main__":
@@ -11,6 +11,73 @@ class Settings(BaseSettings):
     model: str = Field("glm-4-flash", alias="MODEL")
     reasoning_effort: str = Field("low", alias="REASONING_EFFORT")
     api_provider: str = Field("zhipuai", alias="API_PROVIDER")  # "openai" or "zhipuai"
+    run_dir: str = Field(".storymachine/runs", alias="STORYMACHINE_RUN_DIR")
+    repo_cache_dir: str = Field(
+        ".storymachine/repo-cache", alias="STORYMACHINE_REPO_CACHE_DIR"
+    )
+    repo_cache_max_entries: int = Field(64, alias="STORYMACHINE_REPO_CACHE_MAX_ENTRIES")
+    repo_tree_token_budget: int = Field(4000, alias="STORYMACHINE_REPO_TREE_TOKENS")
+    repo_relevant_files: int = Field(200, alias="STORYMACHINE_REPO_RELEVANT_FILES")
+    repo_question_concurrency: int = Field(
+        4, alias="STORYMACHINE_REPO_QUESTION_CONCURRENCY"
+    )
+    repo_question_max_iterations: int = Field(
+        25, alias="STORYMACHINE_REPO_QUESTION_MAX_ITERATIONS"
+    )
+    repo_question_timeout: float = Field(
+        300.0, alias="STORYMACHINE_REPO_QUESTION_TIMEOUT"
+    )
+    repo_context_max_chars: int = Field(
+        6000, alias="STORYMACHINE_REPO_CONTEXT_MAX_CHARS"
+    )
+    speculative_stories: int = Field(2, alias="STORYMACHINE_SPECULATIVE_STORIES")
+    story_concurrency: int = Field(4, alias="STORYMACHINE_STORY_CONCURRENCY")
+    # Model history sent per topic: token cap and turns kept verbatim
+    memory_max_tokens: int = Field(12000, alias="STORYMACHINE_MEMORY_MAX_TOKENS")
+    memory_recent_turns: int = Field(2, alias="STORYMACHINE_MEMORY_RECENT_TURNS")
+    # Identical model requests in flight at once share one provider call
+    coalesce_requests: bool = Field(True, alias="STORYMACHINE_COALESCE_REQUESTS")
+    # Retries of a model call rejected with a transient error (429, 5xx, ...)
+    provider_max_retries: int = Field(2, alias="STORYMACHINE_PROVIDER_MAX_RETRIES")
+    # Timeouts in seconds; 0 disables a limit
+    run_timeout: float = Field(0, alias="STORYMACHINE_RUN_TIMEOUT")
+    stage_timeout: float = Field(600.0, alias="STORYMACHINE_STAGE_TIMEOUT")
+    repo_context_timeout: float = Field(
+        1800.0, alias="STORYMACHINE_REPO_CONTEXT_TIMEOUT"
+    )
+    daemon_socket: str | None = Field(None, alias="STORYMACHINE_DAEMON_SOCKET")
+    # HTTP server: jobs running at once (more are queued) and finished jobs kept
+    server_max_jobs: int = Field(32, alias="STORYMACHINE_SERVER_MAX_JOBS")
+    server_job_retention: int = Field(1000, alias="STORYMACHINE_SERVER_JOB_RETENTION")
+    # Interactive jobs fail if a review gets no answer within this many seconds
+    # (0 waits forever); each job keeps its newest events for late clients
+    server_feedback_timeout: float = Field(
+        3600.0, alias="STORYMACHINE_SERVER_FEEDBACK_TIMEOUT"
+    )
+    server_max_events: int = Field(1000, alias="STORYMACHINE_SERVER_MAX_EVENTS")
+    # Server jobs take remote repository URLs only, and local checkouts just
+    # inside these directories (separated by os.pathsep; empty allows none)
+    server_local_repo_roots: str = Field(
+        "", alias="STORYMACHINE_SERVER_LOCAL_REPO_ROOTS"
+    )
+    # Durable job queue: location (a SQLite path or backend://location), lease
+    # and retry policy, worker pool size. Use journal mode DELETE for a SQLite
+    # database on a volume shared between hosts.
+    queue_path: str = Field(".storymachine/queue.db", alias="STORYMACHINE_QUEUE_PATH")
+    queue_journal_mode: str = Field("WAL", alias="STORYMACHINE_QUEUE_JOURNAL_MODE")
+    queue_visibility_timeout: float = Field(
+        300.0, alias="STORYMACHINE_QUEUE_VISIBILITY_TIMEOUT"
+    )
+    queue_max_attempts: int = Field(3, alias="STORYMACHINE_QUEUE_MAX_ATTEMPTS")
+    queue_retry_backoff: float = Field(10.0, alias="STORYMACHINE_QUEUE_RETRY_BACKOFF")
+    queue_preempt_after: float = Field(5.0, alias="STORYMACHINE_QUEUE_PREEMPT_AFTER")
+    queue_workers: int = Field(2, alias="STORYMACHINE_QUEUE_WORKERS")
+    queue_worker_concurrency: int = Field(
+        4, alias="STORYMACHINE_QUEUE_WORKER_CONCURRENCY"
+    )
+    # Prometheus textfile written by CLI, worker and batch runs (the server
+    # serves /metrics instead); worker pool processes add their index
+    metrics_textfile: str | None = Field(None, alias="STORYMACHINE_METRICS_TEXTFILE")
 
     class Config:
         env_file = ".env"
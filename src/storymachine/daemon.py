@@ -0,0 +1,429 @@
+"""Resident warm daemon that StoryMachine CLI invocations attach to.
+
+The daemon pays interpreter startup, SDK imports, settings parsing and prompt
+loading once. Each CLI invocation connects over a Unix socket and hands over
+its stdin/stdout/stderr file descriptors; the daemon forks a child that
+inherits the warm state, attaches to those descriptors and runs the requested
+entry point, so interactive prompts behave exactly as in-process. When no
+daemon is listening the CLI falls back to in-process execution.
+
+This module only imports the standard library at import time so the client
+path stays cheap.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Entry points the daemon is allowed to run, keyed by the name clients send
+ENTRYPOINTS: Dict[str, str] = {
+    "cli": "storymachine.cli:main",
+    "auto_cli": "storymachine.auto_cli:main",
+}
+
+# Protocol: the client sends MAGIC together with its stdio descriptors, then a
+# length-prefixed JSON request. The daemon replies with a 4-byte exit status.
+# While the request runs the client may send INTERRUPT to relay Ctrl-C.
+MAGIC = b"SM1"
+INTERRUPT = b"I"
+_LENGTH = struct.Struct("!I")
+
+# Seconds a client has to send its whole request; the daemon serves one
+# connection at a time until it forks
+REQUEST_TIMEOUT = 5.0
+
+# Set in the daemon process so forwarded entry points don't forward again
+_in_daemon = False
+
+
+def default_socket_path() -> Path:
+    """Return the socket path, honouring STORYMACHINE_DAEMON_SOCKET.
+
+    Without XDG_RUNTIME_DIR the socket lives in a private directory under the
+    temporary directory, which other users cannot create files in.
+    """
+    from .config import Settings
+
+    settings = Settings()  # pyright: ignore[reportCallIssue]
+    if settings.daemon_socket:
+        return Path(settings.daemon_socket)
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / f"storymachine-{os.getuid()}.sock"
+    return Path(tempfile.gettempdir()) / f"storymachine-{os.getuid()}" / "daemon.sock"
+
+
+def _private(path: Path, kind: int, mode: int) -> bool:
+    """Whether ``path`` is of ``kind``, ours, and closed to other users."""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return (
+        stat.S_IFMT(info.st_mode) == kind
+        and info.st_uid == os.getuid()
+        and stat.S_IMODE(info.st_mode) & ~mode == 0
+    )
+
+
+def _peer_uid(conn: socket.socket) -> Optional[int]:
+    """User id of the process at the other end of ``conn``, where known."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    creds = conn.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+    )
+    _pid, uid, _gid = struct.unpack("3i", creds)
+    return uid
+
+
+def _prepare_socket_dir(socket_path: Path) -> None:
+    """Create the private directory of the default socket path."""
+    directory = socket_path.parent
+    if directory.name != f"storymachine-{os.getuid()}":
+        return
+    try:
+        directory.mkdir(mode=0o700)
+    except FileExistsError:
+        pass
+    if not _private(directory, stat.S_IFDIR, 0o700):
+        raise PermissionError(
+            f"{directory} must be a directory owned by you with mode 0700"
+        )
+
+
+def _recv_exactly(conn: socket.socket, size: int) -> bytes:
+    """Read exactly ``size`` bytes from ``conn`` or raise ConnectionError."""
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return data
+
+
+def forward(entrypoint: str, argv: List[str]) -> Optional[int]:
+    """Run ``entrypoint`` in the daemon if one is running.
+
+    Returns the exit status of the forwarded run, or None when the caller
+    should execute in-process (no daemon, unsupported platform, or already
+    inside the daemon).
+    """
+    if _in_daemon or not hasattr(socket, "send_fds"):
+        return None
+
+    # The request carries the environment (API keys, tokens) and the
+    # terminal: only hand them to a daemon run by the same user
+    socket_path = default_socket_path()
+    if not _private(socket_path, stat.S_IFSOCK, 0o600):
+        return None
+
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(str(socket_path))
+    except OSError:
+        # Stale socket file from a daemon that is no longer running
+        conn.close()
+        return None
+    if _peer_uid(conn) not in (None, os.getuid()):
+        conn.close()
+        return None
+
+    request = json.dumps(
+        {
+            "entrypoint": entrypoint,
+            "argv": argv,
+            "cwd": os.getcwd(),
+            "env": dict(os.environ),
+        }
+    ).encode("utf-8")
+
+    with conn:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        socket.send_fds(conn, [MAGIC], [0, 1, 2])
+        conn.sendall(_LENGTH.pack(len(request)) + request)
+
+        while True:
+            try:
+                (status,) = struct.unpack("!i", _recv_exactly(conn, 4))
+                return status
+            except KeyboardInterrupt:
+                # The forked child is not in our process group, relay Ctrl-C
+                conn.sendall(INTERRUPT)
+            except ConnectionError:
+                return 1
+
+
+def _run_entrypoint(name: str, argv: List[str]) -> int:
+    """Run a registered entry point and translate SystemExit into a status."""
+    module_name, func_name = ENTRYPOINTS[name].split(":")
+    main = getattr(importlib.import_module(module_name), func_name)
+    sys.argv = [f"storymachine-{name}", *argv]
+    try:
+        main()
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+def _watch_for_interrupts(conn: socket.socket) -> None:
+    """Turn INTERRUPT messages from the client into SIGINT for this process."""
+    import threading
+
+    def run() -> None:
+        try:
+            while True:
+                data = conn.recv(1)
+                if not data:
+                    return
+                if data == INTERRUPT:
+                    os.kill(os.getpid(), signal.SIGINT)
+        except OSError:
+            return
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def _serve_child(conn: socket.socket, fds: List[int], request: Dict) -> None:
+    """Attach to the client's terminal and run the request (never returns)."""
+    status = 1
+    try:
+        # The request is read; the run itself may take as long as it needs
+        conn.settimeout(None)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdin = open(0, "r", encoding="utf-8", closefd=False)
+        sys.stdout = open(1, "w", buffering=1, encoding="utf-8", closefd=False)
+        sys.stderr = open(2, "w", buffering=1, encoding="utf-8", closefd=False)
+
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+
+        _watch_for_interrupts(conn)
+        status = _run_entrypoint(request["entrypoint"], request["argv"])
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            conn.sendall(struct.pack("!i", status))
+        finally:
+            os._exit(status)
+
+
+def warm_up(program: str = "storymachine-daemon") -> None:
+    """Import the workflow, build the provider client and load the prompts.
+
+    Also used by the HTTP server, whose jobs share the clients built here.
+    """
+    from . import workflow  # noqa: F401
+    from .ai import get_provider, preload_prompts
+    from .config import Settings
+
+    settings = Settings()  # pyright: ignore[reportCallIssue]
+    try:
+        provider = get_provider(settings.api_provider)
+        # Build the shared client now so children inherit its TLS setup
+        if settings.api_provider == "zhipuai":
+            provider.get_zhipu_client()
+        else:
+            provider.get_client(settings.openai_api_key)
+            provider.get_async_client(settings.openai_api_key)
+    except Exception as e:
+        # A missing key or SDK only fails the runs that need it, not the daemon
+        print(f"{program}: provider not preloaded: {e}", file=sys.stderr)
+    preload_prompts()
+
+
+def _handle_connection(conn: socket.socket) -> bool:
+    """Serve one client connection. Returns False when asked to shut down."""
+    msg, fds, _flags, _addr = socket.recv_fds(conn, len(MAGIC), 3)
+    if _peer_uid(conn) not in (None, os.getuid()):
+        for fd in fds:
+            os.close(fd)
+        return True
+    if not msg:
+        # Liveness probe (`storymachine-daemon status`) connected and left
+        return True
+    try:
+        (length,) = _LENGTH.unpack(_recv_exactly(conn, _LENGTH.size))
+        request = json.loads(_recv_exactly(conn, length).decode("utf-8"))
+    except BaseException:
+        for fd in fds:
+            os.close(fd)
+        raise
+
+    if request.get("command") == "shutdown":
+        for fd in fds:
+            os.close(fd)
+        conn.sendall(struct.pack("!i", 0))
+        return False
+
+    if msg != MAGIC or len(fds) != 3 or request.get("entrypoint") not in ENTRYPOINTS:
+        for fd in fds:
+            os.close(fd)
+        conn.sendall(struct.pack("!i", 2))
+        return True
+
+    pid = os.fork()
+    if pid == 0:
+        _serve_child(conn, fds, request)
+
+    for fd in fds:
+        os.close(fd)
+    print(
+        f"storymachine-daemon: serving {request['entrypoint']} in pid {pid}",
+        file=sys.stderr,
+        flush=True,
+    )
+    return True
+
+
+def _reap_children() -> None:
+    """Collect exit statuses of finished children."""
+    while True:
+        try:
+            pid, _status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def serve(socket_path: Path) -> None:
+    """Warm up and serve CLI invocations on ``socket_path`` until stopped."""
+    global _in_daemon
+    _in_daemon = True
+
+    warm_up()
+
+    _prepare_socket_dir(socket_path)
+    socket_path.unlink(missing_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Create the socket with mode 0600 rather than narrowing it after bind
+    umask = os.umask(0o177)
+    try:
+        server.bind(str(socket_path))
+    finally:
+        os.umask(umask)
+    server.listen(64)
+    server.settimeout(1.0)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(
+        f"storymachine-daemon: listening on {socket_path}", file=sys.stderr, flush=True
+    )
+
+    try:
+        running = True
+        while running:
+            _reap_children()
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            with conn:
+                conn.settimeout(REQUEST_TIMEOUT)
+                try:
+                    running = _handle_connection(conn)
+                except (OSError, ValueError) as e:
+                    print(f"storymachine-daemon: bad request: {e}", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        socket_path.unlink(missing_ok=True)
+        print("storymachine-daemon: stopped", file=sys.stderr, flush=True)
+
+
+def stop(socket_path: Path) -> bool:
+    """Ask a running daemon to shut down. Returns False if none is running."""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(str(socket_path))
+    except OSError:
+        return False
+    request = json.dumps({"command": "shutdown"}).encode("utf-8")
+    with conn:
+        socket.send_fds(conn, [MAGIC], [])
+        conn.sendall(_LENGTH.pack(len(request)) + request)
+        try:
+            _recv_exactly(conn, 4)
+        except ConnectionError:
+            pass
+    return True
+
+
+def main():
+    """Entry point for the StoryMachine daemon."""
+    parser = argparse.ArgumentParser(
+        description="StoryMachine daemon - keep a warm process for CLI invocations"
+    )
+    parser.add_argument(
+        "action",
+        nargs="?",
+        choices=["serve", "stop", "status"],
+        default="serve",
+        help="Run the daemon in the foreground (default), stop it, or check it",
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        required=False,
+        help="Unix socket path (defaults to STORYMACHINE_DAEMON_SOCKET or a per-user path)",
+    )
+    args = parser.parse_args()
+
+    if not hasattr(socket, "send_fds"):
+        print("Error: the daemon requires Unix domain sockets", file=sys.stderr)
+        sys.exit(1)
+
+    socket_path = Path(args.socket) if args.socket else default_socket_path()
+
+    if args.action == "stop":
+        if not stop(socket_path):
+            print(f"No daemon running on {socket_path}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Stopped daemon on {socket_path}")
+    elif args.action == "status":
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(socket_path))
+        except OSError:
+            print(f"No daemon running on {socket_path}")
+            sys.exit(1)
+        finally:
+            probe.close()
+        print(f"Daemon running on {socket_path}")
+    else:
+        serve(socket_path)
+
+
+if __name__ == "__main__":
+    # Run through the importable module so the entry points forked from here
+    # see _in_daemon set and don't forward back to the daemon
+    from storymachine.daemon import main as daemon_main
+
+    daemon_main()
@@ -0,0 +1,86 @@
+"""Run deadlines and per-stage timeouts.
+
+The current deadline lives in a context variable, so it follows tasks and
+``asyncio.to_thread`` calls down to the provider requests, which use the time
+left as their HTTP timeout. A stage can only shorten the deadline it runs
+under, never extend it.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Exit status of the CLIs when a run or stage runs out of time, as with
+# coreutils timeout(1)
+EXIT_TIMEOUT = 124
+
+# Absolute time.monotonic() value by which the current work must finish
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """A run or stage did not finish within its time budget."""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+
+def clamp(seconds: Optional[float]) -> Optional[float]:
+    """Shorten a timeout to the current deadline; 0 or None means no limit."""
+    left = remaining()
+    if not seconds:
+        return left
+    return seconds if left is None else min(seconds, left)
+
+
+def timeout_kwargs() -> Dict[str, Any]:
+    """``timeout=`` keyword for provider SDK calls, if there is a deadline."""
+    left = remaining()
+    return {} if left is None else {"timeout": left}
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Run the block under a deadline ``seconds`` from now (0 or None: none)."""
+    limit = clamp(seconds)
+    token = _deadline.set(None if limit is None else time.monotonic() + limit)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@asynccontextmanager
+async def stage_timeout(name: str, seconds: Optional[float]) -> AsyncIterator[None]:
+    """Cancel the block if it outlasts ``seconds`` or the current deadline.
+
+    Cancellation is delivered at the block's next await, so outstanding
+    requests are aborted and ``finally`` clauses run, and is reported as
+    DeadlineExceeded naming the stage.
+    """
+    limit = clamp(seconds)
+    if limit is None:
+        yield
+        return
+    try:
+        async with asyncio.timeout(limit):
+            with deadline(limit):
+                yield
+    except DeadlineExceeded:
+        # A nested stage already ran out of time
+        raise
+    except TimeoutError as e:
+        raise DeadlineExceeded(f"{name} timed out after {limit:.0f}s") from e
+
+
+async def run_with_deadline(awaitable: Awaitable[T], seconds: Optional[float]) -> T:
+    """Await a whole run under a run-level deadline."""
+    async with stage_timeout("Run", seconds):
+        return await awaitable
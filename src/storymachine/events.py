@@ -0,0 +1,122 @@
+"""Event channel between a running workflow and a remote client.
+
+The workflow emits events as they happen (stories drafted, stages started and
+finished, tokens used, stories detailed) and, where the CLI would prompt,
+asks the channel for feedback instead. A client such as the server's
+WebSocket endpoint reads the events and sends the feedback back, naming the
+review it answers. Events may be emitted from worker threads; they are handed
+to the channel's loop. The newest events are kept, so a client that connects
+late or reconnects sees the run from the start.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from .deadline import stage_timeout
+from .types import FeedbackResponse, FeedbackStatus
+
+# Last event of every channel
+END = "end"
+
+
+class EventChannel:
+    """Events of one run, replayed to every reader, and its feedback.
+
+    ``feedback_timeout`` bounds the wait for each answer (0 waits forever)
+    and only the last ``max_events`` events are kept.
+    """
+
+    def __init__(self, feedback_timeout: float = 0, max_events: int = 1000) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.get_ident()
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=max(max_events, 1))
+        # Events emitted so far, including those dropped from the history
+        self._count = 0
+        self._arrived = asyncio.Event()
+        self._pending: Optional[Tuple[str, asyncio.Future]] = None
+        self.feedback_timeout = feedback_timeout
+        self.closed = False
+
+    def emit(self, type_: str, **data: Any) -> None:
+        """Queue an event for the client; safe to call from any thread."""
+        if self.closed:
+            return
+        event = {"type": type_, **data}
+        if threading.get_ident() == self._thread:
+            self._append(event)
+        else:
+            self._loop.call_soon_threadsafe(self._append, event)
+        if type_ == END:
+            self.closed = True
+
+    def _append(self, event: Dict[str, Any]) -> None:
+        self._history.append(event)
+        self._count += 1
+        # Wake the readers waiting on this event and start a new one
+        self._arrived.set()
+        self._arrived = asyncio.Event()
+
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the kept events, then new ones until the end of the run."""
+        index = 0
+        while True:
+            # A reader that fell behind the kept history skips what was dropped
+            index = max(index, self._count - len(self._history))
+            if index == self._count:
+                await self._arrived.wait()
+                continue
+            event = self._history[index - (self._count - len(self._history))]
+            index += 1
+            yield event
+            if event["type"] == END:
+                return
+
+    async def ask(self, key: str) -> FeedbackResponse:
+        """Ask the client to review ``key`` and wait for its answer.
+
+        Raises DeadlineExceeded if no answer comes within the feedback timeout.
+        """
+        future: asyncio.Future = self._loop.create_future()
+        self._pending = (key, future)
+        try:
+            self.emit("review", key=key)
+            async with stage_timeout(f"Feedback on {key}", self.feedback_timeout):
+                return await future
+        finally:
+            self._pending = None
+
+    def answer(self, key: str, response: FeedbackResponse) -> bool:
+        """Deliver the client's feedback on review ``key`` to the workflow.
+
+        Returns False, leaving the workflow waiting, unless ``key`` is the
+        review it is waiting for.
+        """
+        if self._pending is None:
+            return False
+        pending, future = self._pending
+        if key != pending or future.done():
+            return False
+        future.set_result(response)
+        return True
+
+
+def feedback_from_message(message: Dict[str, Any]) -> Optional[FeedbackResponse]:
+    """Parse a client feedback message, e.g. ``{"approved": false, "comment": ...}``."""
+    if "approved" not in message:
+        return None
+    if message["approved"]:
+        return FeedbackResponse(status=FeedbackStatus.ACCEPTED)
+    return FeedbackResponse(
+        status=FeedbackStatus.REJECTED, comment=str(message.get("comment") or "")
+    )
+
+
+def emit(type_: str, **data: Any) -> None:
+    """Emit an event on the current session's channel, if it has one."""
+    from .session import current_session
+
+    session = current_session()
+    if session is not None and session.channel is not None:
+        session.channel.emit(type_, **data)
@@ -0,0 +1,581 @@
+"""Durable story generation queue backed by SQLite.
+
+Jobs survive restarts and are shared by every worker process using the same
+database, on one host or, with the database on a shared volume, on several.
+A worker claims the most urgent available job and holds it under a lease
+(the visibility timeout) that it renews while the job runs; a job whose
+worker dies becomes available again when its lease expires. Failed attempts
+are retried with exponential backoff up to ``max_attempts``.
+
+Every claim issues a new lease token, and only the holder of the current
+token can renew, release or finish the job. A worker that was presumed dead
+but is still running can't overwrite the result of the worker that took
+over: each job's result is published exactly once.
+
+Jobs belong to a priority class. Interactive jobs are always claimed before
+normal ones, and normal ones before batch jobs. When an interactive job has
+been left waiting because every worker is busy, the batch job started last
+is preempted: it goes back to the queue, without counting as an attempt,
+and its worker takes the interactive job instead.
+
+Other stores can be plugged in: ``open_queue`` picks the backend from the
+scheme of the queue location (``sqlite://`` by default, see BACKENDS).
+"""
+
+import importlib
+import json
+import secrets
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from enum import IntEnum
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Protocol
+
+from . import metrics
+from .config import Settings
+from .journal import new_run_id
+from .logging import get_logger
+from .types import WorkflowInput
+
+# Job states in the database; jobs.JobStatus uses the same values
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Longest delay between two attempts of a job
+MAX_BACKOFF = 3600.0
+
+# Queue backend modules by location scheme. Each exposes
+# ``open_backend(location, settings)`` returning a QueueBackend.
+BACKENDS: Dict[str, str] = {
+    "sqlite": "storymachine.job_queue",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_expires REAL,
+    worker TEXT,
+    error TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority, available_at);
+"""
+
+# Columns added after the first release of the schema
+_COLUMNS = {"lease": "TEXT", "key": "TEXT"}
+
+
+class Priority(IntEnum):
+    """Priority classes; lower values are claimed first."""
+
+    INTERACTIVE = 0
+    NORMAL = 1
+    BATCH = 2
+
+
+@dataclass
+class QueuedJob:
+    """A job as stored in the queue."""
+
+    id: str
+    priority: Priority
+    workflow_input: WorkflowInput
+    status: str
+    attempts: int
+    max_attempts: int
+    created_at: float
+    available_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    worker: Optional[str] = None
+    error: Optional[str] = None
+    # Story records of a succeeded job
+    result: Optional[List[Dict[str, Any]]] = None
+    # Token of the claim this copy was made under; see JobQueue.claim()
+    lease: Optional[str] = None
+    # Caller's identifier for the job; enqueueing the same key again is a no-op
+    key: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "QueuedJob":
+        return cls(
+            id=row["id"],
+            priority=Priority(row["priority"]),
+            workflow_input=WorkflowInput(**json.loads(row["payload"])),
+            status=row["status"],
+            attempts=row["attempts"],
+            max_attempts=row["max_attempts"],
+            created_at=row["created_at"],
+            available_at=row["available_at"],
+            started_at=row["started_at"],
+            finished_at=row["finished_at"],
+            worker=row["worker"],
+            error=row["error"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            lease=row["lease"],
+            key=row["key"],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serialisable view of the job, without its input."""
+        return {
+            "id": self.id,
+            "key": self.key,
+            "priority": self.priority.name.lower(),
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "worker": self.worker,
+            "error": self.error,
+            "stories": self.result,
+        }
+
+
+class QueueBackend(Protocol):
+    """Operations workers and the batch runner need from a queue store.
+
+    Methods that take a QueuedJob act only while the job is still held under
+    that copy's lease, and report whether it was.
+    """
+
+    def enqueue(
+        self,
+        workflow_input: WorkflowInput,
+        priority: Priority = Priority.NORMAL,
+        max_attempts: Optional[int] = None,
+        key: Optional[str] = None,
+    ) -> str: ...
+
+    def get(self, job_id: str) -> Optional[QueuedJob]: ...
+
+    def jobs(self, status: Optional[str] = None) -> List[QueuedJob]: ...
+
+    def claim(self, worker: str, visibility_timeout: float) -> Optional[QueuedJob]: ...
+
+    def heartbeat(self, job: QueuedJob, visibility_timeout: float) -> bool: ...
+
+    def preempt(
+        self, job: QueuedJob, worker: str, visibility_timeout: float
+    ) -> Optional[QueuedJob]: ...
+
+    def release(self, job: QueuedJob) -> bool: ...
+
+    def complete(self, job: QueuedJob, stories: List[Dict[str, Any]]) -> bool: ...
+
+    def fail(self, job: QueuedJob, error: str, retry: bool = True) -> bool: ...
+
+    def cancel(self, job_id: str) -> Optional[QueuedJob]: ...
+
+    def stats(self) -> Dict[str, Any]: ...
+
+
+def backoff_delay(attempts: int, base: float) -> float:
+    """Delay before retrying a job that has failed ``attempts`` times."""
+    return min(base * 2 ** max(attempts - 1, 0), MAX_BACKOFF)
+
+
+class JobQueue:
+    """Priority job queue in a SQLite database shared by worker processes.
+
+    Every call opens its own connection, so one queue object can be used from
+    several threads; writes that claim or move jobs run in an immediate
+    transaction, so two workers never claim the same job. WAL journaling
+    only works for processes on one host: a database on a shared network
+    volume needs ``journal_mode="DELETE"``.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_attempts: int = 3,
+        retry_backoff: float = 10.0,
+        preempt_after: float = 5.0,
+        journal_mode: str = "WAL",
+    ):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.preempt_after = preempt_after
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute(f"PRAGMA journal_mode={journal_mode}")
+            db.executescript(_SCHEMA)
+            existing = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            for column, declaration in _COLUMNS.items():
+                if column not in existing:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {declaration}")
+            db.execute("CREATE UNIQUE INDEX IF NOT EXISTS jobs_key ON jobs (key)")
+
+    @contextmanager
+    def _connect(self, write: bool = False) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            if write:
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    yield db
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+                db.execute("COMMIT")
+            else:
+                yield db
+        finally:
+            db.close()
+
+    def enqueue(
+        self,
+        workflow_input: WorkflowInput,
+        priority: Priority = Priority.NORMAL,
+        max_attempts: Optional[int] = None,
+        key: Optional[str] = None,
+    ) -> str:
+        """Add a job and return its id.
+
+        If a job with ``key`` already exists, its id is returned instead, so a
+        batch that is submitted again doesn't run twice. A failed or cancelled
+        job with ``key`` is queued again from this submission instead.
+        """
+        job_id = new_run_id()
+        payload = asdict(workflow_input)
+        # Gathered by the run itself
+        payload["repo_context"] = None
+        now = time.time()
+        with self._connect(write=True) as db:
+            row = None
+            if key is not None:
+                row = db.execute(
+                    "SELECT id, status FROM jobs WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row["status"] not in (FAILED, CANCELLED):
+                    return row["id"]
+            if row is not None:
+                job_id = row["id"]
+                db.execute(
+                    "UPDATE jobs SET priority = ?, payload = ?, status = ?,"
+                    " attempts = 0, max_attempts = ?, available_at = ?,"
+                    " started_at = NULL, finished_at = NULL, lease = NULL,"
+                    " lease_expires = NULL, worker = NULL, error = NULL,"
+                    " result = NULL WHERE id = ?",
+                    (
+                        int(priority),
+                        json.dumps(payload, ensure_ascii=False),
+                        QUEUED,
+                        max_attempts or self.max_attempts,
+                        now,
+                        job_id,
+                    ),
+                )
+            else:
+                db.execute(
+                    "INSERT INTO jobs (id, key, priority, payload, status,"
+                    " max_attempts, created_at, available_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job_id,
+                        key,
+                        int(priority),
+                        json.dumps(payload, ensure_ascii=False),
+                        QUEUED,
+                        max_attempts or self.max_attempts,
+                        now,
+                        now,
+                    ),
+                )
+        get_logger().info(
+            "job_enqueued",
+            job_id=job_id,
+            priority=priority.name,
+            requeued=row is not None,
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[QueuedJob]:
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return QueuedJob.from_row(row) if row else None
+
+    def jobs(self, status: Optional[str] = None) -> List[QueuedJob]:
+        """Jobs in the queue, oldest first, optionally only those in ``status``."""
+        query = "SELECT * FROM jobs"
+        params: tuple = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._connect() as db:
+            rows = db.execute(query + " ORDER BY created_at", params).fetchall()
+        return [QueuedJob.from_row(row) for row in rows]
+
+    def claim(self, worker: str, visibility_timeout: float) -> Optional[QueuedJob]:
+        """Lease the most urgent available job to ``worker``, if there is one.
+
+        The returned copy carries the lease token the other calls check.
+        """
+        now = time.time()
+        with self._connect(write=True) as db:
+            self._expire_leases(db, now)
+            row = db.execute(
+                "SELECT id FROM jobs WHERE status = ? AND available_at <= ?"
+                " ORDER BY priority, available_at LIMIT 1",
+                (QUEUED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._lease(db, row["id"], worker, now, visibility_timeout)
+            job = self._fetch(db, row["id"])
+        get_logger().info(
+            "job_claimed", job_id=job.id, worker=worker, attempt=job.attempts
+        )
+        return job
+
+    def heartbeat(self, job: QueuedJob, visibility_timeout: float) -> bool:
+        """Extend the lease on a job.
+
+        Returns False when the lease is no longer held (the job was cancelled
+        or the lease expired and the job was handed on): the worker should stop.
+        """
+        with self._connect(write=True) as db:
+            updated = db.execute(
+                "UPDATE jobs SET lease_expires = ?"
+                " WHERE id = ? AND lease = ? AND status = ?",
+                (time.time() + visibility_timeout, job.id, job.lease, RUNNING),
+            ).rowcount
+        return updated == 1
+
+    def preempt(
+        self, job: QueuedJob, worker: str, visibility_timeout: float
+    ) -> Optional[QueuedJob]:
+        """Swap a running batch job for an interactive job kept waiting.
+
+        Only the most recently started batch job is preempted, and only once
+        an interactive job has waited ``preempt_after`` seconds, which means
+        no worker was free to take it. Returns the interactive job, now leased
+        to ``worker``, or None if the job should keep running.
+        """
+        now = time.time()
+        with self._connect(write=True) as db:
+            newest = db.execute(
+                "SELECT id, lease FROM jobs WHERE status = ? AND priority = ?"
+                " ORDER BY started_at DESC LIMIT 1",
+                (RUNNING, int(Priority.BATCH)),
+            ).fetchone()
+            if newest is None or (newest["id"], newest["lease"]) != (job.id, job.lease):
+                return None
+            waiting = db.execute(
+                "SELECT id FROM jobs WHERE status = ? AND priority = ?"
+                " AND available_at <= ? ORDER BY available_at LIMIT 1",
+                (QUEUED, int(Priority.INTERACTIVE), now - self.preempt_after),
+            ).fetchone()
+            if waiting is None:
+                return None
+            # Preemption isn't a failure: the batch job is requeued as is
+            self._requeue(db, job.id, now)
+            self._lease(db, waiting["id"], worker, now, visibility_timeout)
+            interactive = self._fetch(db, waiting["id"])
+        get_logger().info(
+            "job_preempted", job_id=job.id, worker=worker, preempted_by=interactive.id
+        )
+        return interactive
+
+    def release(self, job: QueuedJob) -> bool:
+        """Return a job to the queue without counting the attempt, e.g. when
+        its worker shuts down. Returns False if the lease was lost."""
+        with self._connect(write=True) as db:
+            if not self._held(db, job):
+                return False
+            self._requeue(db, job.id, time.time())
+        get_logger().info("job_released", job_id=job.id, worker=job.worker)
+        return True
+
+    def complete(self, job: QueuedJob, stories: List[Dict[str, Any]]) -> bool:
+        """Publish a job's stories. Returns False, publishing nothing, if the
+        lease was lost."""
+        with self._connect(write=True) as db:
+            if not self._held(db, job):
+                return False
+            result = json.dumps(stories, ensure_ascii=False)
+            self._set_finished(db, job.id, SUCCEEDED, result=result, error=None)
+        get_logger().info("job_completed", job_id=job.id, worker=job.worker)
+        return True
+
+    def fail(self, job: QueuedJob, error: str, retry: bool = True) -> bool:
+        """Record a failed attempt; the job is retried after a backoff if it
+        has attempts left. Returns False if the lease was lost."""
+        with self._connect(write=True) as db:
+            row = db.execute(
+                "SELECT attempts, max_attempts FROM jobs"
+                " WHERE id = ? AND lease = ? AND status = ?",
+                (job.id, job.lease, RUNNING),
+            ).fetchone()
+            if row is None:
+                return False
+            if not retry or row["attempts"] >= row["max_attempts"]:
+                self._set_finished(db, job.id, FAILED, error=error)
+                get_logger().warning("job_failed", job_id=job.id, error=error)
+                return True
+            delay = backoff_delay(row["attempts"], self.retry_backoff)
+            metrics.RETRIES.inc(kind="job")
+            db.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, lease = NULL,"
+                " lease_expires = NULL, error = ?, available_at = ? WHERE id = ?",
+                (QUEUED, error, time.time() + delay, job.id),
+            )
+        get_logger().warning(
+            "job_retry_scheduled", job_id=job.id, error=error, delay=delay
+        )
+        return True
+
+    def cancel(self, job_id: str) -> Optional[QueuedJob]:
+        """Cancel a queued or running job; its worker stops at its next
+        heartbeat. Returns None for unknown jobs."""
+        with self._connect(write=True) as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, lease = NULL,"
+                " lease_expires = NULL WHERE id = ? AND status IN (?, ?)",
+                (CANCELLED, time.time(), job_id, QUEUED, RUNNING),
+            )
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return QueuedJob.from_row(row) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and wait of the oldest available job per priority class,
+        and the number of jobs running."""
+        now = time.time()
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT priority, COUNT(*) AS depth, MIN(available_at) AS oldest"
+                " FROM jobs WHERE status = ? GROUP BY priority",
+                (QUEUED,),
+            ).fetchall()
+            running = db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (RUNNING,)
+            ).fetchone()[0]
+        depth = {p.name.lower(): 0 for p in Priority}
+        wait = {p.name.lower(): 0.0 for p in Priority}
+        for row in rows:
+            name = Priority(row["priority"]).name.lower()
+            depth[name] = row["depth"]
+            wait[name] = round(max(now - row["oldest"], 0.0), 3)
+        return {"depth": depth, "oldest_wait": wait, "running": running}
+
+    def _held(self, db: sqlite3.Connection, job: QueuedJob) -> bool:
+        row = db.execute(
+            "SELECT 1 FROM jobs WHERE id = ? AND lease = ? AND status = ?",
+            (job.id, job.lease, RUNNING),
+        ).fetchone()
+        return row is not None
+
+    def _fetch(self, db: sqlite3.Connection, job_id: str) -> QueuedJob:
+        return QueuedJob.from_row(
+            db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        )
+
+    def _lease(
+        self,
+        db: sqlite3.Connection,
+        job_id: str,
+        worker: str,
+        now: float,
+        visibility_timeout: float,
+    ) -> None:
+        db.execute(
+            "UPDATE jobs SET status = ?, worker = ?, lease = ?,"
+            " attempts = attempts + 1, started_at = ?, lease_expires = ?"
+            " WHERE id = ?",
+            (
+                RUNNING,
+                worker,
+                secrets.token_hex(8),
+                now,
+                now + visibility_timeout,
+                job_id,
+            ),
+        )
+
+    def _requeue(self, db: sqlite3.Connection, job_id: str, now: float) -> None:
+        db.execute(
+            "UPDATE jobs SET status = ?, attempts = attempts - 1, worker = NULL,"
+            " lease = NULL, lease_expires = NULL, started_at = NULL,"
+            " available_at = ? WHERE id = ?",
+            (QUEUED, now, job_id),
+        )
+
+    def _expire_leases(self, db: sqlite3.Connection, now: float) -> None:
+        """Requeue jobs whose worker stopped renewing its lease."""
+        expired = db.execute(
+            "SELECT id, attempts, max_attempts FROM jobs"
+            " WHERE status = ? AND lease_expires < ?",
+            (RUNNING, now),
+        ).fetchall()
+        for row in expired:
+            error = "Lease expired: the worker stopped responding"
+            if row["attempts"] >= row["max_attempts"]:
+                self._set_finished(db, row["id"], FAILED, error=error)
+            else:
+                db.execute(
+                    "UPDATE jobs SET status = ?, worker = NULL, lease = NULL,"
+                    " lease_expires = NULL, error = ?, available_at = ? WHERE id = ?",
+                    (QUEUED, error, now, row["id"]),
+                )
+                metrics.RETRIES.inc(kind="lease_expired")
+            get_logger().warning("job_lease_expired", job_id=row["id"])
+
+    def _set_finished(
+        self, db: sqlite3.Connection, job_id: str, status: str, **fields: Any
+    ) -> None:
+        columns = {
+            "status": status,
+            "finished_at": time.time(),
+            "lease": None,
+            "lease_expires": None,
+        }
+        columns.update(fields)
+        assignments = ", ".join(f"{name} = ?" for name in columns)
+        db.execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ?", (*columns.values(), job_id)
+        )
+
+
+def open_backend(location: str, settings: Settings) -> JobQueue:
+    """The SQLite queue in the database file at ``location``."""
+    return JobQueue(
+        Path(location),
+        max_attempts=settings.queue_max_attempts,
+        retry_backoff=settings.queue_retry_backoff,
+        preempt_after=settings.queue_preempt_after,
+        journal_mode=settings.queue_journal_mode,
+    )
+
+
+def open_queue(settings: Settings, location: Optional[str] = None) -> QueueBackend:
+    """The queue at ``location``, or at the configured queue path.
+
+    A location without a ``scheme://`` prefix is a SQLite database path.
+    """
+    location = location or settings.queue_path
+    scheme, separator, rest = location.partition("://")
+    if not separator:
+        scheme, rest = "sqlite", location
+    if scheme not in BACKENDS:
+        raise ValueError(
+            f"Unknown queue backend: {scheme!r} (expected one of {', '.join(BACKENDS)})"
+        )
+    return importlib.import_module(BACKENDS[scheme]).open_backend(rest, settings)
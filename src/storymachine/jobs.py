@@ -0,0 +1,209 @@
+"""Asynchronous story generation jobs for the HTTP server.
+
+A job runs the workflow in its own Session on the server's event loop. At
+most ``max_running`` jobs run at once; the rest wait their turn. Finished
+stories are collected as they arrive, so a client polling a running job
+already sees them, and every job streams its events on an EventChannel.
+Interactive jobs run the review workflow and wait on the channel for each
+approval, and fail if none comes in time. Finished jobs are kept for a while
+for their results and then forgotten, oldest first.
+"""
+
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from .config import Settings
+from .deadline import DeadlineExceeded, run_with_deadline
+from .events import END, EventChannel
+from .journal import new_run_id
+from .logging import get_logger
+from .session import Session
+from .story_output import story_record
+from .types import Story, WorkflowInput
+
+
+class JobStatus(Enum):
+    """Lifecycle of a job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED = {JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED}
+
+
+class Job:
+    """One story generation request and its results so far.
+
+    The job is also the workflow's story sink: stories are stored as they
+    are finished.
+    """
+
+    def __init__(
+        self,
+        workflow_input: WorkflowInput,
+        interactive: bool = False,
+        settings: Optional[Settings] = None,
+    ):
+        settings = settings or Settings()  # pyright: ignore[reportCallIssue]
+        self.id = new_run_id()
+        self.workflow_input = workflow_input
+        self.interactive = interactive
+        # Created here so it belongs to the running loop
+        self.channel = EventChannel(
+            settings.server_feedback_timeout, settings.server_max_events
+        )
+        self.status = JobStatus.QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        # Number of stories once the breakdown is done
+        self.total: Optional[int] = None
+        self.stories: Dict[int, Story] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def begin(self, count: int) -> None:
+        self.total = count
+
+    def write(self, number: int, story: Story) -> None:
+        self.stories[number] = story
+
+    def end(self) -> None:
+        pass
+
+    def to_dict(self, include_stories: bool = True) -> Dict[str, Any]:
+        """JSON-serialisable view of the job."""
+        data: Dict[str, Any] = {
+            "id": self.id,
+            "status": self.status.value,
+            "interactive": self.interactive,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "total": self.total,
+            "completed": len(self.stories),
+        }
+        if include_stories:
+            data["stories"] = [
+                story_record(number, self.stories[number])
+                for number in sorted(self.stories)
+            ]
+        return data
+
+
+class JobManager:
+    """Runs jobs on the current event loop with bounded concurrency."""
+
+    def __init__(
+        self,
+        max_running: Optional[int] = None,
+        retention: Optional[int] = None,
+        settings: Optional[Settings] = None,
+    ):
+        self.settings = settings or Settings()  # pyright: ignore[reportCallIssue]
+        self.max_running = max(max_running or self.settings.server_max_jobs, 1)
+        self.retention = retention or self.settings.server_job_retention
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def submit(self, workflow_input: WorkflowInput, interactive: bool = False) -> Job:
+        """Queue a job; it starts as soon as a slot is free.
+
+        An interactive job waits for feedback on its channel at every review.
+        """
+        if self._slots is None:
+            # Created lazily so it belongs to the loop the server runs on
+            self._slots = asyncio.Semaphore(self.max_running)
+        job = Job(workflow_input, interactive, self.settings)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, self._slots))
+        get_logger().info("job_submitted", job_id=job.id)
+        self._forget_finished()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        """All known jobs, oldest first."""
+        return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job. Returns None for unknown jobs."""
+        job = self._jobs.get(job_id)
+        if job is not None and not job.finished and job.task is not None:
+            job.task.cancel()
+        return job
+
+    async def shutdown(self) -> None:
+        """Cancel all unfinished jobs and wait for them to stop."""
+        tasks = [
+            job.task for job in self._jobs.values() if job.task and not job.finished
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job: Job, slots: asyncio.Semaphore) -> None:
+        from .ai import reasoning_summaries_to
+        from .workflow import generate_stories_auto, w1
+
+        logger = get_logger()
+        try:
+            async with slots:
+                job.status = JobStatus.RUNNING
+                job.started_at = time.time()
+                logger.info("job_started", job_id=job.id)
+                job.channel.emit("status", status=job.status.value)
+                session = Session.create(
+                    job.workflow_input, settings=self.settings, channel=job.channel
+                )
+                if job.interactive:
+                    # Keep the server's stdout free of every job's reasoning
+                    with reasoning_summaries_to(sys.stderr):
+                        stories = await run_with_deadline(
+                            w1(session.workflow_input, session=session),
+                            self.settings.run_timeout,
+                        )
+                    job.begin(len(stories))
+                    for number, story in enumerate(stories, 1):
+                        job.write(number, story)
+                else:
+                    await run_with_deadline(
+                        generate_stories_auto(session.workflow_input, job, session),
+                        self.settings.run_timeout,
+                    )
+            job.status = JobStatus.SUCCEEDED
+        except asyncio.CancelledError:
+            job.status = JobStatus.CANCELLED
+            # Finish quietly: the cancellation came from cancel() or shutdown()
+        except DeadlineExceeded as e:
+            job.status = JobStatus.FAILED
+            job.error = f"Timed out: {e}"
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            job.channel.emit(END, status=job.status.value, error=job.error)
+            logger.info(
+                "job_finished", job_id=job.id, status=job.status.value, error=job.error
+            )
+
+    def _forget_finished(self) -> None:
+        finished = [job.id for job in self._jobs.values() if job.finished]
+        for job_id in finished[: max(len(finished) - self.retention, 0)]:
+            del self._jobs[job_id]
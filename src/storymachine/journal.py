@@ -0,0 +1,142 @@
+"""Run journal for checkpointed, resumable StoryMachine workflow runs.
+
+Every stage result and every approval is appended to a JSON Lines file as soon
+as it happens. Resuming a run replays the journal so completed LLM calls and
+approvals are not repeated.
+"""
+
+import json
+import os
+import secrets
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .types import FeedbackResponse, FeedbackStatus, Story, WorkflowInput
+
+
+def new_run_id() -> str:
+    """Return a sortable, unique run identifier."""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+
+
+class RunJournal:
+    """Append-only journal of stage results keyed by workflow step.
+
+    Each record is written with a single ``write`` on a file opened in append
+    mode, so a crash can at worst leave a torn final line, which is ignored on
+    load. A journal without a path keeps records in memory only.
+    """
+
+    def __init__(self, path: Optional[Path] = None, run_id: Optional[str] = None):
+        self.path = path
+        self.run_id = run_id or (path.stem if path else new_run_id())
+        self._records: Dict[str, Any] = {}
+        self._fd: Optional[int] = None
+
+        if path is None:
+            return
+
+        needs_newline = False
+        if path.exists():
+            data = path.read_bytes()
+            needs_newline = bool(data) and not data.endswith(b"\n")
+            for line in data.splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write from a crash, everything before it is intact
+                    continue
+                self._records[record["key"]] = record["value"]
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        if needs_newline:
+            os.write(self._fd, b"\n")
+
+    @classmethod
+    def create(cls, run_dir: Path) -> "RunJournal":
+        """Start a new journal in ``run_dir``."""
+        run_id = new_run_id()
+        return cls(run_dir / f"{run_id}.jsonl", run_id)
+
+    @classmethod
+    def resume(cls, run_dir: Path, run_id: str) -> "RunJournal":
+        """Open the journal of an earlier run, raising if it doesn't exist."""
+        path = run_dir / f"{run_id}.jsonl"
+        if not path.exists():
+            raise FileNotFoundError(f"No journal for run {run_id} in {run_dir}")
+        return cls(path, run_id)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._records
+
+    def get(self, key: str) -> Any:
+        """Return the recorded value for ``key`` or None."""
+        return self._records.get(key)
+
+    def record(self, key: str, value: Any) -> None:
+        """Persist ``value`` under ``key``."""
+        self._records[key] = value
+        if self._fd is None:
+            return
+        line = json.dumps({"key": key, "value": value}, ensure_ascii=False) + "\n"
+        os.write(self._fd, line.encode("utf-8"))
+
+    def close(self) -> None:
+        """Close the journal file."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def encode_story(story: Story) -> Dict[str, Any]:
+    """Convert a story into a journal record."""
+    return asdict(story)
+
+
+def decode_story(data: Dict[str, Any]) -> Story:
+    """Rebuild a story from a journal record."""
+    return Story(**data)
+
+
+def encode_stories(stories: List[Story]) -> List[Dict[str, Any]]:
+    """Convert stories into journal records."""
+    return [encode_story(story) for story in stories]
+
+
+def decode_stories(data: List[Dict[str, Any]]) -> List[Story]:
+    """Rebuild stories from journal records."""
+    return [decode_story(story) for story in data]
+
+
+def encode_feedback(response: FeedbackResponse) -> Dict[str, Any]:
+    """Convert a feedback response into a journal record."""
+    return {"status": response.status.value, "comment": response.comment}
+
+
+def decode_feedback(data: Dict[str, Any]) -> FeedbackResponse:
+    """Rebuild a feedback response from a journal record."""
+    return FeedbackResponse(
+        status=FeedbackStatus(data["status"]), comment=data.get("comment")
+    )
+
+
+def encode_input(workflow_input: WorkflowInput) -> Dict[str, Any]:
+    """Convert the workflow input into a journal record.
+
+    The repository context is journaled on its own once it is gathered.
+    """
+    return {
+        "prd_content": workflow_input.prd_content,
+        "tech_spec_content": workflow_input.tech_spec_content,
+        "repo_url": workflow_input.repo_url,
+        "refresh_repo_context": workflow_input.refresh_repo_context,
+        "pipeline": workflow_input.pipeline,
+    }
+
+
+def decode_input(data: Dict[str, Any]) -> WorkflowInput:
+    """Rebuild the workflow input from a journal record."""
+    return WorkflowInput(**data)
@@ -0,0 +1,294 @@
+"""Local checkout support for the codebase context stage.
+
+Lists a working tree with an ``os.scandir`` walk that honours ``.gitignore``
+files and skips vendored directories, and gathers file excerpts so codebase
+questions can be answered from local reads instead of a hosted API.
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Tuple
+
+# Directory names that are never part of the project's own code
+VENDORED_DIRS = frozenset(
+    {
+        ".git",
+        ".hg",
+        ".svn",
+        ".venv",
+        "venv",
+        "__pycache__",
+        ".mypy_cache",
+        ".pytest_cache",
+        ".ruff_cache",
+        ".tox",
+        ".nox",
+        "node_modules",
+        "bower_components",
+        "vendor",
+        "third_party",
+        "site-packages",
+        ".idea",
+        ".vscode",
+    }
+)
+
+# Budget for file excerpts sent along with the codebase questions
+MAX_EXCERPT_FILES = 40
+MAX_EXCERPT_BYTES_PER_FILE = 8_000
+MAX_EXCERPT_BYTES = 200_000
+
+# Bytes read from each candidate when ranking files by their contents
+HEAD_SAMPLE_BYTES = 2_000
+
+# Repository URLs naming a remote; the HTTP server accepts nothing else
+# unless local checkouts are allowed under configured roots
+REMOTE_URL_PREFIXES = ("https://", "http://", "ssh://", "git@")
+
+
+class IgnoreRule(NamedTuple):
+    """A single compiled .gitignore pattern."""
+
+    regex: Pattern[str]
+    negate: bool
+    dir_only: bool
+
+
+def local_repo_path(repo: str) -> Optional[Path]:
+    """Return ``repo`` as a directory path if it names a local checkout."""
+    if not repo or "://" in repo or repo.startswith("git@"):
+        return None
+    path = Path(repo).expanduser()
+    return path.resolve() if path.is_dir() else None
+
+
+def is_remote_url(repo: str) -> bool:
+    """Whether ``repo`` is a remote repository URL rather than a path."""
+    return repo.lower().startswith(REMOTE_URL_PREFIXES)
+
+
+def local_repo_under(repo: str, roots: Iterable[str]) -> Optional[Path]:
+    """Return ``repo`` as a local checkout if it lies inside one of ``roots``.
+
+    Both sides are resolved first, so symlinks and ``..`` can't leave a root.
+    """
+    path = local_repo_path(repo)
+    if path is None:
+        return None
+    for root in roots:
+        if root.strip() and path.is_relative_to(Path(root).expanduser().resolve()):
+            return path
+    return None
+
+
+def _translate_glob(pattern: str) -> str:
+    """Translate a gitignore glob into a regular expression body."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "\\" and i + 1 < len(pattern):
+            i += 1
+            out.append(re.escape(pattern[i]))
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1 : end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def parse_gitignore(text: str) -> List[IgnoreRule]:
+    """Compile the patterns of a .gitignore file."""
+    rules = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        # Trailing spaces are ignored unless escaped
+        line = re.sub(r"(?<!\\) +$", "", line)
+        if not line:
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        # A slash anywhere but the end anchors the pattern to this directory
+        if "/" in line:
+            body = _translate_glob(line.lstrip("/"))
+        else:
+            body = "(?:.*/)?" + _translate_glob(line)
+        try:
+            regex = re.compile(f"^{body}$")
+        except re.error:
+            continue
+        rules.append(IgnoreRule(regex, negate, dir_only))
+    return rules
+
+
+class IgnoreRuleSet(NamedTuple):
+    """Rules from one .gitignore, relative to the directory holding it."""
+
+    base: str
+    rules: List[IgnoreRule]
+    # Alternation of every pattern, to reject non-matching paths in one search
+    any_rule: Pattern[str]
+
+
+def _read_rules(path: Path, base: str) -> Optional[IgnoreRuleSet]:
+    try:
+        text = path.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return None
+    rules = parse_gitignore(text)
+    if not rules:
+        return None
+    any_rule = re.compile("|".join(f"(?:{rule.regex.pattern})" for rule in rules))
+    return IgnoreRuleSet(base, rules, any_rule)
+
+
+def _is_ignored(rel_path: str, is_dir: bool, rule_sets: List[IgnoreRuleSet]) -> bool:
+    """Apply rule sets from the root downwards; the last matching rule wins."""
+    ignored = False
+    for rule_set in rule_sets:
+        path = rel_path[len(rule_set.base) :]
+        if not rule_set.any_rule.match(path):
+            continue
+        for rule in rule_set.rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.match(path):
+                ignored = not rule.negate
+    return ignored
+
+
+def list_local_tree(root: Path) -> List[Dict[str, str]]:
+    """List files under ``root`` in the same shape as ``ask_github.list_tree``.
+
+    Ignored and vendored directories are pruned without being entered, and
+    directory symlinks are not followed.
+    """
+    rule_sets = [
+        rule_set
+        for rule_set in (
+            _read_rules(root / ".git" / "info" / "exclude", ""),
+            _read_rules(root / ".gitignore", ""),
+        )
+        if rule_set
+    ]
+    files: List[Dict[str, str]] = []
+    # Each stack entry carries the rule sets that apply inside that directory
+    stack: List[Tuple[str, str, List[IgnoreRuleSet]]] = [(str(root), "", rule_sets)]
+    while stack:
+        dir_path, rel_dir, rule_sets = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+
+        if rel_dir:
+            nested = _read_rules(Path(dir_path) / ".gitignore", rel_dir + "/")
+            if nested:
+                rule_sets = rule_sets + [nested]
+
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir and entry.name in VENDORED_DIRS:
+                continue
+            if _is_ignored(rel_path, is_dir, rule_sets):
+                continue
+            if is_dir:
+                subdirs.append((entry.path, rel_path, rule_sets))
+            else:
+                files.append({"path": rel_path, "type": "blob"})
+        # Reverse so directories are visited in name order
+        stack.extend(reversed(subdirs))
+    return files
+
+
+def _path_terms(text: str) -> set:
+    return {term for term in re.split(r"[^a-z0-9]+", text.lower()) if len(term) > 2}
+
+
+def select_files(file_paths: List[str], questions: str, limit: int) -> List[str]:
+    """Pick the files most relevant to ``questions`` for reading.
+
+    Files whose path is quoted in the questions come first, followed by files
+    sharing the most path terms with the questions.
+    """
+    question_terms = _path_terms(questions)
+    scored = []
+    for path in file_paths:
+        score = len(_path_terms(path) & question_terms)
+        if path in questions:
+            score += 100
+        if score:
+            scored.append((-score, len(path), path))
+    return [path for _, _, path in sorted(scored)[:limit]]
+
+
+def read_head(root: Path, path: str, size: int = HEAD_SAMPLE_BYTES) -> str:
+    """Return the first ``size`` bytes of a text file, or "" if unreadable."""
+    try:
+        with open(root / path, "rb") as f:
+            data = f.read(size)
+    except OSError:
+        return ""
+    return "" if b"\0" in data else data.decode("utf-8", errors="replace")
+
+
+def read_excerpts(
+    root: Path,
+    paths: List[str],
+    max_bytes_per_file: int = MAX_EXCERPT_BYTES_PER_FILE,
+    max_bytes: int = MAX_EXCERPT_BYTES,
+) -> str:
+    """Read the head of each file into a tagged excerpt block."""
+    excerpts = []
+    total = 0
+    for path in paths:
+        try:
+            with open(root / path, "rb") as f:
+                data = f.read(max_bytes_per_file)
+        except OSError:
+            continue
+        if b"\0" in data:
+            # Binary file
+            continue
+        if total + len(data) > max_bytes:
+            break
+        total += len(data)
+        text = data.decode("utf-8", errors="replace")
+        excerpts.append(f'<file path="{path}">\n{text}\n</file>')
+    return "\n".join(excerpts)
@@ -3,12 +3,19 @@
 import inspect
 import os
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import structlog
+if TYPE_CHECKING:
+    import structlog
+
+_configured = False
 
 
 def configure_logging() -> None:
     """Configure structured logging with JSON output to file."""
+    global _configured
+    import structlog
+
     log_file = Path("storymachine.log")
 
     structlog.configure(
@@ -23,10 +30,17 @@ def configure_logging() -> None:
         logger_factory=structlog.WriteLoggerFactory(file=log_file.open("a")),
         cache_logger_on_first_use=False,
     )
+    _configured = True
 
 
-def get_logger() -> structlog.BoundLogger:
+def get_logger() -> "structlog.BoundLogger":
     """Get a logger with automatic file and function context."""
+    # Configure logging on first use rather than on import, so that commands
+    # which never log (e.g. --help) neither import structlog nor open the file
+    if not _configured:
+        configure_logging()
+    import structlog
+
     frame = inspect.currentframe()
     if frame and frame.f_back:
         caller_frame = frame.f_back
@@ -39,7 +53,3 @@ def get_logger() -> structlog.BoundLogger:
         )
 
     return structlog.get_logger()
-
-
-# Configure logging on import
-configure_logging()
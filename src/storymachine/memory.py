@@ -0,0 +1,139 @@
+"""Local conversation memory for model calls.
+
+Instead of one provider-side conversation that every call appends to, each
+session (workflow run) keeps its own turns, grouped by topic: the story
+list, and the criteria and the context of each story. A call sends only the
+history of its topic: the latest turns verbatim and a short summary of older
+ones, within a token cap. Calls made outside a topic send no history at all.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .tokens import estimate_tokens
+
+# Older turns kept per topic beyond the verbatim ones, as summary lines
+MAX_SUMMARISED_TURNS = 20
+
+
+@dataclass
+class Turn:
+    """A prompt and the model's reply to it."""
+
+    prompt: str
+    reply: str
+
+
+def _clip(text: str, chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= chars else text[:chars] + "…"
+
+
+def reply_text(response: Any) -> str:
+    """The text of a provider reply, including tool call arguments."""
+    if isinstance(response, str):
+        return response
+    parts = []
+    for item in getattr(response, "output", []):
+        if getattr(item, "type", None) == "message":
+            parts.extend(part.text for part in item.content if hasattr(part, "text"))
+        elif getattr(item, "type", None) == "function_call":
+            parts.append(item.arguments)
+    return "\n".join(parts)
+
+
+class ConversationMemory:
+    """Turns of one run, by topic, replayed within ``max_tokens``."""
+
+    def __init__(
+        self, max_tokens: int = 12000, recent_turns: int = 2, summary_chars: int = 200
+    ):
+        self.max_tokens = max_tokens
+        self.recent_turns = recent_turns
+        self.summary_chars = summary_chars
+        self._turns: Dict[str, List[Turn]] = {}
+
+    def record(self, topic: str, prompt: str, reply: str) -> None:
+        """Remember a turn under ``topic``."""
+        turns = self._turns.setdefault(topic, [])
+        turns.append(Turn(prompt, reply))
+        del turns[: -(self.recent_turns + MAX_SUMMARISED_TURNS)]
+
+    def forget(self, prefix: str) -> None:
+        """Drop the turns of every topic whose name starts with ``prefix``."""
+        for name in [name for name in self._turns if name.startswith(prefix)]:
+            del self._turns[name]
+
+    def history(self, topic: str) -> List[Dict[str, str]]:
+        """Chat messages to send before a new prompt under ``topic``.
+
+        Over the cap, the oldest summary lines go first, then the prompts of
+        the verbatim turns are clipped (replies are what later turns build
+        on), and finally the oldest verbatim turns are dropped.
+        """
+        turns = self._turns.get(topic, [])
+        split = max(len(turns) - self.recent_turns, 0)
+        older, recent = turns[:split], turns[split:]
+        while True:
+            messages = self._render(older, recent)
+            size = sum(estimate_tokens(m["content"]) for m in messages)
+            if size <= self.max_tokens or not (older or recent):
+                return messages
+            if older:
+                older = older[1:]
+                continue
+            clipped = [
+                replace(t, prompt=_clip(t.prompt, self.summary_chars)) for t in recent
+            ]
+            long = next((i for i, t in enumerate(recent) if t != clipped[i]), None)
+            if long is not None:
+                recent = recent[:long] + [clipped[long]] + recent[long + 1 :]
+            else:
+                recent = recent[1:]
+
+    def _render(self, older: List[Turn], recent: List[Turn]) -> List[Dict[str, str]]:
+        messages = []
+        if older:
+            lines = [
+                f"- {_clip(t.prompt, self.summary_chars)} → "
+                f"{_clip(t.reply, 2 * self.summary_chars)}"
+                for t in older
+            ]
+            messages.append(
+                {
+                    "role": "system",
+                    "content": "Summary of earlier turns:\n" + "\n".join(lines),
+                }
+            )
+        for turn in recent:
+            messages.append({"role": "user", "content": turn.prompt})
+            messages.append({"role": "assistant", "content": turn.reply})
+        return messages
+
+
+_topic: ContextVar[Optional[str]] = ContextVar("conversation_topic", default=None)
+
+
+@contextmanager
+def topic(name: Optional[str]) -> Iterator[None]:
+    """Attribute model calls made in the block to the ``name`` topic.
+
+    With None, calls in the block send and record no history.
+    """
+    token = _topic.set(name)
+    try:
+        yield
+    finally:
+        _topic.reset(token)
+
+
+def current() -> Optional[Tuple[ConversationMemory, str]]:
+    """The session's memory and the current topic, if calls should use them."""
+    from .session import current_session
+
+    session, name = current_session(), _topic.get()
+    if session is None or session.memory is None or name is None:
+        return None
+    return session.memory, name
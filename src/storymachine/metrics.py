@@ -0,0 +1,400 @@
+"""Prometheus-compatible metrics.
+
+Metrics are kept in process and rendered in the Prometheus text exposition
+format: the HTTP server serves them on /metrics, and CLI, worker and batch
+runs write them to a textfile (STORYMACHINE_METRICS_TEXTFILE) for the node
+exporter's textfile collector. Only the standard library is used.
+
+Model calls are labelled with the stage they were made in: the label of the
+current progress stage with numbers removed, so "Detailing story 3" and
+"Detailing story 4" are both "Detailing story".
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+if TYPE_CHECKING:
+    from .config import Settings
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; model calls take from well under a second to several minutes
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _sample(name: str, labels: Dict[str, str], value: float) -> str:
+    if not labels:
+        return f"{name} {_format_value(value)}"
+    pairs = ",".join(f'{key}="{_escape(str(v))}"' for key, v in labels.items())
+    return f"{name}{{{pairs}}} {_format_value(value)}"
+
+
+class _Metric:
+    type_ = "untyped"
+
+    def __init__(self, name: str, help_: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class _Value(_Metric):
+    """A metric with one value per label combination.
+
+    With ``collect`` values are also read at render time: it returns the
+    value of each label combination.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+    ):
+        super().__init__(name, help_, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self.collect = collect
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self.collect is not None:
+            try:
+                values.update(self.collect())
+            except Exception:
+                # A broken source must not break the whole scrape
+                pass
+        return [
+            _sample(self.name, self._labels(key), value)
+            for key, value in sorted(values.items())
+        ]
+
+
+class Counter(_Value):
+    """A count that only goes up."""
+
+    type_ = "counter"
+
+
+class Gauge(_Value):
+    """A value that goes up and down."""
+
+    type_ = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Observations counted in cumulative buckets, with their sum and count."""
+
+    type_ = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help_, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label combination: bucket counts, sum, count
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            return self._values.get(self._key(labels), ([], 0.0, 0))[2]
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = sorted(
+                (k, (list(c), s, n)) for k, (c, s, n) in self._values.items()
+            )
+        lines = []
+        for key, (counts, total, count) in values:
+            labels = self._labels(key)
+            for bound, bucket_count in zip(self.buckets, counts):
+                bucket = {**labels, "le": _format_value(bound)}
+                lines.append(_sample(f"{self.name}_bucket", bucket, bucket_count))
+            lines.append(_sample(f"{self.name}_sum", labels, total))
+            lines.append(_sample(f"{self.name}_count", labels, count))
+        return lines
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class Registry:
+    """The metrics of a process, rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: M) -> M:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _counter(name: str, help_: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help_, labelnames))
+
+
+def _gauge(name: str, help_: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help_, labelnames))
+
+
+PROVIDER_REQUESTS = _counter(
+    "storymachine_provider_requests_total",
+    "Model provider calls by outcome (ok, error, rate_limited, cancelled).",
+    ("provider", "model", "stage", "outcome"),
+)
+PROVIDER_LATENCY = REGISTRY.register(
+    Histogram(
+        "storymachine_provider_request_seconds",
+        "Duration of model provider calls.",
+        ("provider", "model", "stage"),
+    )
+)
+RATE_LIMITED = _counter(
+    "storymachine_provider_rate_limited_total",
+    "Model provider calls rejected with HTTP 429.",
+    ("provider", "model"),
+)
+TOKENS = _counter(
+    "storymachine_tokens_total",
+    "Model tokens used, as reported by the provider.",
+    ("provider", "model", "stage"),
+)
+CACHE_HITS = _counter(
+    "storymachine_cache_hits_total",
+    "Lookups answered from a cache.",
+    ("cache",),
+)
+CACHE_MISSES = _counter(
+    "storymachine_cache_misses_total",
+    "Lookups a cache could not answer.",
+    ("cache",),
+)
+RETRIES = _counter(
+    "storymachine_retries_total",
+    "Work retried after a failure.",
+    ("kind",),
+)
+PARSE_FAILURES = _counter(
+    "storymachine_parse_failures_total",
+    "Model responses from which no stories could be parsed.",
+    ("provider",),
+)
+ACTIVE_WORKFLOWS = _gauge(
+    "storymachine_active_workflows",
+    "Workflow runs in progress.",
+    ("workflow",),
+)
+QUEUE_DEPTH = _gauge(
+    "storymachine_queue_depth",
+    "Jobs waiting to run, by priority class.",
+    ("priority",),
+)
+QUEUE_OLDEST_WAIT = _gauge(
+    "storymachine_queue_oldest_wait_seconds",
+    "How long the oldest waiting job has waited, by priority class.",
+    ("priority",),
+)
+
+
+def _coalesced() -> Dict[LabelValues, float]:
+    from .ai import coalescing_stats
+
+    return {(): coalescing_stats()["coalesced"]}
+
+
+REGISTRY.register(
+    Counter(
+        "storymachine_coalesced_requests_total",
+        "Model requests served by an identical request already in flight.",
+        collect=_coalesced,
+    )
+)
+
+
+def current_stage() -> str:
+    """Stage label for metrics of a call made in the current context."""
+    from .progress import current_label
+
+    label = current_label()
+    if not label:
+        return "none"
+    return re.sub(r"\s+", " ", re.sub(r"\d+", "", label)).strip()
+
+
+def model_labels() -> Dict[str, str]:
+    """Provider and model of the current session."""
+    from .session import get_settings
+
+    settings = get_settings()
+    return {"provider": settings.api_provider, "model": settings.model}
+
+
+def _rate_limited(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429
+
+
+@contextmanager
+def provider_call() -> Iterator[None]:
+    """Count and time the model provider call made in the block."""
+    labels = {**model_labels(), "stage": current_stage()}
+    started = time.monotonic()
+    outcome = "cancelled"
+    try:
+        yield
+        outcome = "ok"
+    except Exception as e:
+        outcome = "error"
+        if _rate_limited(e):
+            outcome = "rate_limited"
+            RATE_LIMITED.inc(provider=labels["provider"], model=labels["model"])
+        raise
+    finally:
+        PROVIDER_LATENCY.observe(time.monotonic() - started, **labels)
+        PROVIDER_REQUESTS.inc(**labels, outcome=outcome)
+
+
+def record_tokens(count: int) -> None:
+    """Count model tokens used in the current stage."""
+    TOKENS.inc(count, **model_labels(), stage=current_stage())
+
+
+def record_queue_stats(stats: Dict) -> None:
+    """Set the queue gauges from JobQueue.stats()."""
+    for priority, depth in stats["depth"].items():
+        QUEUE_DEPTH.set(depth, priority=priority)
+    for priority, wait in stats["oldest_wait"].items():
+        QUEUE_OLDEST_WAIT.set(wait, priority=priority)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text format."""
+    return REGISTRY.render()
+
+
+def write_textfile(path: str) -> None:
+    """Write all metrics to ``path`` atomically, for the textfile collector."""
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temporary = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    temporary.write_text(render(), encoding="utf-8")
+    os.replace(temporary, target)
+
+
+def textfile_for(path: str, index: int) -> str:
+    """A textfile path of its own for process ``index`` of a pool."""
+    target = Path(path)
+    return str(target.with_name(f"{target.stem}-{index}{target.suffix}"))
+
+
+def export(settings: "Settings", index: Optional[int] = None) -> None:
+    """Write the textfile if STORYMACHINE_METRICS_TEXTFILE is set."""
+    path = settings.metrics_textfile
+    if not path:
+        return
+    if index is not None:
+        path = textfile_for(path, index)
+    try:
+        write_textfile(path)
+    except OSError as e:
+        from .logging import get_logger
+
+        get_logger().warning("metrics_textfile_failed", path=path, error=str(e))
@@ -0,0 +1,191 @@
+"""Live progress display for concurrent workflow stages.
+
+Every stage in flight gets a line showing its elapsed time and the tokens its
+model calls have used. One asyncio task redraws all lines in place while the
+workflow waits on a foreground stage; background stages are listed alongside
+but never drawn on their own, so they don't interfere with prompts and
+printed output. When the stream isn't a terminal, each stage logs a plain
+start and finish line instead.
+"""
+
+import asyncio
+import itertools
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, TextIO
+
+FRAMES = "|/-\\"
+
+HIDE_CURSOR = "\x1b[?25l"
+SHOW_CURSOR = "\x1b[?25h"
+CLEAR_TO_END = "\x1b[J"
+
+
+class ProgressTask:
+    """A stage shown by the renderer."""
+
+    __slots__ = ("label", "background", "started", "tokens")
+
+    def __init__(self, label: str, background: bool = False):
+        self.label = label
+        self.background = background
+        self.started = time.monotonic()
+        self.tokens = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def _tokens(self) -> str:
+        return f", {self.tokens} tokens" if self.tokens else ""
+
+    def describe(self) -> str:
+        """Live line: label, whole seconds elapsed and tokens so far."""
+        return f"{self.label} ({self.elapsed:.0f}s{self._tokens()})"
+
+    def summary(self) -> str:
+        """Plain finish line for non-terminal output."""
+        return f"{self.label} done ({self.elapsed:.1f}s{self._tokens()})"
+
+
+# The stage that model calls made in the current context report tokens to.
+# Context variables follow tasks and asyncio.to_thread, so a call made
+# anywhere below a tracked stage is attributed to it.
+_current_task: ContextVar[Optional[ProgressTask]] = ContextVar(
+    "progress_task", default=None
+)
+
+
+class ProgressRenderer:
+    """Shows one line per tracked stage on ``stream``."""
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        interval: float = 0.1,
+        is_tty: Optional[bool] = None,
+    ):
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.is_tty = self.stream.isatty() if is_tty is None else is_tty
+        self._tasks: Dict[int, ProgressTask] = {}
+        self._ids = itertools.count()
+        self._frames = itertools.cycle(FRAMES)
+        # Number of lines currently drawn
+        self._drawn = 0
+        self._lock = threading.Lock()
+        self._render_task: Optional[asyncio.Task] = None
+
+    @contextmanager
+    def track(self, label: str, background: bool = False) -> Iterator[ProgressTask]:
+        """Show ``label`` while the block runs."""
+        task = ProgressTask(label, background)
+        with self._lock:
+            task_id = next(self._ids)
+            self._tasks[task_id] = task
+        token = _current_task.set(task)
+        if self.is_tty:
+            self._start_rendering()
+            self.draw()
+        else:
+            self._write(f"{label}...\n")
+        try:
+            yield task
+        finally:
+            _current_task.reset(token)
+            with self._lock:
+                del self._tasks[task_id]
+            if self.is_tty:
+                # Redraw now so the finished line is gone before anything
+                # else is printed
+                self.draw()
+            else:
+                self._write(task.summary() + "\n")
+
+    def draw(self) -> None:
+        """Redraw the live lines in place (terminal only)."""
+        if not self.is_tty:
+            return
+        with self._lock:
+            if not self._in_foreground():
+                self._clear()
+                return
+            frame = next(self._frames)
+            lines = [f"{frame} {task.describe()}" for task in self._tasks.values()]
+            prefix = "" if self._drawn else HIDE_CURSOR
+            self._write(
+                prefix
+                + self._cursor_up()
+                + CLEAR_TO_END
+                + "".join(line + "\n" for line in lines)
+            )
+            self._drawn = len(lines)
+
+    def _in_foreground(self) -> bool:
+        return any(not task.background for task in self._tasks.values())
+
+    def _cursor_up(self) -> str:
+        return f"\x1b[{self._drawn}F" if self._drawn else "\r"
+
+    def _clear(self) -> None:
+        # Called with the lock held
+        if self._drawn:
+            self._write(self._cursor_up() + CLEAR_TO_END + SHOW_CURSOR)
+            self._drawn = 0
+
+    def _write(self, text: str) -> None:
+        self.stream.write(text)
+        self.stream.flush()
+
+    def _start_rendering(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Outside an event loop lines are only drawn on start and finish
+            return
+        if self._render_task is None or self._render_task.done():
+            self._render_task = loop.create_task(self._render())
+
+    async def _render(self) -> None:
+        while self._in_foreground():
+            self.draw()
+            await asyncio.sleep(self.interval)
+        self.draw()
+
+
+_renderer: Optional[ProgressRenderer] = None
+
+
+def get_renderer() -> ProgressRenderer:
+    """Return the process-wide renderer, writing to stderr."""
+    global _renderer
+    if _renderer is None:
+        _renderer = ProgressRenderer()
+    return _renderer
+
+
+def track(label: str, background: bool = False):
+    """Show ``label`` on the process-wide renderer while the block runs."""
+    return get_renderer().track(label, background)
+
+
+def current_label() -> Optional[str]:
+    """Label of the stage the current context is part of, if any."""
+    task = _current_task.get()
+    return task.label if task is not None else None
+
+
+def add_tokens(count: Optional[int]) -> None:
+    """Attribute ``count`` model tokens to the stage of the current context."""
+    from .events import emit
+    from .metrics import record_tokens
+
+    if count:
+        record_tokens(count)
+    task = _current_task.get()
+    if task is not None and count:
+        task.tokens += count
+        emit("tokens", label=task.label, tokens=task.tokens)
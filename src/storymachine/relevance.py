@@ -0,0 +1,128 @@
+"""PRD-aware relevance ranking of repository files.
+
+Scores repository paths against terms from the PRD and tech spec so that only
+the files likely to matter for the feature are shown to the repo-questions
+prompt and to the codebase agent. Scoring is purely local: path tokens and
+identifiers, optionally refined by sampling the head of the best candidates.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Candidates whose file heads are sampled when a reader is available
+HEAD_SAMPLE_CANDIDATES = 200
+
+# Paths passed to the codebase agent as a starting point
+MAX_FOCUS_PATHS = 50
+
+MIN_TERM_LENGTH = 3
+
+# Words too common in documents or paths to say anything about relevance
+STOPWORDS = frozenset(
+    """
+    the and for with that this from are was were will shall should would can
+    could may might must not but all any each every into onto over under than
+    then there their them they what when where which while who whom why how
+    has have had been being use used using our your you its also
+    such only other more most some same both very just via per able new get
+    set add make need needs like etc one two src lib app main index init
+    file files test tests spec docs doc readme txt
+    """.split()
+)
+
+_IDENTIFIER = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9_]*")
+
+
+def _stem(word: str) -> str:
+    """Strip common English suffixes so "payments" matches "payment"."""
+    for suffix in ("ations", "ation", "ings", "ing", "ies", "es", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[: -len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into stemmed, lowercase identifier parts.
+
+    ``snake_case``, ``camelCase`` and ``kebab-case`` identifiers are split
+    into their words, e.g. ``UserAuthService`` gives user, auth and service.
+    """
+    tokens = []
+    for word in _WORD.findall(text):
+        for part in _IDENTIFIER.findall(word.replace("_", " ")):
+            part = part.lower()
+            if len(part) >= MIN_TERM_LENGTH and part not in STOPWORDS:
+                tokens.append(_stem(part))
+    return tokens
+
+
+def document_terms(*documents: str) -> Counter:
+    """Count the terms of the PRD and tech spec."""
+    terms: Counter = Counter()
+    for document in documents:
+        terms.update(tokenize(document))
+    return terms
+
+
+def _path_tokens(path: str) -> List[str]:
+    # Drop the extension so "payment.py" contributes "payment", not "py"
+    directory, _, name = path.rpartition("/")
+    base = name.rsplit(".", 1)[0] if "." in name[1:] else name
+    return tokenize(f"{directory} {base}")
+
+
+def rank_paths(
+    paths: Iterable[str],
+    terms: Counter,
+    read_head: Optional[Callable[[str], str]] = None,
+) -> List[str]:
+    """Return the paths that share terms with the documents, best first.
+
+    Each matching path token scores the term's weight: its frequency in the
+    documents, damped logarithmically, times its rarity across all paths so
+    that tokens like ``service`` that appear everywhere count for little.
+    When ``read_head`` is given, the best candidates also score the
+    identifiers found in the first lines of the file.
+    """
+    path_list = list(paths)
+    if not terms:
+        return []
+
+    tokens_by_path = {path: set(_path_tokens(path)) for path in path_list}
+    document_frequency: Counter = Counter()
+    for tokens in tokens_by_path.values():
+        document_frequency.update(tokens)
+
+    total = len(path_list) or 1
+
+    def weight(term: str) -> float:
+        rarity = math.log((total + 1) / (document_frequency.get(term, 0) + 1)) + 1
+        return (1 + math.log(terms[term])) * rarity
+
+    weights: Dict[str, float] = {term: weight(term) for term in terms}
+
+    scores: Dict[str, float] = {}
+    for path, tokens in tokens_by_path.items():
+        score = sum(weights[token] for token in tokens if token in weights)
+        if score:
+            scores[path] = score
+
+    if read_head is not None:
+        candidates = sorted(scores, key=lambda p: -scores[p])[:HEAD_SAMPLE_CANDIDATES]
+        for path in candidates:
+            head_tokens = set(tokenize(read_head(path)))
+            # Contents count for less than a name match
+            scores[path] += 0.25 * sum(
+                weights[token] for token in head_tokens if token in weights
+            )
+
+    return sorted(scores, key=lambda p: (-scores[p], p))
+
+
+def focus_note(paths: List[str]) -> str:
+    """Describe the most relevant files for the codebase agent's prompt."""
+    listed = "\n".join(f"- {path}" for path in paths[:MAX_FOCUS_PATHS])
+    return f"\n\nStart with these files, which look most relevant:\n{listed}"
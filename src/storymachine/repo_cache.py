@@ -0,0 +1,186 @@
+"""On-disk cache for repository trees and generated codebase context.
+
+Entries are keyed by repository URL and resolved commit SHA, and codebase
+context (raw and compacted) additionally by a hash of the repo-questions
+prompt, so a cached answer is only reused while both the repository and the
+question are unchanged.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from .logging import get_logger
+
+LS_REMOTE_TIMEOUT_SECONDS = 15
+
+
+def _credential_env(repo_url: str, token: Optional[str]) -> Dict[str, str]:
+    """Git config, passed in the environment, that sends ``token`` to the host.
+
+    The token goes in an HTTP header scoped to the repository's host rather
+    than in the URL, where other users could read it from the command line.
+    """
+    parts = urlsplit(repo_url)
+    if not token or parts.scheme != "https" or "@" in parts.netloc:
+        return {}
+    user = "oauth2" if "gitlab" in parts.netloc.lower() else "x-access-token"
+    basic = base64.b64encode(f"{user}:{token}".encode("utf-8")).decode("ascii")
+    return {
+        "GIT_CONFIG_COUNT": "1",
+        "GIT_CONFIG_KEY_0": f"http.https://{parts.netloc}/.extraHeader",
+        "GIT_CONFIG_VALUE_0": f"Authorization: Basic {basic}",
+    }
+
+
+def resolve_commit_sha(repo_url: str, token: Optional[str] = None) -> Optional[str]:
+    """Return the commit SHA of the remote's HEAD, or None if it can't be resolved."""
+    logger = get_logger()
+    env = dict(os.environ, GIT_TERMINAL_PROMPT="0", **_credential_env(repo_url, token))
+    try:
+        result = subprocess.run(
+            ["git", "ls-remote", repo_url, "HEAD"],
+            capture_output=True,
+            text=True,
+            env=env,
+            timeout=LS_REMOTE_TIMEOUT_SECONDS,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning("commit_sha_unresolved", repo_url=repo_url, error=str(e))
+        return None
+
+    fields = result.stdout.split()
+    if result.returncode != 0 or not fields:
+        logger.warning(
+            "commit_sha_unresolved", repo_url=repo_url, returncode=result.returncode
+        )
+        return None
+    return fields[0]
+
+
+def _mtime(path: Path) -> float:
+    """Modification time of a cache entry; one that vanished counts as oldest."""
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return float("-inf")
+
+
+def prompt_hash(prompt: str) -> str:
+    """Return a stable hash of a prompt for use in cache keys."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class RepoContextCache:
+    """Least-recently-used cache of repo trees and codebase context.
+
+    Each entry is a JSON file named after the hash of its key. Reads refresh
+    the file's modification time and writes evict the oldest entries beyond
+    ``max_entries``. Several processes and jobs may share the directory, so an
+    entry can vanish at any time: it is then a miss.
+    """
+
+    def __init__(self, cache_dir: Path, max_entries: int = 64):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def _path(self, *key: str) -> Path:
+        digest = hashlib.sha256("\0".join(key).encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}.json"
+
+    def _get(self, *key: str) -> Any:
+        path = self._path(*key)
+        try:
+            value = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            # Evicted by another process since it was read
+            pass
+        return value
+
+    def _put(self, value: Any, *key: str) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(*key)
+        # Write to a temporary file of this writer's own and rename, so readers
+        # never see a partial entry and concurrent writers never share one
+        fd, tmp_name = tempfile.mkstemp(
+            prefix=f"{path.stem}.", suffix=".tmp", dir=self.cache_dir
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(json.dumps(value, ensure_ascii=False))
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(self.cache_dir.glob("*.json"), key=_mtime, reverse=True)
+        for stale in entries[self.max_entries :]:
+            stale.unlink(missing_ok=True)
+
+    def get_tree(
+        self, repo_url: str, commit_sha: str
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Return the cached tree listing for a commit."""
+        return self._get("tree", repo_url, commit_sha)
+
+    def put_tree(
+        self, repo_url: str, commit_sha: str, tree: List[Dict[str, Any]]
+    ) -> None:
+        """Cache the tree listing for a commit."""
+        self._put(tree, "tree", repo_url, commit_sha)
+
+    def get_context(
+        self, repo_url: str, commit_sha: str, questions_prompt: str
+    ) -> Optional[str]:
+        """Return cached codebase context for a commit and questions prompt."""
+        return self._get("context", repo_url, commit_sha, prompt_hash(questions_prompt))
+
+    def put_context(
+        self, repo_url: str, commit_sha: str, questions_prompt: str, context: str
+    ) -> None:
+        """Cache codebase context for a commit and questions prompt."""
+        self._put(
+            context, "context", repo_url, commit_sha, prompt_hash(questions_prompt)
+        )
+
+    def get_digest(
+        self, repo_url: str, commit_sha: str, questions_prompt: str, max_chars: int
+    ) -> Optional[str]:
+        """Return the cached compacted context for a commit and questions prompt."""
+        return self._get(
+            "digest",
+            repo_url,
+            commit_sha,
+            prompt_hash(questions_prompt),
+            str(max_chars),
+        )
+
+    def put_digest(
+        self,
+        repo_url: str,
+        commit_sha: str,
+        questions_prompt: str,
+        max_chars: int,
+        digest: str,
+    ) -> None:
+        """Cache the compacted context for a commit and questions prompt."""
+        self._put(
+            digest,
+            "digest",
+            repo_url,
+            commit_sha,
+            prompt_hash(questions_prompt),
+            str(max_chars),
+        )
@@ -0,0 +1,51 @@
+"""Helpers for compacting repository context before it is reused.
+
+The answers gathered about a codebase repeat themselves across questions.
+They are deduplicated locally first, then condensed by the model into a
+digest of modules, APIs and constraints that is capped in size.
+"""
+
+import re
+from typing import List, Set
+
+# Lines shorter than this (braces, short code, separators) are never deduplicated
+MIN_DEDUPLICATED_LINE = 20
+
+TRUNCATION_MARKER = "\n[... repository context truncated]"
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def deduplicate_context(text: str) -> str:
+    """Drop repeated paragraphs and repeated long lines, keeping first uses."""
+    seen_paragraphs: Set[str] = set()
+    seen_lines: Set[str] = set()
+    paragraphs: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        key = _normalize(paragraph)
+        if not key or key in seen_paragraphs:
+            continue
+        seen_paragraphs.add(key)
+
+        lines = []
+        for line in paragraph.split("\n"):
+            line_key = _normalize(line)
+            if len(line_key) >= MIN_DEDUPLICATED_LINE and not line_key.startswith("#"):
+                if line_key in seen_lines:
+                    continue
+                seen_lines.add(line_key)
+            lines.append(line)
+        if any(line.strip() for line in lines):
+            paragraphs.append("\n".join(lines))
+    return "\n\n".join(paragraphs)
+
+
+def truncate_context(text: str, max_chars: int) -> str:
+    """Cut ``text`` at a line boundary so it fits in ``max_chars``."""
+    if len(text) <= max_chars:
+        return text
+    limit = max(max_chars - len(TRUNCATION_MARKER), 0)
+    cut = text.rfind("\n", 0, limit)
+    return text[: cut if cut > 0 else limit].rstrip() + TRUNCATION_MARKER
@@ -0,0 +1,104 @@
+"""Concurrent answering of generated codebase questions.
+
+The questions produced from ``repo_questions.md`` are split into independent
+items, each answered concurrently under a shared concurrency limit and a
+per-question time budget, and the answers are merged back in question order.
+"""
+
+import asyncio
+import re
+from concurrent.futures import Executor
+from typing import Awaitable, Callable, List, Optional, TypeVar
+
+from .logging import get_logger
+
+# A list item: "1.", "1)", "Q1:", "-", "*" or "•" at the start of a line
+_ITEM = re.compile(r"^\s*(?:(?:Q\s*)?\d+[.):、]|[-*•])\s+", re.IGNORECASE)
+_HEADING = re.compile(r"^\s*#+\s+")
+
+NO_ANSWER = "(No answer within the question's budget.)"
+
+T = TypeVar("T")
+
+
+def split_questions(text: str) -> List[str]:
+    """Split generated questions into independent items.
+
+    Numbered or bulleted lines start a new question; other lines, including
+    indented sub-items, continue the current one. Headings and blank lines
+    separate groups but are not questions themselves. Text without a list is
+    kept as a single question.
+    """
+    items: List[List[str]] = []
+    current: Optional[List[str]] = None
+    for line in text.splitlines():
+        # Indented sub-items belong to the question above them
+        nested = current is not None and line[:1].isspace()
+        if _ITEM.match(line) and not nested:
+            current = [_ITEM.sub("", line, count=1).strip()]
+            items.append(current)
+        elif _HEADING.match(line) or not line.strip():
+            current = None
+        elif current is not None:
+            current.append(line.strip())
+    questions = [" ".join(item) for item in items if any(item)]
+    return questions or ([text.strip()] if text.strip() else [])
+
+
+def merge_answers(questions: List[str], answers: List[str]) -> str:
+    """Merge answers into one context block, in question order."""
+    return "\n\n".join(
+        f"### Q{i}: {question}\n\n{answer.strip()}"
+        for i, (question, answer) in enumerate(zip(questions, answers), 1)
+    )
+
+
+async def answer_questions(
+    questions: List[str],
+    answer_one: Callable[[str], Awaitable[str]],
+    concurrency: int,
+    timeout: Optional[float],
+) -> List[str]:
+    """Answer each question with ``answer_one`` concurrently.
+
+    At most ``concurrency`` questions are in flight at once, and a question
+    that takes longer than ``timeout`` seconds or fails is answered with
+    NO_ANSWER so the other answers are still used. A question past its budget
+    keeps its slot until its work has really stopped (see run_blocking).
+    """
+    logger = get_logger()
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def answer(index: int, question: str) -> str:
+        await semaphore.acquire()
+        work = asyncio.ensure_future(answer_one(question))
+        work.add_done_callback(lambda _: semaphore.release())
+        try:
+            return await asyncio.wait_for(asyncio.shield(work), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("repo_question_timed_out", index=index, timeout=timeout)
+        except asyncio.CancelledError:
+            work.cancel()
+            raise
+        except Exception as e:
+            logger.warning("repo_question_failed", index=index, error=str(e))
+        work.cancel()
+        return NO_ANSWER
+
+    return list(await asyncio.gather(*(answer(i, q) for i, q in enumerate(questions))))
+
+
+async def run_blocking(executor: Executor, call: Callable[[], T]) -> T:
+    """Run blocking ``call`` in ``executor`` and return its result.
+
+    A thread can't be stopped, so when cancelled this only returns once the
+    thread has finished, keeping the caller's concurrency slot taken.
+    """
+    future = asyncio.get_running_loop().run_in_executor(executor, call)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait({future})
+        if not future.cancelled():
+            future.exception()
+        raise
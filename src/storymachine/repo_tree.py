@@ -0,0 +1,207 @@
+"""Compact, token-budgeted rendering of repository file listings.
+
+Paths are folded into a prefix trie so shared directories appear once.
+Directories holding many files are summarised by file counts and extensions,
+and the rendering is only as deep as the token budget allows: directories
+below the cut-off are shown with a summary of what they contain.
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .tokens import estimate_tokens
+
+DEFAULT_TOKEN_BUDGET = 4_000
+
+# Directories with more files than this list them as a summary line
+DEFAULT_MAX_FILES_PER_DIR = 25
+
+# Number of extensions named in a summary line
+SUMMARY_EXTENSIONS = 3
+
+INDENT = "  "
+
+
+def _extension(filename: str) -> str:
+    dot = filename.rfind(".")
+    return filename[dot:] if dot > 0 else "(no ext)"
+
+
+class _Node:
+    """A directory in the path trie."""
+
+    __slots__ = ("dirs", "files", "_file_count", "_extensions")
+
+    def __init__(self) -> None:
+        self.dirs: Dict[str, "_Node"] = {}
+        self.files: List[str] = []
+        self._file_count: Optional[int] = None
+        self._extensions: Optional[Counter] = None
+
+    def file_count(self) -> int:
+        """Number of files in this directory and below."""
+        if self._file_count is None:
+            self._file_count = len(self.files) + sum(
+                child.file_count() for child in self.dirs.values()
+            )
+        return self._file_count
+
+    def walk(self) -> Iterator["_Node"]:
+        """Yield this directory and every directory below it."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(node.dirs.values())
+
+    def extensions(self) -> Counter:
+        """File extension counts for this directory and below."""
+        # Counted in one pass over the subtree rather than by merging a
+        # Counter per directory, which dominates on sparse, deep trees
+        if self._extensions is None:
+            self._extensions = Counter(
+                _extension(name) for node in self.walk() for name in node.files
+            )
+        return self._extensions
+
+
+def build_trie(paths: Iterable[str]) -> _Node:
+    """Fold slash-separated file paths into a directory trie."""
+    root = _Node()
+    nodes: Dict[str, _Node] = {"": root}
+    for path in paths:
+        directory, _, filename = path.strip("/").rpartition("/")
+        node = nodes.get(directory)
+        if node is None:
+            # Create the directory and any missing ancestors, deepest first
+            missing = []
+            parent_path = directory
+            while parent_path not in nodes:
+                missing.append(parent_path)
+                parent_path = parent_path.rpartition("/")[0]
+            parent = nodes[parent_path]
+            for dir_path in reversed(missing):
+                node = nodes[dir_path] = _Node()
+                parent.dirs[dir_path.rpartition("/")[2]] = node
+                parent = node
+            node = parent
+        node.files.append(filename)
+    return root
+
+
+def _summary(count: int, extensions: Counter) -> str:
+    common = extensions.most_common(SUMMARY_EXTENSIONS)
+    parts = [f"{n} {ext}" for ext, n in common]
+    if len(extensions) > SUMMARY_EXTENSIONS:
+        parts.append("...")
+    noun = "file" if count == 1 else "files"
+    return f"[{count} {noun}: {', '.join(parts)}]"
+
+
+class _Rendering:
+    """Lines of a tree rendered down to a fixed depth.
+
+    Rendering stops as soon as the output grows past ``max_chars``, so a
+    level that is far too large for the budget is abandoned early.
+    """
+
+    def __init__(self, depth: int, max_files: int, max_chars: int):
+        self.depth = depth
+        self.max_files = max_files
+        self.max_chars = max_chars
+        self.lines: List[str] = []
+        self.chars = 0
+        # Whether no directory had to be summarised because of the depth limit
+        self.complete = True
+
+    @property
+    def overflowed(self) -> bool:
+        return self.chars > self.max_chars
+
+    def _add(self, line: str) -> None:
+        self.lines.append(line)
+        self.chars += len(line) + 1
+
+    def render(self, node: _Node, level: int = 0) -> None:
+        """Append the lines for ``node``'s contents."""
+        pad = INDENT * level
+        for name in sorted(node.dirs):
+            if self.overflowed:
+                return
+            child = node.dirs[name]
+            label = f"{name}/"
+            # Collapse chains of directories that only contain one directory
+            while len(child.dirs) == 1 and not child.files:
+                ((name, child),) = child.dirs.items()
+                label += f"{name}/"
+            if level + 1 >= self.depth:
+                summary = _summary(child.file_count(), child.extensions())
+                self._add(f"{pad}{label} {summary}")
+                self.complete = False
+            else:
+                self._add(f"{pad}{label}")
+                self.render(child, level + 1)
+
+        if len(node.files) > self.max_files:
+            extensions = Counter(map(_extension, node.files))
+            self._add(f"{pad}{_summary(len(node.files), extensions)}")
+        else:
+            for name in sorted(node.files):
+                if self.overflowed:
+                    return
+                self._add(f"{pad}{name}")
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+def _truncate(text: str, token_budget: int) -> str:
+    """Keep the leading lines of ``text`` that fit in ``token_budget``."""
+    lines = text.split("\n")
+    kept: List[str] = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line + "\n")
+        if used + cost > token_budget:
+            break
+        kept.append(line)
+        used += cost
+    omitted = len(lines) - len(kept)
+    if omitted:
+        # The marker may slightly overshoot the budget but says what is missing
+        kept.append(f"[... {omitted} more entries]")
+    return "\n".join(kept)
+
+
+def render_tree(
+    paths: Iterable[str],
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_files_per_dir: int = DEFAULT_MAX_FILES_PER_DIR,
+) -> str:
+    """Render file paths as an indented tree that fits in ``token_budget``.
+
+    The tree is rendered one level deeper at a time until it is complete or
+    the next level would exceed the budget. If even the top level is too
+    large, it is cut off after the entries that fit.
+    """
+    root = build_trie(paths)
+    max_chars = token_budget * 4
+    best: Optional[str] = None
+    depth = 1
+    while True:
+        rendering = _Rendering(depth, max_files_per_dir, max_chars)
+        rendering.render(root)
+        if rendering.overflowed or estimate_tokens(rendering.text) > token_budget:
+            break
+        best = rendering.text
+        if rendering.complete:
+            break
+        depth += 1
+    if best is not None:
+        return best
+
+    # Even the top level is too large: render it in full and cut it off
+    rendering = _Rendering(1, max_files_per_dir, max_chars * 2)
+    rendering.render(root)
+    return _truncate(rendering.text, token_budget)
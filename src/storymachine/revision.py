@@ -0,0 +1,250 @@
+"""Targeted revision of a story list.
+
+A rejection comment usually concerns a few stories ("merge 3 and 4"). The
+stories it refers to are found locally, by number or by title, and only those
+are sent to the model in full along with a one-line index of the rest. The
+model answers with a small list of operations (modify, remove, add, order)
+that is applied to the current list.
+
+Rejecting a single story is routed the same way: a comment about its
+acceptance criteria or about its context only reruns that stage.
+"""
+
+import json
+import re
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from .logging import get_logger
+from .relevance import tokenize
+from .types import Story
+
+# Story numbers: "3"; ranges: "3-5", "3~5", "3到5"
+_RANGE = r"(\d{1,3})(?:\s*(?:-|~|–|到|至)\s*(\d{1,3}))?(?!\d|%|\.\d)"
+_JOIN = r"\s*(?:,|，|、|&|\band\b|\bor\b|和|与|及)\s*"
+_NUMBER = re.compile(_RANGE)
+# Numbers after a story marker, and the numbers listed with them: "story 3",
+# "stories 3 and 4", "#3", "第3个"
+_MARKED = re.compile(
+    rf"(?:\bstor(?:y|ies)\b|#|第)\s*{_RANGE}(?:{_JOIN}#?{_RANGE})*", re.IGNORECASE
+)
+# Numbers standing alone, not counting something: "merge 3 and 4", "drop 2.",
+# "把3和4合并", but not "up to 5 languages" or "3个新故事"
+_COUNTERS = "个条种位名项次天年月日周人页张件份"
+_BARE = re.compile(
+    rf"(?<![A-Za-z0-9_.#-]){_RANGE}"
+    r"(?=\s*(?:$|[,，、;；:：!?！？)]|\.(?!\d)|。|&|\band\b|\bor\b)"
+    rf"|(?![{_COUNTERS}])[一-鿿])",
+    re.IGNORECASE,
+)
+_ESTIMATE = re.compile(r"^\s*\[(?:XS|S|M|L|XL)\]\s*", re.IGNORECASE)
+_CJK = re.compile(r"[一-鿿]+")
+
+# Shared title words needed to count a story as mentioned
+MIN_SHARED_TERMS = 2
+MIN_SHARED_BIGRAMS = 3
+
+
+def _bigrams(text: str) -> Set[str]:
+    return {run[i : i + 2] for run in _CJK.findall(text) for i in range(len(run) - 1)}
+
+
+def affected_stories(comment: str, stories: List[Story]) -> List[int]:
+    """Return the 0-based indices of the stories ``comment`` refers to.
+
+    Stories are matched by number (including ranges) or by sharing enough
+    title words with the comment. Only numbers after a story marker or
+    standing alone count, not quantities such as "5 languages". An empty list
+    means the comment doesn't single out any story.
+    """
+    count = len(stories)
+    indices: Set[int] = set()
+    references = [m.group(0) for m in _MARKED.finditer(comment)]
+    references += [m.group(0) for m in _BARE.finditer(comment)]
+    for reference in references:
+        for match in _NUMBER.finditer(reference):
+            start = int(match.group(1))
+            end = int(match.group(2) or start)
+            for number in range(start, min(end, start + count) + 1):
+                if 1 <= number <= count:
+                    indices.add(number - 1)
+
+    comment_terms = set(tokenize(comment))
+    comment_bigrams = _bigrams(comment)
+    for i, story in enumerate(stories):
+        title = _ESTIMATE.sub("", story.title)
+        if title and title in comment:
+            indices.add(i)
+        elif len(comment_terms & set(tokenize(title))) >= MIN_SHARED_TERMS:
+            indices.add(i)
+        elif len(comment_bigrams & _bigrams(title)) >= MIN_SHARED_BIGRAMS:
+            indices.add(i)
+    return sorted(indices)
+
+
+def story_index(stories: List[Story], exclude: List[int]) -> str:
+    """One line per story not in ``exclude``: its number and title."""
+    skipped = set(exclude)
+    return "\n".join(
+        f"{i}. {story.title}"
+        for i, story in enumerate(stories, 1)
+        if i - 1 not in skipped
+    )
+
+
+def story_details(stories: List[Story], indices: List[int]) -> str:
+    """The selected stories in full, as JSON with their numbers."""
+    return json.dumps(
+        [
+            {
+                "number": i + 1,
+                "title": stories[i].title,
+                "acceptance_criteria": stories[i].acceptance_criteria,
+            }
+            for i in indices
+        ],
+        ensure_ascii=False,
+        indent=2,
+    )
+
+
+def parse_operations(text: str) -> Optional[List[Dict[str, Any]]]:
+    """Extract the operation list from a model reply, or None if there is none."""
+    if "```json" in text:
+        start = text.find("```json") + 7
+        text = text[start : text.find("```", start)]
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        data = json.loads(text[start : end + 1])
+    except json.JSONDecodeError:
+        return None
+    operations = data.get("operations") if isinstance(data, dict) else None
+    if not isinstance(operations, list):
+        return None
+    return [op for op in operations if isinstance(op, dict)]
+
+
+def _story_from(op: Dict[str, Any], base: Optional[Story] = None) -> Story:
+    # A modified story may have absorbed others (a merge), so the base
+    # story's context no longer describes it and is gathered again
+    criteria = op.get("acceptance_criteria")
+    return Story(
+        title=str(op.get("title") or (base.title if base else "")),
+        acceptance_criteria=(
+            [str(ac) for ac in criteria]
+            if isinstance(criteria, list)
+            else list(base.acceptance_criteria if base else [])
+        ),
+        enriched_context=op.get("enriched_context") or None,
+    )
+
+
+def apply_operations(
+    stories: List[Story], operations: List[Dict[str, Any]]
+) -> List[Story]:
+    """Apply revision operations to ``stories``.
+
+    Numbers in operations are 1-based and always refer to the list before the
+    revision. Added stories follow the story they were added after (0 for the
+    start, or the end if omitted), also after reordering.
+    """
+    logger = get_logger()
+    count = len(stories)
+    current: Dict[int, Story] = dict(enumerate(stories, 1))
+    added: Dict[int, List[Story]] = {}
+    order: List[int] = list(range(1, count + 1))
+
+    def number_of(op: Dict[str, Any], key: str) -> Optional[int]:
+        try:
+            number = int(op.get(key))  # pyright: ignore[reportArgumentType]
+        except (TypeError, ValueError):
+            return None
+        return number if 0 <= number <= count else None
+
+    for op in operations:
+        kind = op.get("op")
+        if kind == "modify":
+            number = number_of(op, "number")
+            if number in current:
+                current[number] = _story_from(op, current[number])
+                continue
+        elif kind == "remove":
+            number = number_of(op, "number")
+            if number in current:
+                del current[number]
+                continue
+        elif kind == "add":
+            after = number_of(op, "after") if "after" in op else count
+            if after is not None and op.get("title"):
+                added.setdefault(after, []).append(_story_from(op))
+                continue
+        elif kind == "order":
+            numbers = op.get("numbers")
+            if isinstance(numbers, list):
+                listed = [n for n in numbers if isinstance(n, int) and 1 <= n <= count]
+                # Stories the model left out keep their relative order at the end
+                order = list(dict.fromkeys(listed)) + [
+                    n for n in order if n not in listed
+                ]
+                continue
+        logger.warning("revision_operation_ignored", operation=op)
+
+    revised = list(added.get(0, []))
+    for number in order:
+        if number in current:
+            revised.append(current[number])
+        revised.extend(added.get(number, []))
+    return revised
+
+
+# Stages of the per-story detailing loop a comment can be routed to
+CRITERIA = "criteria"
+CONTEXT = "context"
+ALL_STAGES = frozenset({CRITERIA, CONTEXT})
+
+# Explicit prefixes, e.g. "ac: split the second criterion"
+_PREFIXES = {
+    "ac": frozenset({CRITERIA}),
+    "criteria": frozenset({CRITERIA}),
+    "验收": frozenset({CRITERIA}),
+    "context": frozenset({CONTEXT}),
+    "ctx": frozenset({CONTEXT}),
+    "上下文": frozenset({CONTEXT}),
+    "all": ALL_STAGES,
+    "both": ALL_STAGES,
+    "全部": ALL_STAGES,
+}
+_PREFIX = re.compile(r"^\s*([a-z]+|[一-鿿]+)\s*[:：]\s*", re.IGNORECASE)
+
+# Words that name one stage. Only these count: routing to one stage keeps
+# the other verbatim, so a comment that merely uses a word like "then" or
+# "api" must rerun both rather than lose half its effect.
+_CRITERIA_WORDS = re.compile(
+    r"\b(?:acs?|acceptance|criteri(?:on|a))\b|验收",
+    re.IGNORECASE,
+)
+_CONTEXT_WORDS = re.compile(
+    r"\b(?:context|background)\b|上下文|背景",
+    re.IGNORECASE,
+)
+
+
+def revision_stages(comment: str) -> Tuple[FrozenSet[str], str]:
+    """Decide which detailing stages a rejection comment concerns.
+
+    An explicit prefix (``ac:``, ``context:``, ``both:``) wins and is
+    stripped from the comment. Otherwise a comment that names exactly one
+    stage (acceptance criteria, or context/background) goes to that stage;
+    any other comment reruns both stages.
+    """
+    match = _PREFIX.match(comment)
+    if match and match.group(1).lower() in _PREFIXES:
+        return _PREFIXES[match.group(1).lower()], comment[match.end() :].strip()
+
+    stages = set()
+    if _CRITERIA_WORDS.search(comment):
+        stages.add(CRITERIA)
+    if _CONTEXT_WORDS.search(comment):
+        stages.add(CONTEXT)
+    return (frozenset(stages) if len(stages) == 1 else ALL_STAGES), comment
@@ -0,0 +1,194 @@
+"""HTTP API for StoryMachine: story generation as asynchronous jobs.
+
+POST /jobs starts a job from a PRD, an optional tech spec and an optional
+repository and returns at once; GET /jobs/{id} reports its status and the
+stories finished so far, and DELETE /jobs/{id} cancels it. The WebSocket
+/jobs/{id}/events streams the job's events as they happen; for interactive
+jobs the client answers each review on the same socket with
+``{"type": "feedback", "key": ..., "approved": ..., "comment": ...}``, where
+``key`` is the one sent in the ``review`` event. Jobs take remote
+repository URLs only; server-side checkouts must be under the roots in
+STORYMACHINE_SERVER_LOCAL_REPO_ROOTS. All jobs run on the server's event
+loop and share the warm provider clients and caches.
+"""
+
+import argparse
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Response, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
+
+from . import metrics
+from .events import EventChannel, feedback_from_message
+from .jobs import JobManager, JobStatus
+from .local_repo import is_remote_url, local_repo_under
+from .logging import get_logger
+from .types import WorkflowInput
+
+
+class JobRequest(BaseModel):
+    """Body of POST /jobs."""
+
+    prd_content: str
+    tech_spec_content: str = ""
+    repo_url: str = ""
+    refresh_repo_context: bool = False
+    pipeline: bool = False
+    # Wait for the client's approval over the events WebSocket at each review
+    interactive: bool = False
+
+
+async def _send_events(websocket: WebSocket, channel: EventChannel) -> None:
+    async for event in channel.events():
+        await websocket.send_json(event)
+
+
+async def _receive_feedback(websocket: WebSocket, channel: EventChannel) -> None:
+    while True:
+        message = await websocket.receive_json()
+        if not isinstance(message, dict) or message.get("type") != "feedback":
+            continue
+        response = feedback_from_message(message)
+        if response is None:
+            await websocket.send_json(
+                {"type": "error", "detail": "feedback needs 'approved'"}
+            )
+            continue
+        key = str(message.get("key") or "")
+        if not channel.answer(key, response):
+            await websocket.send_json(
+                {"type": "error", "detail": f"no review {key!r} is waiting"}
+            )
+
+
+def create_app(manager: Optional[JobManager] = None, warm: bool = True) -> FastAPI:
+    """Build the API around ``manager`` (a new JobManager by default)."""
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        if warm:
+            from .daemon import warm_up
+
+            warm_up("storymachine-server")
+        yield
+        await app.state.jobs.shutdown()
+
+    app = FastAPI(title="StoryMachine", lifespan=lifespan)
+    app.state.jobs = manager or JobManager()
+
+    def jobs() -> JobManager:
+        return app.state.jobs
+
+    def queued() -> Dict[metrics.LabelValues, float]:
+        depth: Dict[metrics.LabelValues, float] = {("interactive",): 0, ("normal",): 0}
+        for job in jobs().jobs():
+            if job.status == JobStatus.QUEUED:
+                depth[("interactive" if job.interactive else "normal",)] += 1
+        return depth
+
+    metrics.QUEUE_DEPTH.collect = queued
+
+    @app.get("/healthz")
+    async def health() -> Dict[str, Any]:
+        running = sum(1 for job in jobs().jobs() if not job.finished)
+        return {"status": "ok", "jobs": running}
+
+    @app.get("/metrics")
+    async def metrics_endpoint() -> Response:
+        return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+    @app.post("/jobs", status_code=202)
+    async def submit(request: JobRequest) -> Dict[str, Any]:
+        if not request.prd_content.strip():
+            raise HTTPException(status_code=422, detail="prd_content is empty")
+        fields = request.model_dump(exclude={"interactive"})
+        repo_url = request.repo_url.strip()
+        if repo_url and not is_remote_url(repo_url):
+            # A path would have the server read its own files into the prompts
+            roots = jobs().settings.server_local_repo_roots.split(os.pathsep)
+            local_root = local_repo_under(repo_url, roots)
+            if local_root is None:
+                raise HTTPException(
+                    status_code=422,
+                    detail="repo_url must be an http(s)://, ssh:// or git@ URL",
+                )
+            fields["repo_url"] = str(local_root)
+        job = jobs().submit(WorkflowInput(**fields), interactive=request.interactive)
+        return job.to_dict()
+
+    @app.get("/jobs")
+    async def list_jobs() -> List[Dict[str, Any]]:
+        return [job.to_dict(include_stories=False) for job in jobs().jobs()]
+
+    @app.get("/jobs/{job_id}")
+    async def get_job(job_id: str) -> Dict[str, Any]:
+        job = jobs().get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return job.to_dict()
+
+    @app.delete("/jobs/{job_id}")
+    async def cancel_job(job_id: str) -> Dict[str, Any]:
+        job = jobs().cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return job.to_dict(include_stories=False)
+
+    @app.websocket("/jobs/{job_id}/events")
+    async def job_events(websocket: WebSocket, job_id: str) -> None:
+        job = jobs().get(job_id)
+        if job is None:
+            await websocket.close(code=4404)
+            return
+        await websocket.accept()
+        sender = asyncio.create_task(_send_events(websocket, job.channel))
+        receiver = asyncio.create_task(_receive_feedback(websocket, job.channel))
+        try:
+            done, _ = await asyncio.wait(
+                {sender, receiver}, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                task.result()
+        except WebSocketDisconnect:
+            get_logger().info("job_events_disconnected", job_id=job_id)
+            return
+        finally:
+            sender.cancel()
+            receiver.cancel()
+        await websocket.close()
+
+    return app
+
+
+def main():
+    """Entry point for the StoryMachine HTTP server."""
+    parser = argparse.ArgumentParser(
+        description="StoryMachine HTTP server - generate user stories as jobs"
+    )
+    parser.add_argument(
+        "--host", type=str, default="127.0.0.1", help="Address to listen on"
+    )
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument(
+        "--max-jobs",
+        type=int,
+        required=False,
+        help="Jobs to run at once; more are queued "
+        "(defaults to STORYMACHINE_SERVER_MAX_JOBS)",
+    )
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(
+        create_app(JobManager(max_running=args.max_jobs)),
+        host=args.host,
+        port=args.port,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Per-workflow session state.
+
+A session owns everything one workflow run changes or is configured with: its
+settings, run journal, conversation memory, its own copy of the input and,
+for runs driven remotely, the event channel to the client. Workflows take
+the session as an argument and make it current for the run, so activities
+and provider calls made from it read the same settings and memory. Sessions
+share nothing mutable; only the pooled provider clients and the on-disk
+repository cache are process-wide.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from .config import Settings
+from .journal import RunJournal
+from .memory import ConversationMemory
+from .types import WorkflowInput
+
+if TYPE_CHECKING:
+    from .events import EventChannel
+
+
+@dataclass
+class Session:
+    """State of one workflow run."""
+
+    workflow_input: WorkflowInput
+    settings: Settings
+    journal: RunJournal = field(default_factory=RunJournal)
+    memory: Optional[ConversationMemory] = None
+    # Remote client receiving events and giving feedback instead of the terminal
+    channel: Optional["EventChannel"] = None
+
+    def __post_init__(self) -> None:
+        if self.memory is None:
+            self.memory = ConversationMemory(
+                self.settings.memory_max_tokens, self.settings.memory_recent_turns
+            )
+
+    @classmethod
+    def create(
+        cls,
+        workflow_input: WorkflowInput,
+        journal: Optional[RunJournal] = None,
+        settings: Optional[Settings] = None,
+        channel: Optional["EventChannel"] = None,
+    ) -> "Session":
+        """Start a session on a private copy of ``workflow_input``."""
+        return cls(
+            # The run fills in repo_context; the caller's input stays as given
+            workflow_input=replace(workflow_input),
+            settings=settings or Settings(),  # pyright: ignore[reportCallIssue]
+            journal=journal or RunJournal(),
+            channel=channel,
+        )
+
+    @property
+    def run_id(self) -> str:
+        return self.journal.run_id
+
+
+_session: ContextVar[Optional[Session]] = ContextVar("session", default=None)
+
+
+def enter_session(session: Session) -> Token:
+    """Make ``session`` current in this context; undo with exit_session()."""
+    return _session.set(session)
+
+
+def exit_session(token: Token) -> None:
+    """Restore the session that was current before enter_session()."""
+    _session.reset(token)
+
+
+@contextmanager
+def using(session: Session) -> Iterator[Session]:
+    """Make ``session`` current while the block runs."""
+    token = enter_session(session)
+    try:
+        yield session
+    finally:
+        exit_session(token)
+
+
+def current_session() -> Optional[Session]:
+    """The session of the workflow run this code is part of, if any."""
+    return _session.get()
+
+
+def get_settings() -> Settings:
+    """Settings of the current session, or from the environment outside one."""
+    session = _session.get()
+    if session is not None:
+        return session.settings
+    return Settings()  # pyright: ignore[reportCallIssue]
@@ -0,0 +1,113 @@
+"""Single-flight coalescing of identical in-flight calls.
+
+While a call for a key is running, further calls with the same key wait for
+its result instead of starting their own; once it finishes the key is free
+again, so nothing is cached. Callers may be threads or asyncio tasks on any
+event loop: they all share one concurrent.futures.Future per key.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from .logging import get_logger
+
+
+class _Abandoned(Exception):
+    """The leading call gave up; a waiting caller should try itself."""
+
+
+def _consume(waiter: asyncio.Future) -> None:
+    # Nobody awaits the waiter any more; retrieve its outcome so asyncio
+    # doesn't report it as never retrieved
+    if not waiter.cancelled():
+        waiter.exception()
+
+
+def _outcome(error: BaseException) -> BaseException:
+    """What a failed leading call hands its waiters.
+
+    Cancellation and timeouts belong to the leader's deadline, not to the
+    waiters', so they make the waiters try again themselves.
+    """
+    if isinstance(error, Exception) and not isinstance(error, TimeoutError):
+        return error
+    return _Abandoned()
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """The future for ``key`` and whether this caller leads the call."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                get_logger().debug("call_coalesced", key=key[:16])
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.calls += 1
+            return future, True
+
+    def _settle(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def do(self, key: str, call: Callable[[], Any]) -> Any:
+        """Return ``call()``, or the result of the identical call in flight."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    return future.result()
+                except _Abandoned:
+                    continue
+            try:
+                result = call()
+            except BaseException as e:
+                self._settle(key, future)
+                future.set_exception(_outcome(e))
+                raise
+            self._settle(key, future)
+            future.set_result(result)
+            return result
+
+    async def do_async(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Awaitable counterpart of do() for coroutine calls."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                waiter = asyncio.wrap_future(future)
+                try:
+                    # Shielded: one waiter being cancelled must not cancel the
+                    # call for everyone else
+                    return await asyncio.shield(waiter)
+                except _Abandoned:
+                    continue
+                except asyncio.CancelledError:
+                    waiter.add_done_callback(_consume)
+                    raise
+            try:
+                result = await call()
+            except BaseException as e:
+                self._settle(key, future)
+                future.set_exception(_outcome(e))
+                raise
+            self._settle(key, future)
+            future.set_result(result)
+            return result
+
+    def stats(self) -> Dict[str, int]:
+        """Calls made and calls that were served by another caller's call."""
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced}
@@ -0,0 +1,101 @@
+"""Incremental output of generated stories as text, JSON or JSON Lines.
+
+Stories are written and flushed one at a time as they are finished, so a
+consumer reading the file or pipe sees each story while the run continues.
+JSON Lines gives one complete record per line; JSON is a single array that is
+only valid once the run has finished.
+"""
+
+import json
+from dataclasses import asdict
+from typing import Any, Dict, List, Protocol, TextIO
+
+from .types import Story
+
+FORMATS = ("text", "json", "jsonl")
+
+
+def story_record(number: int, story: Story) -> Dict[str, Any]:
+    """Return a story as a JSON-serialisable record, with its 1-based number."""
+    return {"number": number, **asdict(story)}
+
+
+def format_story_text(number: int, story: Story) -> str:
+    """Format one story as an indented text block."""
+    lines = [f"{number}. {story.title}", "   Acceptance Criteria:"]
+    lines.extend(f"     {j}. {ac}" for j, ac in enumerate(story.acceptance_criteria, 1))
+    if story.enriched_context:
+        lines.append("   Context:")
+        # Format context with proper indentation
+        lines.extend(
+            f"     {line}"
+            for line in story.enriched_context.split("\n")
+            if line.strip()
+        )
+    return "\n".join(lines) + "\n\n"
+
+
+def format_stories_text(stories: List[Story]) -> str:
+    """Format a whole list of stories as text."""
+    if not stories:
+        return "No stories were generated."
+    header = f"Generated {len(stories)} user stories:\n\n"
+    return header + "".join(
+        format_story_text(i, story) for i, story in enumerate(stories, 1)
+    )
+
+
+class StorySink(Protocol):
+    """Receives stories as they are finished (StoryWriter, server jobs)."""
+
+    def begin(self, count: int) -> None: ...
+
+    def write(self, number: int, story: Story) -> None: ...
+
+    def end(self) -> None: ...
+
+
+class StoryWriter:
+    """Writes stories to ``stream`` in ``fmt`` as soon as they are finished."""
+
+    def __init__(self, stream: TextIO, fmt: str = "text"):
+        if fmt not in FORMATS:
+            raise ValueError(
+                f"Unknown output format: {fmt!r} (expected one of {', '.join(FORMATS)})"
+            )
+        self.stream = stream
+        self.fmt = fmt
+        self.written = 0
+
+    def begin(self, count: int) -> None:
+        """Start the output once the number of stories is known."""
+        if self.fmt == "text":
+            self._write(
+                f"Generated {count} user stories:\n\n"
+                if count
+                else "No stories were generated.\n"
+            )
+        elif self.fmt == "json":
+            self._write("[")
+
+    def write(self, number: int, story: Story) -> None:
+        """Write one finished story."""
+        if self.fmt == "text":
+            self._write(format_story_text(number, story))
+        else:
+            line = json.dumps(story_record(number, story), ensure_ascii=False)
+            if self.fmt == "json":
+                line = ("\n  " if not self.written else ",\n  ") + line
+            else:
+                line += "\n"
+            self._write(line)
+        self.written += 1
+
+    def end(self) -> None:
+        """Finish the output."""
+        if self.fmt == "json":
+            self._write("\n]\n" if self.written else "]\n")
+
+    def _write(self, text: str) -> None:
+        self.stream.write(text)
+        self.stream.flush()
@@ -0,0 +1,7 @@
+"""Token estimates shared by every budget (repository tree, model history)."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: one per CJK character, one per 4 other characters."""
+    cjk = sum(1 for char in text if "　" <= char <= "鿿")
+    return cjk + (len(text) - cjk + 3) // 4
@@ -29,6 +29,9 @@ class WorkflowInput:
     tech_spec_content: str
     repo_url: str
     repo_context: Optional[str] = None
+    refresh_repo_context: bool = False
+    # Draft stories while codebase context is still being gathered
+    pipeline: bool = False
 
 
 class FeedbackStatus(Enum):
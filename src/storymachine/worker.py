@@ -0,0 +1,417 @@
+"""Worker pool running jobs from the durable job queue.
+
+Each worker process warms up the provider layer once and then runs up to
+``concurrency`` jobs at a time on its event loop, every job in its own
+Session. While a job runs the worker renews its lease; it drops the job if
+the lease was lost (the job was cancelled or handed to another worker) and
+swaps a batch job for a waiting interactive one when the queue preempts it,
+checking for one every few seconds whatever the lease length.
+Queue depth and waiting time are logged as ``queue_stats`` events, and with
+STORYMACHINE_METRICS_TEXTFILE set each worker process writes its metrics to
+a textfile of its own at the same interval.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from . import metrics
+from .config import Settings
+from .deadline import DeadlineExceeded, run_with_deadline
+from .job_queue import SUCCEEDED, Priority, QueueBackend, QueuedJob, open_queue
+from .logging import get_logger
+from .session import Session
+from .story_output import story_record
+from .types import WorkflowInput
+
+# Seconds between polls of an empty queue and between queue_stats events
+POLL_INTERVAL = 1.0
+STATS_INTERVAL = 30.0
+
+
+def worker_name(index: int = 0) -> str:
+    """Identify a worker process in the queue: host, pid and pool index."""
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+class Worker:
+    """Claims jobs from a queue and runs them on the current event loop."""
+
+    def __init__(
+        self,
+        queue: QueueBackend,
+        name: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        settings: Optional[Settings] = None,
+        index: Optional[int] = None,
+    ):
+        self.queue = queue
+        self.index = index
+        self.name = name or worker_name()
+        self.settings = settings or Settings()  # pyright: ignore[reportCallIssue]
+        self.concurrency = max(concurrency or self.settings.queue_worker_concurrency, 1)
+        self.visibility_timeout = self.settings.queue_visibility_timeout
+        self._running: Set[asyncio.Task] = set()
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        """Run jobs until ``stop`` is set, then hand unfinished jobs back."""
+        stop = stop or asyncio.Event()
+        logger = get_logger()
+        logger.info("worker_started", worker=self.name, concurrency=self.concurrency)
+        loop = asyncio.get_running_loop()
+        next_stats = loop.time()
+        try:
+            while not stop.is_set():
+                if loop.time() >= next_stats:
+                    stats = await asyncio.to_thread(self.queue.stats)
+                    logger.info("queue_stats", worker=self.name, **stats)
+                    metrics.record_queue_stats(stats)
+                    await asyncio.to_thread(metrics.export, self.settings, self.index)
+                    next_stats = loop.time() + STATS_INTERVAL
+                claimed = False
+                if len(self._running) < self.concurrency:
+                    job = await asyncio.to_thread(
+                        self.queue.claim, self.name, self.visibility_timeout
+                    )
+                    if job is not None:
+                        task = asyncio.create_task(self._execute(job))
+                        self._running.add(task)
+                        task.add_done_callback(self._running.discard)
+                        claimed = True
+                if not claimed:
+                    # Wake up for a stop request or a finished job
+                    waiters = {asyncio.ensure_future(stop.wait()), *self._running}
+                    _, pending = await asyncio.wait(
+                        waiters,
+                        timeout=POLL_INTERVAL,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    for waiter in pending - self._running:
+                        waiter.cancel()
+        finally:
+            await self._shutdown()
+            metrics.export(self.settings, self.index)
+            logger.info("worker_stopped", worker=self.name)
+
+    async def _shutdown(self) -> None:
+        running = list(self._running)
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    async def _execute(self, job: Optional[QueuedJob]) -> None:
+        """Run a job under a renewed lease, and the job it is preempted by."""
+        logger = get_logger()
+        loop = asyncio.get_running_loop()
+        heartbeat = self.visibility_timeout / 3
+        # A batch job looks for interactive jobs kept waiting more often than
+        # it renews its lease, so they wait about queue_preempt_after at most
+        preempt_check = min(
+            heartbeat, max(self.settings.queue_preempt_after / 2, POLL_INTERVAL)
+        )
+        while job is not None:
+            attempt = asyncio.create_task(self._attempt(job))
+            next_job: Optional[QueuedJob] = None
+            lost = False
+            interval = preempt_check if job.priority == Priority.BATCH else heartbeat
+            next_heartbeat = loop.time() + heartbeat
+            try:
+                while not attempt.done():
+                    await asyncio.wait({attempt}, timeout=interval)
+                    if attempt.done():
+                        break
+                    # Renew at the check nearest the heartbeat's due time
+                    if loop.time() + interval / 2 >= next_heartbeat:
+                        next_heartbeat = loop.time() + heartbeat
+                        lost = not await asyncio.to_thread(
+                            self.queue.heartbeat, job, self.visibility_timeout
+                        )
+                    if not lost and job.priority == Priority.BATCH:
+                        next_job = await asyncio.to_thread(
+                            self.queue.preempt, job, self.name, self.visibility_timeout
+                        )
+                    if lost or next_job is not None:
+                        attempt.cancel()
+                        break
+            except asyncio.CancelledError:
+                # The worker is stopping: another worker will run the job
+                attempt.cancel()
+                await asyncio.gather(attempt, return_exceptions=True)
+                await asyncio.to_thread(self.queue.release, job)
+                raise
+
+            if lost or next_job is not None:
+                await asyncio.gather(attempt, return_exceptions=True)
+                if lost:
+                    logger.info("job_lease_lost", job_id=job.id, worker=self.name)
+            else:
+                await self._record(job, attempt)
+            job = next_job
+
+    async def _attempt(self, job: QueuedJob) -> List[Dict]:
+        from .workflow import generate_stories_auto
+
+        session = Session.create(job.workflow_input, settings=self.settings)
+        stories = await run_with_deadline(
+            generate_stories_auto(session.workflow_input, session=session),
+            self.settings.run_timeout,
+        )
+        return [story_record(i, story) for i, story in enumerate(stories, 1)]
+
+    async def _record(self, job: QueuedJob, attempt: asyncio.Task) -> None:
+        try:
+            stories = attempt.result()
+        except DeadlineExceeded as e:
+            error = f"Timed out: {e}"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        else:
+            await asyncio.to_thread(self.queue.complete, job, stories)
+            return
+        await asyncio.to_thread(self.queue.fail, job, error)
+
+
+def _serve(queue_path: str, index: int, concurrency: Optional[int]) -> None:
+    """Body of one worker process."""
+    from .daemon import warm_up
+
+    warm_up("storymachine-worker")
+    settings = Settings()  # pyright: ignore[reportCallIssue]
+    worker = Worker(
+        open_queue(settings, queue_path),
+        worker_name(index),
+        concurrency,
+        settings,
+        index,
+    )
+
+    async def main() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        await worker.run(stop)
+
+    asyncio.run(main())
+
+
+def run_pool(queue_path: str, workers: int, concurrency: Optional[int]) -> None:
+    """Run ``workers`` worker processes until interrupted."""
+    if workers <= 1:
+        _serve(queue_path, 0, concurrency)
+        return
+    processes = [
+        multiprocessing.Process(
+            target=_serve,
+            args=(queue_path, index, concurrency),
+            name=f"storymachine-worker-{index}",
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # The children got the Ctrl-C too; give them time to release their jobs
+        for process in processes:
+            process.join()
+
+
+def _read_input(args: argparse.Namespace) -> WorkflowInput:
+    prd_path = Path(args.prd)
+    if not prd_path.exists():
+        print(f"Error: PRD file not found: {prd_path}", file=sys.stderr)
+        sys.exit(1)
+    tech_spec_content = ""
+    if args.tech_spec:
+        tech_spec_path = Path(args.tech_spec)
+        if not tech_spec_path.exists():
+            print(f"Error: Tech spec file not found: {tech_spec_path}", file=sys.stderr)
+            sys.exit(1)
+        tech_spec_content = tech_spec_path.read_text(encoding="utf-8")
+    return WorkflowInput(
+        prd_content=prd_path.read_text(encoding="utf-8"),
+        tech_spec_content=tech_spec_content,
+        repo_url=args.repo or "",
+        refresh_repo_context=args.refresh_repo_context,
+        pipeline=args.pipeline,
+    )
+
+
+def _run_batch(queue: QueueBackend, args: argparse.Namespace) -> None:
+    from .batch import submit_batch, wait_and_publish
+
+    prd_paths = [Path(prd) for prd in args.prds]
+    for path in prd_paths:
+        if not path.exists():
+            print(f"Error: PRD file not found: {path}", file=sys.stderr)
+            sys.exit(1)
+    tech_spec_content = ""
+    if args.tech_spec:
+        tech_spec_path = Path(args.tech_spec)
+        if not tech_spec_path.exists():
+            print(f"Error: Tech spec file not found: {tech_spec_path}", file=sys.stderr)
+            sys.exit(1)
+        tech_spec_content = tech_spec_path.read_text(encoding="utf-8")
+
+    try:
+        jobs = submit_batch(
+            queue,
+            prd_paths,
+            tech_spec_content,
+            args.repo or "",
+            Priority[args.priority.upper()],
+            args.pipeline,
+        )
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Queued {len(jobs)} jobs", file=sys.stderr)
+    if args.no_wait:
+        return
+
+    finished = wait_and_publish(queue, jobs, Path(args.output))
+    metrics.record_queue_stats(queue.stats())
+    metrics.export(Settings())  # pyright: ignore[reportCallIssue]
+    failed = [path for path, job in finished.items() if job.status != SUCCEEDED]
+    for path in failed:
+        job = finished[path]
+        print(f"{path}: {job.status} {job.error or ''}".rstrip(), file=sys.stderr)
+    print(
+        f"Wrote {len(finished) - len(failed)} results to {args.output}",
+        file=sys.stderr,
+    )
+    if failed:
+        sys.exit(1)
+
+
+def main():
+    """Entry point for the StoryMachine queue and its workers."""
+    parser = argparse.ArgumentParser(
+        description="StoryMachine worker - run queued story generation jobs"
+    )
+    parser.add_argument(
+        "--queue",
+        type=str,
+        required=False,
+        help="Queue location, a SQLite path or backend://location "
+        "(defaults to STORYMACHINE_QUEUE_PATH)",
+    )
+    actions = parser.add_subparsers(dest="action")
+
+    run = actions.add_parser("run", help="Run a pool of workers (default)")
+    run.add_argument(
+        "--workers",
+        type=int,
+        required=False,
+        help="Worker processes (defaults to STORYMACHINE_QUEUE_WORKERS)",
+    )
+    run.add_argument(
+        "--concurrency",
+        type=int,
+        required=False,
+        help="Jobs each worker runs at once "
+        "(defaults to STORYMACHINE_QUEUE_WORKER_CONCURRENCY)",
+    )
+
+    submit = actions.add_parser("submit", help="Queue a job and print its id")
+    submit.add_argument("--prd", type=str, required=True, help="Path to the PRD file")
+    submit.add_argument(
+        "--tech-spec", type=str, required=False, help="Path to the tech spec file"
+    )
+    submit.add_argument(
+        "--repo", type=str, required=False, help="Repository URL or local path"
+    )
+    submit.add_argument(
+        "--priority",
+        choices=[p.name.lower() for p in Priority],
+        default="normal",
+        help="Priority class; interactive jobs preempt batch jobs (default: normal)",
+    )
+    submit.add_argument("--refresh-repo-context", action="store_true")
+    submit.add_argument("--pipeline", action="store_true")
+
+    batch = actions.add_parser(
+        "batch",
+        help="Queue a job per PRD, wait for the workers and write the results",
+    )
+    batch.add_argument("prds", nargs="+", metavar="PRD", help="PRD files")
+    batch.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="Directory for the results, one <prd name>.json per PRD",
+    )
+    batch.add_argument(
+        "--tech-spec", type=str, required=False, help="Tech spec shared by all PRDs"
+    )
+    batch.add_argument(
+        "--repo", type=str, required=False, help="Repository URL or local path"
+    )
+    batch.add_argument(
+        "--priority",
+        choices=[p.name.lower() for p in Priority],
+        default="batch",
+        help="Priority class of the jobs (default: batch)",
+    )
+    batch.add_argument("--pipeline", action="store_true")
+    batch.add_argument(
+        "--no-wait",
+        action="store_true",
+        help="Only queue the jobs; run the command again to collect the results",
+    )
+
+    status = actions.add_parser("status", help="Print a job, or all jobs, as JSON")
+    status.add_argument("job_id", nargs="?")
+    cancel = actions.add_parser("cancel", help="Cancel a queued or running job")
+    cancel.add_argument("job_id")
+    actions.add_parser("stats", help="Print queue depth and wait times as JSON")
+
+    args = parser.parse_args()
+    settings = Settings()  # pyright: ignore[reportCallIssue]
+    queue_path = args.queue or settings.queue_path
+
+    if args.action in (None, "run"):
+        run_pool(
+            queue_path,
+            getattr(args, "workers", None) or settings.queue_workers,
+            getattr(args, "concurrency", None),
+        )
+        return
+
+    queue = open_queue(settings, queue_path)
+    if args.action == "submit":
+        print(queue.enqueue(_read_input(args), Priority[args.priority.upper()]))
+    elif args.action == "batch":
+        _run_batch(queue, args)
+    elif args.action == "status":
+        if args.job_id:
+            job = queue.get(args.job_id)
+            if job is None:
+                print(f"Unknown job: {args.job_id}", file=sys.stderr)
+                sys.exit(1)
+            print(json.dumps(job.to_dict(), ensure_ascii=False, indent=2))
+        else:
+            jobs = [job.to_dict() for job in queue.jobs()]
+            for job_dict in jobs:
+                del job_dict["stories"]
+            print(json.dumps(jobs, ensure_ascii=False, indent=2))
+    elif args.action == "cancel":
+        if queue.cancel(args.job_id) is None:
+            print(f"Unknown job: {args.job_id}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        print(json.dumps(queue.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
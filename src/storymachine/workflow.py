@@ -1,6 +1,11 @@
 """Top-level workflow orchestration for StoryMachine."""
 
-from typing import List
+import asyncio
+import sys
+import threading
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from .activities import (
     get_human_input,
@@ -8,110 +13,563 @@ from .activities import (
     problem_break_down,
     define_acceptance_criteria,
     enrich_context,
-    spinner,
     print_story_titles,
     print_story_with_criteria,
     print_final_stories,
 )
-from .types import FeedbackStatus, Story, WorkflowInput
+from .ai import display_reasoning_summaries, reasoning_summaries_to
+from .deadline import stage_timeout
+from .events import emit
+from .metrics import ACTIVE_WORKFLOWS
+from .progress import track
+from .memory import topic as memory_topic
+from .journal import (
+    RunJournal,
+    decode_feedback,
+    decode_stories,
+    decode_story,
+    encode_feedback,
+    encode_input,
+    encode_stories,
+    encode_story,
+)
+from .session import Session, current_session, enter_session, exit_session
+from .revision import ALL_STAGES, CONTEXT, CRITERIA, revision_stages
+from .story_output import StorySink, story_record
+from .types import FeedbackResponse, FeedbackStatus, Story, WorkflowInput
 from .logging import get_logger
 
 
-async def w1(workflow_input: WorkflowInput) -> List[Story]:
-    """Simple workflow: break down PRD and tech spec into user stories."""
-    logger = get_logger()
-    logger.info("workflow_started")
+def _get_human_input(journal: RunJournal, key: str) -> FeedbackResponse:
+    """Ask for feedback unless the journal already holds the answer."""
+    if key in journal:
+        response = decode_feedback(journal.get(key))
+        answer = "y" if response.status == FeedbackStatus.ACCEPTED else "n"
+        print(f"Approve (y/n): {answer} (from checkpoint)")
+        return response
+    response = get_human_input()
+    journal.record(key, encode_feedback(response))
+    return response
+
+
+async def _ask(journal: RunJournal, key: str) -> FeedbackResponse:
+    """Await the user's feedback without blocking the event loop.
+
+    A session with an event channel gets its feedback from the client.
+    Otherwise input() is used; it can't be interrupted, so it runs in a daemon
+    thread: a timeout or Ctrl-C at the prompt ends the run instead of waiting
+    for the answer.
+    """
+    session = current_session()
+    if session is not None and session.channel is not None:
+        if key in journal:
+            return decode_feedback(journal.get(key))
+        response = await session.channel.ask(key)
+        journal.record(key, encode_feedback(response))
+        return response
+
+    loop = asyncio.get_running_loop()
+    future: asyncio.Future = loop.create_future()
+
+    def resolve(result: Any, error: Optional[BaseException]) -> None:
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run() -> None:
+        try:
+            result = _get_human_input(journal, key)
+        except BaseException as e:
+            loop.call_soon_threadsafe(resolve, None, e)
+        else:
+            loop.call_soon_threadsafe(resolve, result, None)
+
+    threading.Thread(target=run, name="storymachine-input", daemon=True).start()
+    return await future
+
+
+def _records(stories: List[Story]) -> List[Dict[str, Any]]:
+    return [story_record(i, story) for i, story in enumerate(stories, 1)]
+
 
-    # Get codebase context questions (only if repo URL is provided)
-    if workflow_input.repo_url:
-        print("\n--- Getting Codebase Context ---\n")
-        with spinner("Analyzing codebase needs"):
-            workflow_input.repo_context = await get_codebase_context(workflow_input)
+@asynccontextmanager
+async def _stage(
+    label: str, timeout: float, background: bool = False, topic: Optional[str] = None
+) -> AsyncIterator[None]:
+    """Show a stage's progress and cancel it if it outlasts ``timeout``.
 
-        logger.info(
-            "codebase_context_obtained", context_length=len(workflow_input.repo_context)
+    Model calls in the stage share the conversation memory of ``topic``.
+    """
+    with track(label, background) as task, memory_topic(topic):
+        emit("stage", label=label, state="started")
+        async with stage_timeout(label, timeout):
+            yield
+        emit(
+            "stage",
+            label=label,
+            state="finished",
+            elapsed=round(task.elapsed, 3),
+            tokens=task.tokens,
         )
-    else:
-        workflow_input.repo_context = ""
-        print("\n--- Skipping Codebase Context (no repository provided) ---\n")
-        logger.info("codebase_context_skipped", reason="no_repo_url")
 
-    # Set default empty states
-    stories: List[Story] = []
-    comments = ""
 
-    while True:
-        # Generate or revise stories based on current state
-        spinner_text = "Machining Stories" if not stories else "Revising Stories"
-        with spinner(spinner_text):
-            stories = problem_break_down(workflow_input, stories, comments)
+async def _gather_codebase_context(
+    workflow_input: WorkflowInput, journal: RunJournal, timeout: float
+) -> str:
+    """Gather codebase context and journal it (pipelined mode's background task)."""
+    logger = get_logger()
+    async with _stage("Analyzing codebase needs", timeout, background=True):
+        repo_context = await get_codebase_context(workflow_input)
+    journal.record("repo_context", repo_context)
+    logger.info("codebase_context_obtained", context_length=len(repo_context))
+    return repo_context
+
 
-        log_event = "stories_generated" if not comments else "stories_revised"
-        logger.info(log_event, count=len(stories))
+class _Speculation:
+    """Stories detailed in the background while the user reviews.
 
-        # Display story titles
-        print_story_titles(stories)
+    Only first-round detailing (no comments) is speculative: its result is
+    reused when the user reaches that story, and discarded if the titles it
+    was based on are rejected.
+    """
 
-        # Get user feedback
-        response = get_human_input()
+    def __init__(
+        self,
+        workflow_input: WorkflowInput,
+        journal: RunJournal,
+        context_task: Optional[asyncio.Future] = None,
+        timeout: float = 0,
+    ):
+        self.workflow_input = workflow_input
+        self.journal = journal
+        self.context_task = context_task
+        self.timeout = timeout
+        self.tasks: Dict[int, asyncio.Future] = {}
+        # Reasoning summaries of each story, shown once the user reaches it
+        # rather than over the prompt they are answering
+        self.summaries: Dict[int, List[str]] = {}
 
-        if response.status == FeedbackStatus.ACCEPTED:
-            logger.info("stories_approved")
-            print("Stories approved!")
-            break
-        else:
-            logger.info("stories_rejected", comment=response.comment)
-            print(f"Stories rejected. Comments: {response.comment}")
-            print("\nRevising stories based on feedback...\n")
-            comments = response.comment or ""
+    def start(self, stories: List[Story], upto: int) -> None:
+        """Start detailing the stories before index ``upto`` not yet started."""
+        for i in range(min(upto, len(stories))):
+            if i in self.tasks or f"story.{i}.0.criteria" in self.journal:
+                continue
+            self.tasks[i] = asyncio.ensure_future(self._detail(i, stories[i]))
+            get_logger().info("speculative_detailing_started", story_index=i)
 
-    # Define acceptance criteria and enrich context for each story
-    for i, story in enumerate(stories):
-        print(f"\n--- Detailing Story {i + 1} ---")
+    async def _detail(self, index: int, story: Story) -> Tuple[Story, Story]:
+        if self.context_task:
+            # Shielded so cancelling the speculation leaves the context running
+            self.workflow_input.repo_context = await asyncio.shield(self.context_task)
+        label = f"Detailing story {index + 1}"
+        summaries = self.summaries.setdefault(index, [])
+        async with _stage(label, self.timeout, background=True):
+            with reasoning_summaries_to(summaries):
+                with memory_topic(f"story.{index}.criteria"):
+                    with_criteria = await define_acceptance_criteria(story, "")
+                with memory_topic(f"story.{index}.context"):
+                    enriched = await enrich_context(
+                        with_criteria, self.workflow_input, ""
+                    )
+        return with_criteria, enriched
+
+    async def take(self, index: int) -> Optional[Tuple[Story, Story]]:
+        """Return the speculative result for a story, or None if there is none."""
+        task = self.tasks.pop(index, None)
+        if task is None:
+            return None
+        try:
+            if not task.done():
+                with track("Detailing the story"):
+                    await task
+            result = task.result()
+            display_reasoning_summaries(self.summaries.pop(index, []))
+            return result
+        except Exception as e:
+            self.summaries.pop(index, None)
+            get_logger().warning(
+                "speculative_detailing_failed", story_index=index, error=str(e)
+            )
+            return None
+
+    def checkpoint(self) -> None:
+        """Journal finished speculative results so a resumed run reuses them.
+
+        Only valid once the titles they were based on have been approved.
+        """
+        for index, task in self.tasks.items():
+            key = f"story.{index}.0"
+            if not task.done() or task.cancelled() or task.exception():
+                continue
+            if f"{key}.criteria" in self.journal:
+                continue
+            with_criteria, enriched = task.result()
+            self.journal.record(f"{key}.criteria", encode_story(with_criteria))
+            self.journal.record(f"{key}.enriched", encode_story(enriched))
+            get_logger().info("speculative_detailing_checkpointed", story_index=index)
+
+    def discard(self) -> None:
+        """Cancel and forget all speculative work.
+
+        Per-story memory topics are keyed by position, so the turns of the
+        discarded stories are forgotten too: story ``i`` of the next list
+        must not get them as history.
+        """
+        if self.tasks:
+            get_logger().info("speculative_detailing_discarded", count=len(self.tasks))
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+        self.summaries.clear()
+        session = current_session()
+        if session is not None and session.memory is not None:
+            session.memory.forget("story.")
+
+
+async def w1(
+    workflow_input: WorkflowInput,
+    journal: Optional[RunJournal] = None,
+    session: Optional[Session] = None,
+) -> List[Story]:
+    """Simple workflow: break down PRD and tech spec into user stories.
+
+    Stage results and approvals are recorded in ``journal`` as they happen, and
+    any step already in the journal is replayed instead of repeated. Each model
+    stage is cancelled with DeadlineExceeded if it outlasts its timeout or the
+    caller's deadline; background work is cancelled with it.
+
+    The run works on ``session`` (by default a new one over ``workflow_input``
+    and ``journal``), so concurrent runs in one process share no state. A
+    session with an event channel reports to its client, not the terminal.
+    """
+    logger = get_logger()
+    session = session or Session.create(workflow_input, journal)
+    workflow_input = session.workflow_input
+    journal = session.journal
+    settings = session.settings
+    terminal = session.channel is None
+    logger.info("workflow_started", run_id=journal.run_id)
+
+    if "input" not in journal:
+        journal.record("input", encode_input(workflow_input))
+
+    # In pipelined mode the context is gathered while stories are drafted
+    context_task: Optional[asyncio.Future] = None
+    speculation = _Speculation(workflow_input, journal, None, settings.stage_timeout)
+    titles_approved = False
+    session_token = enter_session(session)
+    ACTIVE_WORKFLOWS.inc(workflow="interactive")
+
+    try:
+        # Get codebase context questions (only if repo URL is provided)
+        if workflow_input.repo_url and "repo_context" in journal:
+            workflow_input.repo_context = journal.get("repo_context")
+            if terminal:
+                print("\n--- Using Codebase Context From Checkpoint ---\n")
+        elif workflow_input.repo_url and workflow_input.pipeline:
+            if terminal:
+                print("\n--- Getting Codebase Context In The Background ---\n")
+            workflow_input.repo_context = ""
+            context_task = asyncio.ensure_future(
+                _gather_codebase_context(
+                    workflow_input, journal, settings.repo_context_timeout
+                )
+            )
+            speculation.context_task = context_task
+            logger.info("codebase_context_started_in_background")
+        elif workflow_input.repo_url:
+            if terminal:
+                print("\n--- Getting Codebase Context ---\n")
+            async with _stage(
+                "Analyzing codebase needs", settings.repo_context_timeout
+            ):
+                workflow_input.repo_context = await get_codebase_context(workflow_input)
+            journal.record("repo_context", workflow_input.repo_context)
+
+            logger.info(
+                "codebase_context_obtained",
+                context_length=len(workflow_input.repo_context),
+            )
+        else:
+            workflow_input.repo_context = ""
+            if terminal:
+                print("\n--- Skipping Codebase Context (no repository provided) ---\n")
+            logger.info("codebase_context_skipped", reason="no_repo_url")
 
         # Set default empty states
-        updated_story = story
+        stories: List[Story] = []
         comments = ""
+        round_ = 0
 
         while True:
-            # Generate or revise acceptance criteria based on current state
-            spinner_text = (
-                "Defining Acceptance Criteria"
-                if not comments
-                else "Revising Acceptance Criteria"
-            )
-            with spinner(spinner_text):
-                updated_story = define_acceptance_criteria(updated_story, comments)
+            # Generate or revise stories based on current state
+            key = f"stories.{round_}"
+            if key in journal:
+                stories = decode_stories(journal.get(key))
+            else:
+                # The first draft went without codebase context; revisions get
+                # it as soon as it has arrived
+                repo_context = ""
+                if context_task and context_task.done():
+                    workflow_input.repo_context = context_task.result()
+                    repo_context = workflow_input.repo_context
 
-            # Enrich context with PRD and tech spec details
-            spinner_text = (
-                "Detailing the story" if not comments else "Revising the story"
-            )
-            with spinner(spinner_text):
-                updated_story = enrich_context(updated_story, workflow_input, comments)
+                stage = "Machining Stories" if not stories else "Revising Stories"
+                async with _stage(stage, settings.stage_timeout, topic="stories"):
+                    stories = await problem_break_down(
+                        workflow_input, stories, comments, repo_context
+                    )
+                journal.record(key, encode_stories(stories))
+
+            log_event = "stories_generated" if not comments else "stories_revised"
+            logger.info(log_event, count=len(stories))
 
-            # Display story and its ACs
-            print_story_with_criteria(updated_story)
+            # Display story titles
+            if terminal:
+                print_story_titles(stories)
+            emit("stories", round=round_, stories=_records(stories))
 
-            # Get user feedback for this story
-            response = get_human_input()
+            # Detail the first stories while the user reads the titles
+            speculation.start(stories, settings.speculative_stories)
+
+            # Get user feedback; background work keeps running meanwhile
+            response = await _ask(journal, f"{key}.feedback")
 
             if response.status == FeedbackStatus.ACCEPTED:
-                logger.info("story_approved", story_index=i)
-                print("Story approved!")
-                stories[i] = updated_story  # Update the story in the list
+                logger.info("stories_approved")
+                if terminal:
+                    print("Stories approved!")
+                titles_approved = True
                 break
             else:
-                logger.info(
-                    "story_rejected",
-                    story_index=i,
-                    comment=response.comment,
-                )
-                print(f"Story rejected. Comments: {response.comment}")
-                print("\nRevising story based on feedback...\n")
+                logger.info("stories_rejected", comment=response.comment)
+                if terminal:
+                    print(f"Stories rejected. Comments: {response.comment}")
+                    print("\nRevising stories based on feedback...\n")
+                speculation.discard()
                 comments = response.comment or ""
+                round_ += 1
+
+        # Detailing needs the codebase context, so wait for it if still running
+        if context_task:
+            if not context_task.done():
+                with track("Waiting for codebase context"):
+                    await context_task
+            workflow_input.repo_context = context_task.result()
+
+        # Define acceptance criteria and enrich context for each story
+        for i, story in enumerate(stories):
+            if terminal:
+                print(f"\n--- Detailing Story {i + 1} ---")
+
+            # Set default empty states
+            updated_story = story
+            comments = ""
+            stages = ALL_STAGES
+            round_ = 0
+
+            while True:
+                key = f"story.{i}.{round_}"
+
+                speculative = await speculation.take(i) if round_ == 0 else None
+
+                # Generate or revise acceptance criteria based on current state
+                if f"{key}.criteria" in journal:
+                    updated_story = decode_story(journal.get(f"{key}.criteria"))
+                elif speculative:
+                    updated_story = speculative[0]
+                    journal.record(f"{key}.criteria", encode_story(updated_story))
+                elif CRITERIA not in stages:
+                    journal.record(f"{key}.criteria", encode_story(updated_story))
+                else:
+                    stage = (
+                        "Defining Acceptance Criteria"
+                        if not comments
+                        else "Revising Acceptance Criteria"
+                    )
+                    async with _stage(
+                        stage, settings.stage_timeout, topic=f"story.{i}.criteria"
+                    ):
+                        revised = await define_acceptance_criteria(
+                            updated_story, comments
+                        )
+                    if comments and CONTEXT not in stages:
+                        # Only the criteria were in question: keep the context
+                        revised = replace(
+                            revised, enriched_context=updated_story.enriched_context
+                        )
+                    updated_story = revised
+                    journal.record(f"{key}.criteria", encode_story(updated_story))
+
+                # Enrich context with PRD and tech spec details
+                if f"{key}.enriched" in journal:
+                    updated_story = decode_story(journal.get(f"{key}.enriched"))
+                elif speculative:
+                    updated_story = speculative[1]
+                    journal.record(f"{key}.enriched", encode_story(updated_story))
+                elif CONTEXT not in stages:
+                    journal.record(f"{key}.enriched", encode_story(updated_story))
+                else:
+                    stage = (
+                        "Detailing the story" if not comments else "Revising the story"
+                    )
+                    async with _stage(
+                        stage, settings.stage_timeout, topic=f"story.{i}.context"
+                    ):
+                        revised = await enrich_context(
+                            updated_story, workflow_input, comments
+                        )
+                    if comments and CRITERIA not in stages:
+                        # Only the context was in question: keep title and criteria
+                        revised = replace(
+                            updated_story, enriched_context=revised.enriched_context
+                        )
+                    updated_story = revised
+                    journal.record(f"{key}.enriched", encode_story(updated_story))
+
+                # Display story and its ACs
+                if terminal:
+                    print_story_with_criteria(updated_story)
+                emit("story", round=round_, **story_record(i + 1, updated_story))
+
+                # Detail the next stories while the user reviews this one
+                speculation.start(stories, i + 1 + settings.speculative_stories)
+
+                # Get user feedback for this story
+                response = await _ask(journal, f"{key}.feedback")
+
+                if response.status == FeedbackStatus.ACCEPTED:
+                    logger.info("story_approved", story_index=i)
+                    if terminal:
+                        print("Story approved!")
+                    stories[i] = updated_story  # Update the story in the list
+                    break
+                else:
+                    logger.info(
+                        "story_rejected",
+                        story_index=i,
+                        comment=response.comment,
+                    )
+                    if terminal:
+                        print(f"Story rejected. Comments: {response.comment}")
+                        print("\nRevising story based on feedback...\n")
+                    stages, comments = revision_stages(response.comment or "")
+                    logger.info(
+                        "story_revision_routed", story_index=i, stages=sorted(stages)
+                    )
+                    round_ += 1
+
+        emit("completed", stories=_records(stories))
+    except BaseException as e:
+        # Timeouts, Ctrl-C and failures: keep what finished for --resume
+        logger.warning(
+            "workflow_interrupted", run_id=journal.run_id, error=type(e).__name__
+        )
+        if titles_approved:
+            speculation.checkpoint()
+        raise
+    finally:
+        speculation.discard()
+        if context_task and not context_task.done():
+            context_task.cancel()
+        ACTIVE_WORKFLOWS.dec(workflow="interactive")
+        exit_session(session_token)
 
     # Print final list of all stories with their ACs
-    print_final_stories(stories)
+    if terminal:
+        print_final_stories(stories)
 
     return stories
+
+
+async def generate_stories_auto(
+    workflow_input: WorkflowInput,
+    writer: Optional[StorySink] = None,
+    session: Optional[Session] = None,
+) -> List[Story]:
+    """Non-interactive workflow: generate and detail stories without approval.
+
+    Stories are detailed concurrently and each is handed to ``writer`` as soon
+    as it is finished, so output appears in completion order; the returned
+    list is in story order. Reasoning summaries go to stderr, since stdout
+    may carry the stories themselves.
+    """
+    logger = get_logger()
+    session = session or Session.create(workflow_input)
+    workflow_input = session.workflow_input
+    settings = session.settings
+    logger.info("auto_workflow_started", run_id=session.run_id)
+    session_token = enter_session(session)
+    ACTIVE_WORKFLOWS.inc(workflow="auto")
+
+    context_task: Optional[asyncio.Future] = None
+    if workflow_input.repo_url and workflow_input.pipeline:
+        workflow_input.repo_context = ""
+        context_task = asyncio.ensure_future(
+            _gather_codebase_context(
+                workflow_input, session.journal, settings.repo_context_timeout
+            )
+        )
+
+    tasks: List[asyncio.Future] = []
+    try:
+        if workflow_input.repo_url and not context_task:
+            async with _stage(
+                "Analyzing codebase needs", settings.repo_context_timeout
+            ):
+                workflow_input.repo_context = await get_codebase_context(workflow_input)
+        elif not context_task:
+            workflow_input.repo_context = ""
+
+        async with _stage("Machining Stories", settings.stage_timeout):
+            with reasoning_summaries_to(sys.stderr):
+                stories = await problem_break_down(workflow_input, [])
+        logger.info("stories_generated", count=len(stories))
+        emit("stories", round=0, stories=_records(stories))
+        if writer:
+            writer.begin(len(stories))
+
+        if context_task:
+            with track("Waiting for codebase context"):
+                workflow_input.repo_context = await context_task
+
+        semaphore = asyncio.Semaphore(max(settings.story_concurrency, 1))
+
+        async def detail(index: int, story: Story) -> Tuple[int, Story]:
+            async with semaphore:
+                label = f"Detailing story {index + 1}"
+                async with _stage(label, settings.stage_timeout):
+                    with reasoning_summaries_to(sys.stderr):
+                        story = await define_acceptance_criteria(story)
+                        story = await enrich_context(story, workflow_input)
+            return index, story
+
+        detailed = list(stories)
+        tasks = [
+            asyncio.ensure_future(detail(i, story)) for i, story in enumerate(stories)
+        ]
+        for next_done in asyncio.as_completed(tasks):
+            index, story = await next_done
+            detailed[index] = story
+            logger.info("story_detailed", story_index=index)
+            emit("story", round=0, **story_record(index + 1, story))
+            if writer:
+                writer.write(index + 1, story)
+
+        emit("completed", stories=_records(detailed))
+        if writer:
+            writer.end()
+    finally:
+        # On failure or timeout, stop the stories still being detailed
+        for task in tasks:
+            task.cancel()
+        if context_task and not context_task.done():
+            context_task.cancel()
+        ACTIVE_WORKFLOWS.dec(workflow="auto")
+        exit_session(session_token)
+
+    logger.info("auto_workflow_completed", count=len(detailed))
+    return detailed
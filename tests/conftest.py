@@ -12,6 +12,28 @@ from openai.types.responses import ResponseFunctionToolCall
 from storymachine.types import Story
 
 
+@pytest.fixture(autouse=True)
+def no_daemon(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """Keep tests in-process even if a developer has a daemon running."""
+    monkeypatch.setenv("STORYMACHINE_DAEMON_SOCKET", str(tmp_path / "no-daemon.sock"))
+
+
+@pytest.fixture(autouse=True)
+def run_dir(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Path:
+    """Write run journals into the test's temporary directory."""
+    path = tmp_path / "runs"
+    monkeypatch.setenv("STORYMACHINE_RUN_DIR", str(path))
+    return path
+
+
+@pytest.fixture(autouse=True)
+def repo_cache_dir(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Path:
+    """Keep the repository context cache inside the test's temporary directory."""
+    path = tmp_path / "repo-cache"
+    monkeypatch.setenv("STORYMACHINE_REPO_CACHE_DIR", str(path))
+    return path
+
+
 @pytest.fixture
 def sample_prd_content() -> str:
     """Sample PRD content for testing."""
@@ -0,0 +1,52 @@
+"""Tests for auto_cli module."""
+
+import io
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+from storymachine import ai, progress, workflow
+from storymachine.auto_cli import main
+from storymachine.progress import ProgressRenderer
+from storymachine.types import Story
+
+
+def test_jsonl_stdout_stays_parseable_with_reasoning(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Reasoning summaries go to stderr, leaving one JSON record per line."""
+    prd_file = tmp_path / "prd.md"
+    prd_file.write_text("PRD content")
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        ai.display_reasoning_summaries(["Splitting the PRD"])
+        return [Story("Login", []), Story("Logout", [])]
+
+    async def fake_criteria(story, comments=""):
+        ai.display_reasoning_summaries([f"Criteria for {story.title}"])
+        return Story(story.title, ["AC"])
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        ai.display_reasoning_summaries([f"Context for {story.title}"])
+        return Story(story.title, story.acceptance_criteria, "context")
+
+    # The process-wide renderer would keep capsys's stream after the test
+    monkeypatch.setattr(
+        progress, "_renderer", ProgressRenderer(io.StringIO(), is_tty=False)
+    )
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", fake_criteria)
+    monkeypatch.setattr(workflow, "enrich_context", fake_enrich)
+    monkeypatch.setattr(
+        sys, "argv", ["storymachine-auto", "--prd", str(prd_file), "--format", "jsonl"]
+    )
+
+    main()
+
+    out, err = capsys.readouterr()
+    records = [json.loads(line) for line in out.splitlines()]
+    assert sorted(record["title"] for record in records) == ["Login", "Logout"]
+    assert "Model Reasoning" not in out
+    assert err.count("🧠 Model Reasoning:") == 5
@@ -0,0 +1,132 @@
+"""Tests for batch module."""
+
+import asyncio
+import json
+import multiprocessing
+import os
+from pathlib import Path
+
+import pytest
+
+from storymachine.batch import job_key, publish, submit_batch, wait_and_publish
+from storymachine.job_queue import RUNNING, SUCCEEDED, JobQueue
+from storymachine.types import WorkflowInput
+
+
+def _node(queue_path: str, name: str, crash: bool) -> None:
+    """A worker host: runs jobs until none are left, or dies in its first job."""
+    from storymachine import workflow
+    from storymachine.config import Settings
+    from storymachine.types import Story
+    from storymachine.worker import Worker
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        if crash:
+            os._exit(1)
+        return [Story(workflow_input.prd_content, [])]
+
+    async def fake_criteria(story, comments=""):
+        await asyncio.sleep(0.05)
+        return Story(story.title, [f"done by {name}"])
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        return story
+
+    workflow.problem_break_down = fake_break_down
+    workflow.define_acceptance_criteria = fake_criteria
+    workflow.enrich_context = fake_enrich
+
+    queue = JobQueue(Path(queue_path))
+    worker = Worker(queue, name, concurrency=2, settings=Settings())  # pyright: ignore[reportCallIssue]
+
+    async def main():
+        stop = asyncio.Event()
+        running = asyncio.create_task(worker.run(stop))
+        while any(job.status != SUCCEEDED for job in queue.jobs()):
+            await asyncio.sleep(0.05)
+        stop.set()
+        await running
+
+    asyncio.run(main())
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="simulates nodes with fork")
+def test_batch_is_sharded_across_nodes_and_survives_a_crash(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """Jobs of a node that died are finished by the others, each result once."""
+    # Short leases so the dead node's jobs come back quickly
+    monkeypatch.setenv("STORYMACHINE_QUEUE_VISIBILITY_TIMEOUT", "0.5")
+    queue_path = tmp_path / "shared" / "queue.db"
+    queue = JobQueue(queue_path)
+    prds = []
+    for i in range(6):
+        prd = tmp_path / f"prd{i}.md"
+        prd.write_text(f"PRD {i}", encoding="utf-8")
+        prds.append(prd)
+    jobs = submit_batch(queue, prds)
+    context = multiprocessing.get_context("fork")
+
+    crashed = context.Process(target=_node, args=(str(queue_path), "crashed", True))
+    crashed.start()
+    crashed.join(10)
+    assert crashed.exitcode == 1
+    orphaned = [job.id for job in queue.jobs(RUNNING)]
+    assert orphaned and all(job.worker == "crashed" for job in queue.jobs(RUNNING))
+
+    nodes = [
+        context.Process(target=_node, args=(str(queue_path), f"node{i}", False))
+        for i in range(3)
+    ]
+    for node in nodes:
+        node.start()
+    finished = wait_and_publish(
+        queue, jobs, tmp_path / "out", poll_interval=0.05, timeout=30
+    )
+    for node in nodes:
+        node.join(10)
+
+    assert [node.exitcode for node in nodes] == [0, 0, 0]
+    assert all(job.status == SUCCEEDED for job in finished.values())
+    assert all(queue.get(job_id).attempts == 2 for job_id in orphaned)  # pyright: ignore[reportOptionalMemberAccess]
+    assert sorted(path.name for path in (tmp_path / "out").iterdir()) == [
+        f"prd{i}.json" for i in range(6)
+    ]
+    for i, prd in enumerate(prds):
+        stories = json.loads((tmp_path / "out" / f"prd{i}.json").read_text())
+        job = finished[prd]
+        assert stories == job.result
+        assert stories[0]["title"] == f"PRD {i}"
+        assert stories[0]["acceptance_criteria"] == [f"done by {job.worker}"]
+    # Submitting the batch again finds the jobs instead of queueing new ones
+    assert submit_batch(queue, prds) == jobs
+
+
+def test_submit_batch_rejects_clashing_names(tmp_path: Path) -> None:
+    queue = JobQueue(tmp_path / "queue.db")
+    for directory in ("a", "b"):
+        (tmp_path / directory).mkdir()
+        (tmp_path / directory / "prd.md").write_text(directory, encoding="utf-8")
+
+    with pytest.raises(ValueError, match="unique"):
+        submit_batch(queue, [tmp_path / "a" / "prd.md", tmp_path / "b" / "prd.md"])
+
+
+def test_job_key_and_publish(tmp_path: Path) -> None:
+    first = WorkflowInput("PRD", "spec", "")
+    assert job_key(first) == job_key(WorkflowInput("PRD", "spec", ""))
+    assert job_key(first) != job_key(WorkflowInput("PRD", "", "spec"))
+
+    queue = JobQueue(tmp_path / "queue.db")
+    queue.enqueue(first)
+    job = queue.claim("w", 60)
+    assert job is not None
+    queue.complete(job, [{"number": 1, "title": "T"}])
+    done = queue.get(job.id)
+    assert done is not None
+
+    publish(done, tmp_path / "out" / "prd.json")
+    publish(done, tmp_path / "out" / "prd.json")
+
+    assert [p.name for p in (tmp_path / "out").iterdir()] == ["prd.json"]
+    assert json.loads((tmp_path / "out" / "prd.json").read_text()) == done.result
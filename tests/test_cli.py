@@ -1,11 +1,16 @@
 """Tests for cli module."""
 
+import asyncio
 import sys
 from pathlib import Path
+from typing import List, Tuple
 
 import pytest
 
 from storymachine.cli import main
+from storymachine.deadline import EXIT_TIMEOUT
+from storymachine.journal import RunJournal, encode_input
+from storymachine.types import WorkflowInput
 
 
 def test_main_parses_args_and_ingests_files(
@@ -21,7 +26,7 @@ def test_main_parses_args_and_ingests_files(
 
     called: dict[str, str] = {}
 
-    async def fake_w1(workflow_input):
+    async def fake_w1(workflow_input, journal=None):
         called["prd_content"] = str("PRD content" in workflow_input.prd_content)
         called["tech_spec_content"] = str(
             "Tech spec content" in workflow_input.tech_spec_content
@@ -154,3 +159,54 @@ def test_main_missing_tech_spec_file_exits(
     assert excinfo.value.code == 1
     err = capsys.readouterr().err
     assert f"Error: Tech spec file not found: {missing_tech}" in err
+
+
+def test_main_exits_with_timeout_status(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """A run that outlasts --timeout exits with EXIT_TIMEOUT and a resume hint."""
+    prd_file = tmp_path / "prd.md"
+    prd_file.write_text("PRD content")
+
+    async def slow_w1(workflow_input, journal=None):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr("storymachine.cli.w1", slow_w1)
+    monkeypatch.setattr(
+        sys, "argv", ["storymachine", "--prd", str(prd_file), "--timeout", "0.05"]
+    )
+
+    with pytest.raises(SystemExit) as excinfo:
+        main()
+
+    assert excinfo.value.code == EXIT_TIMEOUT
+    assert "--resume" in capsys.readouterr().err
+
+
+def test_resume_keeps_pipeline_and_closes_journal(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """--resume continues with the run's full input; each run closes its journal."""
+    prd_file = tmp_path / "prd.md"
+    prd_file.write_text("PRD content")
+    runs: List[Tuple[WorkflowInput, RunJournal]] = []
+
+    async def fake_w1(workflow_input, journal=None):
+        if "input" not in journal:
+            journal.record("input", encode_input(workflow_input))
+        runs.append((workflow_input, journal))
+
+    monkeypatch.setattr("storymachine.cli.w1", fake_w1)
+    monkeypatch.setattr(
+        sys, "argv", ["storymachine", "--prd", str(prd_file), "--pipeline"]
+    )
+    main()
+    run_id = runs[0][1].run_id
+    monkeypatch.setattr(sys, "argv", ["storymachine", "--resume", run_id])
+    main()
+
+    resumed_input, resumed_journal = runs[1]
+    assert resumed_input.pipeline is True
+    assert resumed_input.refresh_repo_context is False
+    assert resumed_journal.run_id == run_id
+    assert all(journal._fd is None for _, journal in runs)
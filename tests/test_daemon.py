@@ -0,0 +1,137 @@
+"""Tests for daemon module."""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from storymachine import daemon
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "fork"), reason="the daemon requires fork and Unix sockets"
+)
+
+
+@pytest.fixture
+def socket_path():
+    # AF_UNIX paths are limited to ~100 bytes, pytest's tmp_path can be longer
+    with tempfile.TemporaryDirectory(prefix="sm-") as tmp:
+        yield Path(tmp) / "d.sock"
+
+
+def _env(socket_path: Path) -> dict[str, str]:
+    return dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(sys.path),
+        STORYMACHINE_DAEMON_SOCKET=str(socket_path),
+    )
+
+
+def test_forward_without_daemon_runs_in_process(socket_path: Path, monkeypatch) -> None:
+    """forward() returns None so the CLI falls back to in-process execution."""
+    monkeypatch.setenv("STORYMACHINE_DAEMON_SOCKET", str(socket_path))
+
+    assert daemon.forward("cli", ["--help"]) is None
+
+    # A stale socket file left behind by a dead daemon is also ignored
+    socket_path.touch()
+    assert daemon.forward("cli", ["--help"]) is None
+
+
+def test_forward_skips_sockets_other_users_could_reach(
+    socket_path: Path, monkeypatch
+) -> None:
+    """Credentials are only sent to a socket that is ours and mode 0600."""
+    monkeypatch.setenv("STORYMACHINE_DAEMON_SOCKET", str(socket_path))
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(socket_path))
+    listener.listen(1)
+    listener.settimeout(0.2)
+    try:
+        os.chmod(socket_path, 0o666)
+        assert daemon.forward("cli", ["--help"]) is None
+        with pytest.raises(socket.timeout):
+            listener.accept()
+    finally:
+        listener.close()
+
+
+def test_default_socket_lives_in_a_private_directory(monkeypatch) -> None:
+    monkeypatch.delenv("STORYMACHINE_DAEMON_SOCKET")
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    with tempfile.TemporaryDirectory() as tmp:
+        monkeypatch.setattr(tempfile, "tempdir", tmp)
+        path = daemon.default_socket_path()
+        assert path.parent == Path(tmp) / f"storymachine-{os.getuid()}"
+
+        # A directory someone else prepared, or left open, is refused
+        path.parent.mkdir(mode=0o755)
+        os.chmod(path.parent, 0o755)
+        with pytest.raises(PermissionError):
+            daemon._prepare_socket_dir(path)
+        os.chmod(path.parent, 0o700)
+        daemon._prepare_socket_dir(path)
+
+
+def test_stalled_client_times_out_and_its_descriptors_are_closed() -> None:
+    """A client that never finishes its request can't hold the daemon."""
+    server, client = socket.socketpair()
+    read, write = os.pipe()
+    with server, client:
+        server.settimeout(0.1)
+        socket.send_fds(client, [daemon.MAGIC], [read, write, write])
+        open_fds = len(os.listdir("/proc/self/fd"))
+        with pytest.raises(TimeoutError):
+            daemon._handle_connection(server)
+        # The three descriptors received with the request were closed
+        assert len(os.listdir("/proc/self/fd")) == open_fds
+    os.close(read)
+    os.close(write)
+
+
+def test_cli_invocation_is_served_by_daemon(socket_path: Path, tmp_path: Path) -> None:
+    """A running daemon serves the CLI with the caller's cwd and stdio."""
+    env = _env(socket_path)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "storymachine.daemon", "serve"],
+        env=env,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while not socket_path.exists():
+            assert time.monotonic() < deadline, "daemon did not start"
+            time.sleep(0.05)
+
+        result = subprocess.run(
+            [sys.executable, "-m", "storymachine.cli", "--prd", "missing.md"],
+            cwd=tmp_path,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+
+        assert result.returncode == 1
+        assert "Error: PRD file not found: missing.md" in result.stderr
+
+        subprocess.run(
+            [sys.executable, "-m", "storymachine.daemon", "stop"],
+            env=env,
+            check=True,
+            timeout=30,
+        )
+        _, daemon_log = server.communicate(timeout=10)
+    finally:
+        if server.poll() is None:
+            server.kill()
+            server.wait()
+
+    assert "serving cli" in daemon_log
+    assert not socket_path.exists()
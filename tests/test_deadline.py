@@ -0,0 +1,49 @@
+"""Tests for deadline module."""
+
+import asyncio
+
+import pytest
+
+from storymachine.deadline import (
+    DeadlineExceeded,
+    deadline,
+    remaining,
+    run_with_deadline,
+    stage_timeout,
+    timeout_kwargs,
+)
+
+
+def test_stage_timeout_names_the_stage() -> None:
+    """A stage that outlasts its timeout is cancelled and reported by name."""
+
+    async def run():
+        async with stage_timeout("Machining Stories", 0.05):
+            await asyncio.sleep(10)
+
+    with pytest.raises(DeadlineExceeded, match="Machining Stories timed out"):
+        asyncio.run(run())
+
+
+def test_stage_cannot_outlast_the_run_deadline() -> None:
+    """A stage's timeout is shortened to the deadline it runs under."""
+
+    async def run():
+        async with stage_timeout("Stage", 600):
+            # Provider calls made in worker threads see the same deadline
+            return await asyncio.to_thread(timeout_kwargs)
+
+    kwargs = asyncio.run(run_with_deadline(run(), 5))
+
+    assert 0 < kwargs["timeout"] <= 5
+
+
+def test_no_deadline_by_default() -> None:
+    """Without a deadline nothing is limited."""
+    assert remaining() is None
+    assert timeout_kwargs() == {}
+    with deadline(0):
+        assert remaining() is None
+    with deadline(30):
+        left = remaining()
+        assert left is not None and left <= 30
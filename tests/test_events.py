@@ -0,0 +1,105 @@
+"""Tests for events module."""
+
+import asyncio
+import threading
+
+import pytest
+
+from storymachine.deadline import DeadlineExceeded
+from storymachine.events import END, EventChannel, emit, feedback_from_message
+from storymachine.session import Session, using
+from storymachine.types import FeedbackStatus, WorkflowInput
+
+
+def test_channel_takes_events_from_other_threads() -> None:
+    """Events emitted from a worker thread arrive in order, ending at END."""
+
+    async def run():
+        channel = EventChannel()
+
+        def work():
+            channel.emit("stage", label="Drafting")
+            channel.emit(END, status="succeeded")
+            channel.emit("late")
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        events = [event async for event in channel.events()]
+        thread.join()
+        return events
+
+    assert asyncio.run(run()) == [
+        {"type": "stage", "label": "Drafting"},
+        {"type": END, "status": "succeeded"},
+    ]
+
+
+def test_ask_waits_for_the_answer() -> None:
+    """ask() announces the review and takes only an answer naming it."""
+
+    async def run():
+        channel = EventChannel()
+        pending = asyncio.ensure_future(channel.ask("titles.0"))
+        event = await anext(channel.events())
+        assert not pending.done()
+        answer = feedback_from_message({"approved": False, "comment": "More"})
+        assert answer is not None
+        assert not channel.answer("titles.1", answer)
+        assert channel.answer("titles.0", answer)
+        assert not channel.answer("titles.0", answer)
+        return event, await pending
+
+    event, response = asyncio.run(run())
+
+    assert event == {"type": "review", "key": "titles.0"}
+    assert (response.status, response.comment) == (FeedbackStatus.REJECTED, "More")
+
+
+def test_late_readers_get_the_kept_events() -> None:
+    """Every reader replays the newest events, also after the end of the run."""
+
+    async def run():
+        channel = EventChannel(max_events=2)
+        first = channel.events()
+        channel.emit("a")
+        assert (await anext(first))["type"] == "a"
+        for type_ in "bc":
+            channel.emit(type_)
+        channel.emit(END)
+        rest = [event["type"] async for event in first]
+        late = [event["type"] async for event in channel.events()]
+        return rest, late
+
+    # The first reader fell behind and lost "b"
+    assert asyncio.run(run()) == (["c", END], ["c", END])
+
+
+def test_ask_gives_up_after_the_feedback_timeout() -> None:
+    async def run():
+        channel = EventChannel(feedback_timeout=0.01)
+        with pytest.raises(DeadlineExceeded):
+            await channel.ask("titles.0")
+        answer = feedback_from_message({"approved": True})
+        assert answer is not None
+        return channel.answer("titles.0", answer)
+
+    assert asyncio.run(run()) is False
+
+
+def test_emit_goes_to_the_current_sessions_channel() -> None:
+    """Module-level emit() is a no-op outside a session with a channel."""
+
+    async def run():
+        channel = EventChannel()
+        emit("ignored")
+        with using(Session.create(WorkflowInput("PRD", "", ""), channel=channel)):
+            emit(END)
+        return [event async for event in channel.events()]
+
+    assert asyncio.run(run()) == [{"type": END}]
+
+
+def test_feedback_from_message() -> None:
+    approved = feedback_from_message({"approved": True, "comment": "ignored"})
+    assert approved is not None and approved.status == FeedbackStatus.ACCEPTED
+    assert feedback_from_message({"comment": "no verdict"}) is None
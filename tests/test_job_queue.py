@@ -0,0 +1,177 @@
+"""Tests for job_queue module."""
+
+import time
+from pathlib import Path
+
+import pytest
+
+from storymachine.config import Settings
+from storymachine.job_queue import (
+    CANCELLED,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    JobQueue,
+    Priority,
+    backoff_delay,
+    open_queue,
+)
+from storymachine.types import WorkflowInput
+
+
+@pytest.fixture
+def queue(tmp_path: Path) -> JobQueue:
+    return JobQueue(tmp_path / "queue.db", max_attempts=2, preempt_after=0)
+
+
+def _input(prd: str) -> WorkflowInput:
+    return WorkflowInput(prd, "", "", repo_context="not stored")
+
+
+def test_claim_takes_the_most_urgent_job_first(queue: JobQueue) -> None:
+    """Interactive before normal before batch; FIFO within a class."""
+    batch = queue.enqueue(_input("batch"), Priority.BATCH)
+    first = queue.enqueue(_input("first"))
+    urgent = queue.enqueue(_input("urgent"), Priority.INTERACTIVE)
+    second = queue.enqueue(_input("second"))
+
+    claimed = [queue.claim("w", 60) for _ in range(5)]
+
+    assert [job.id if job else None for job in claimed] == [
+        urgent,
+        first,
+        second,
+        batch,
+        None,
+    ]
+    job = queue.get(urgent)
+    assert job is not None
+    assert (job.status, job.worker, job.attempts) == (RUNNING, "w", 1)
+    assert job.workflow_input.prd_content == "urgent"
+    assert job.workflow_input.repo_context is None
+
+
+def test_failed_jobs_retry_with_backoff_then_fail(queue: JobQueue) -> None:
+    job_id = queue.enqueue(_input("PRD"))
+    claimed = queue.claim("w", 60)
+    assert claimed is not None
+
+    assert queue.fail(claimed, "boom")
+    job = queue.get(job_id)
+    assert job is not None and job.status == QUEUED
+    assert job.available_at > time.time() + 5
+    # Not available until the backoff has passed
+    assert queue.claim("w", 60) is None
+
+    with queue._connect(write=True) as db:
+        db.execute("UPDATE jobs SET available_at = 0")
+    claimed = queue.claim("w", 60)
+    assert claimed is not None
+    queue.fail(claimed, "boom again")
+
+    job = queue.get(job_id)
+    assert job is not None
+    assert (job.status, job.attempts, job.error) == (FAILED, 2, "boom again")
+    assert backoff_delay(1, 10) == 10 and backoff_delay(3, 10) == 40
+
+
+def test_expired_lease_makes_the_job_available_again(queue: JobQueue) -> None:
+    job_id = queue.enqueue(_input("PRD"))
+    stale = queue.claim("w", 0)
+    time.sleep(0.01)
+
+    job = queue.claim("w", 60)
+
+    assert stale is not None and job is not None
+    assert job.id == job_id and job.attempts == 2 and job.lease != stale.lease
+    # The first claim is fenced off, even for the same worker name
+    assert not queue.heartbeat(stale, 60)
+    assert not queue.complete(stale, [{"number": 1, "title": "Stale"}])
+    assert not queue.fail(stale, "late") and not queue.release(stale)
+    assert queue.complete(job, [{"number": 1, "title": "T"}])
+    # Published exactly once: a late second publication is refused
+    assert not queue.complete(job, [{"number": 1, "title": "Again"}])
+    job = queue.get(job_id)
+    assert job is not None
+    assert job.status == SUCCEEDED and job.result == [{"number": 1, "title": "T"}]
+
+
+def test_interactive_job_preempts_the_newest_batch_job(queue: JobQueue) -> None:
+    queue.enqueue(_input("older"), Priority.BATCH)
+    queue.enqueue(_input("newer"), Priority.BATCH)
+    older = queue.claim("w1", 60)
+    time.sleep(0.01)
+    newer = queue.claim("w2", 60)
+    assert older is not None and newer is not None
+    assert queue.preempt(newer, "w2", 60) is None
+
+    urgent = queue.enqueue(_input("urgent"), Priority.INTERACTIVE)
+
+    assert queue.preempt(older, "w1", 60) is None
+    job = queue.preempt(newer, "w2", 60)
+    assert job is not None and job.id == urgent and job.worker == "w2"
+    requeued = queue.get(newer.id)
+    assert requeued is not None
+    # Preemption doesn't use up an attempt
+    assert (requeued.status, requeued.attempts) == (QUEUED, 0)
+
+
+def test_cancel_stops_heartbeats_and_stats(queue: JobQueue) -> None:
+    running = queue.enqueue(_input("running"))
+    claimed = queue.claim("w", 60)
+    assert claimed is not None
+    queue.enqueue(_input("waiting"), Priority.BATCH)
+
+    stats = queue.stats()
+    assert stats["depth"] == {"interactive": 0, "normal": 0, "batch": 1}
+    assert stats["running"] == 1
+    assert stats["oldest_wait"]["batch"] >= 0
+
+    cancelled = queue.cancel(running)
+    assert cancelled is not None and cancelled.status == CANCELLED
+    assert not queue.heartbeat(claimed, 60)
+    assert queue.cancel("missing") is None
+    assert queue.stats()["running"] == 0
+
+
+def test_enqueue_with_a_known_key_returns_the_existing_job(queue: JobQueue) -> None:
+    first = queue.enqueue(_input("PRD"), key="k")
+
+    assert queue.enqueue(_input("PRD"), key="k") == first
+    assert queue.enqueue(_input("PRD")) != first
+    assert len(queue.jobs()) == 2
+
+
+def test_enqueue_with_the_key_of_a_finished_job(queue: JobQueue) -> None:
+    """Failed and cancelled jobs run again; succeeded ones are kept."""
+    failed = queue.enqueue(_input("A"), key="a", max_attempts=1)
+    claimed = queue.claim("w", 60)
+    assert claimed is not None
+    queue.fail(claimed, "model unavailable")
+    cancelled = queue.enqueue(_input("B"), key="b")
+    queue.cancel(cancelled)
+    done = queue.enqueue(_input("C"), key="c")
+    claimed = queue.claim("w", 60)
+    assert claimed is not None
+    queue.complete(claimed, [])
+
+    assert queue.enqueue(_input("A"), key="a") == failed
+    assert queue.enqueue(_input("B"), key="b") == cancelled
+    assert queue.enqueue(_input("C"), key="c") == done
+    rerun = queue.get(failed)
+    assert rerun is not None
+    assert (rerun.status, rerun.attempts, rerun.error) == (QUEUED, 0, None)
+    assert [job.id for job in queue.jobs(QUEUED)] == [failed, cancelled]
+    assert queue.get(done).status == SUCCEEDED  # pyright: ignore[reportOptionalMemberAccess]
+
+
+def test_open_queue_picks_the_backend_from_the_scheme(tmp_path: Path) -> None:
+    settings = Settings()  # pyright: ignore[reportCallIssue]
+
+    queue = open_queue(settings, f"sqlite://{tmp_path / 'q.db'}")
+
+    assert isinstance(queue, JobQueue) and queue.path == tmp_path / "q.db"
+    assert isinstance(open_queue(settings, str(tmp_path / "p.db")), JobQueue)
+    with pytest.raises(ValueError, match="Unknown queue backend"):
+        open_queue(settings, "redis://localhost")
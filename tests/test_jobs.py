@@ -0,0 +1,158 @@
+"""Tests for jobs module."""
+
+import asyncio
+
+import pytest
+
+from storymachine import workflow
+from storymachine.events import feedback_from_message
+from storymachine.jobs import JobManager, JobStatus
+from storymachine.types import Story, WorkflowInput
+
+
+@pytest.fixture
+def fake_activities(monkeypatch: pytest.MonkeyPatch) -> asyncio.Event:
+    """Stub the model stages; detailing waits until the returned event is set."""
+    release = asyncio.Event()
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        return [Story(f"{workflow_input.prd_content} {i}", []) for i in range(2)]
+
+    async def fake_criteria(story, comments=""):
+        await release.wait()
+        return Story(story.title, ["AC"])
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        return story
+
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", fake_criteria)
+    monkeypatch.setattr(workflow, "enrich_context", fake_enrich)
+    return release
+
+
+def test_jobs_queue_beyond_the_concurrency_limit(fake_activities) -> None:
+    """Jobs over max_running wait queued and all finish with their stories."""
+
+    async def run():
+        manager = JobManager(max_running=1)
+        first = manager.submit(WorkflowInput("A", "", ""))
+        second = manager.submit(WorkflowInput("B", "", ""))
+        await asyncio.sleep(0.05)
+        assert (first.status, second.status) == (JobStatus.RUNNING, JobStatus.QUEUED)
+
+        fake_activities.set()
+        await asyncio.gather(first.task, second.task)  # pyright: ignore[reportArgumentType]
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first.status == second.status == JobStatus.SUCCEEDED
+    assert [s["title"] for s in second.to_dict()["stories"]] == ["B 0", "B 1"]
+    assert second.to_dict()["stories"][0]["acceptance_criteria"] == ["AC"]
+
+
+def test_cancel_stops_a_running_job(fake_activities) -> None:
+    """A cancelled job ends as cancelled, keeping what it had."""
+
+    async def run():
+        manager = JobManager(max_running=2)
+        job = manager.submit(WorkflowInput("A", "", ""))
+        await asyncio.sleep(0.05)
+        assert job.to_dict()["total"] == 2
+        manager.cancel(job.id)
+        await asyncio.gather(job.task, return_exceptions=True)  # pyright: ignore[reportArgumentType]
+        return job
+
+    job = asyncio.run(run())
+
+    assert job.status == JobStatus.CANCELLED
+    assert job.finished_at is not None
+
+
+def test_finished_jobs_are_forgotten_beyond_retention(fake_activities) -> None:
+    """Only the newest finished jobs are kept."""
+    fake_activities.set()
+
+    async def run():
+        manager = JobManager(max_running=4, retention=2)
+        for name in "ABC":
+            job = manager.submit(WorkflowInput(name, "", ""))
+            await job.task  # pyright: ignore[reportGeneralTypeIssues]
+        manager.submit(WorkflowInput("D", "", ""))
+        await manager.shutdown()
+        return manager
+
+    manager = asyncio.run(run())
+
+    assert [job.workflow_input.prd_content for job in manager.jobs()] == ["B", "C", "D"]
+
+
+def test_interactive_job_streams_events_and_takes_feedback(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """An interactive job asks its channel at each review, never the terminal."""
+    comments = []
+
+    async def fake_break_down(workflow_input, stories, comments_="", repo_context=""):
+        comments.append(comments_)
+        return [Story("Login", [])]
+
+    async def fake_criteria(story, comments=""):
+        return Story(story.title, ["AC"])
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        return story
+
+    def no_input():
+        raise AssertionError("interactive jobs must not read stdin")
+
+    def no_print(stories):
+        raise AssertionError("interactive jobs must not print stories")
+
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", fake_criteria)
+    monkeypatch.setattr(workflow, "enrich_context", fake_enrich)
+    monkeypatch.setattr(workflow, "get_human_input", no_input)
+    monkeypatch.setattr(workflow, "print_story_titles", no_print)
+    monkeypatch.setattr(workflow, "print_final_stories", no_print)
+
+    async def run():
+        manager = JobManager()
+        job = manager.submit(WorkflowInput("A", "", ""), interactive=True)
+        answers = iter([{"approved": False, "comment": "Split it"}])
+        events = []
+        async for event in job.channel.events():
+            events.append(event)
+            if event["type"] == "review":
+                message = next(answers, {"approved": True})
+                job.channel.answer(event["key"], feedback_from_message(message))  # pyright: ignore[reportArgumentType]
+        return job, events
+
+    job, events = asyncio.run(run())
+
+    assert job.status == JobStatus.SUCCEEDED
+    assert comments[1] == "Split it"
+    assert job.to_dict()["stories"][0]["acceptance_criteria"] == ["AC"]
+    types = [event["type"] for event in events]
+    assert types[0] == "status" and types[-1] == "end"
+    assert types.count("review") == 3
+    assert {"stage", "stories", "story", "completed"} <= set(types)
+
+
+def test_interactive_job_fails_without_feedback(
+    monkeypatch: pytest.MonkeyPatch, fake_activities
+) -> None:
+    """A review nobody answers fails the job and frees its slot."""
+    monkeypatch.setenv("STORYMACHINE_SERVER_FEEDBACK_TIMEOUT", "0.05")
+
+    async def run():
+        manager = JobManager(max_running=1)
+        job = manager.submit(WorkflowInput("A", "", ""), interactive=True)
+        await job.task  # pyright: ignore[reportGeneralTypeIssues]
+        return job
+
+    job = asyncio.run(run())
+
+    assert job.status == JobStatus.FAILED
+    assert job.error is not None and job.error.startswith("Timed out")
@@ -0,0 +1,106 @@
+"""Tests for journal module."""
+
+import asyncio
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from storymachine import workflow
+from storymachine.journal import RunJournal
+from storymachine.types import FeedbackResponse, FeedbackStatus, Story, WorkflowInput
+
+
+def test_journal_records_survive_reopen(run_dir: Path) -> None:
+    """Records written by one journal are visible when the run is resumed."""
+    journal = RunJournal.create(run_dir)
+    journal.record("stories.0", [{"title": "A", "acceptance_criteria": []}])
+    journal.close()
+
+    resumed = RunJournal.resume(run_dir, journal.run_id)
+
+    assert "stories.0" in resumed
+    assert resumed.get("stories.0") == [{"title": "A", "acceptance_criteria": []}]
+
+
+def test_journal_ignores_torn_final_line(run_dir: Path) -> None:
+    """A partially written record from a crash is skipped and appends continue."""
+    journal = RunJournal.create(run_dir)
+    journal.record("input", {"prd_content": "PRD"})
+    journal.close()
+    assert journal.path is not None
+    with journal.path.open("a", encoding="utf-8") as f:
+        f.write('{"key": "stories.0", "val')
+
+    resumed = RunJournal.resume(run_dir, journal.run_id)
+    resumed.record("repo_context", "ctx")
+    resumed.close()
+
+    reloaded = RunJournal.resume(run_dir, journal.run_id)
+    assert "stories.0" not in reloaded
+    assert reloaded.get("input") == {"prd_content": "PRD"}
+    assert reloaded.get("repo_context") == "ctx"
+
+
+def test_resume_unknown_run_raises(run_dir: Path) -> None:
+    """Resuming a run without a journal raises FileNotFoundError."""
+    with pytest.raises(FileNotFoundError):
+        RunJournal.resume(run_dir, "missing")
+
+
+def test_w1_resume_skips_completed_steps(
+    monkeypatch: pytest.MonkeyPatch, run_dir: Path, sample_stories: List[Story]
+) -> None:
+    """A resumed run replays journaled LLM results and approvals."""
+    calls: List[str] = []
+    answers = [
+        FeedbackResponse(status=FeedbackStatus.ACCEPTED),
+        FeedbackResponse(status=FeedbackStatus.ACCEPTED),
+    ]
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        calls.append("break_down")
+        return [Story(title=s.title, acceptance_criteria=[]) for s in sample_stories]
+
+    async def fake_criteria(story, comments=""):
+        calls.append(f"criteria:{story.title}")
+        return Story(title=story.title, acceptance_criteria=["AC"])
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        calls.append(f"enrich:{story.title}")
+        return Story(story.title, story.acceptance_criteria, "context")
+
+    def crash_after_first_story():
+        if not answers:
+            raise KeyboardInterrupt
+        return answers.pop(0)
+
+    # Detail stories one at a time so the call order is deterministic
+    monkeypatch.setenv("STORYMACHINE_SPECULATIVE_STORIES", "0")
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", fake_criteria)
+    monkeypatch.setattr(workflow, "enrich_context", fake_enrich)
+    monkeypatch.setattr(workflow, "get_human_input", crash_after_first_story)
+
+    workflow_input = WorkflowInput(prd_content="PRD", tech_spec_content="", repo_url="")
+    journal = RunJournal.create(run_dir)
+    with pytest.raises(KeyboardInterrupt):
+        asyncio.run(workflow.w1(workflow_input, journal))
+    journal.close()
+
+    first, second = (s.title for s in sample_stories)
+    assert calls == [
+        "break_down",
+        f"criteria:{first}",
+        f"enrich:{first}",
+        f"criteria:{second}",
+        f"enrich:{second}",
+    ]
+
+    calls.clear()
+    answers.append(FeedbackResponse(status=FeedbackStatus.ACCEPTED))
+    resumed = RunJournal.resume(run_dir, journal.run_id)
+    stories = asyncio.run(workflow.w1(workflow_input, resumed))
+
+    assert calls == []
+    assert [s.enriched_context for s in stories] == ["context", "context"]
@@ -0,0 +1,123 @@
+"""Tests for local_repo module."""
+
+import asyncio
+import sys
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from storymachine import activities
+from storymachine.local_repo import (
+    is_remote_url,
+    list_local_tree,
+    local_repo_path,
+    local_repo_under,
+    parse_gitignore,
+)
+from storymachine.types import WorkflowInput
+
+
+def _write(root: Path, *paths: str) -> None:
+    for path in paths:
+        file = root / path
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(f"# {path}\n")
+
+
+def _paths(root: Path) -> List[str]:
+    return [item["path"] for item in list_local_tree(root)]
+
+
+def test_parse_gitignore_patterns() -> None:
+    """Globs match basenames anywhere unless a slash anchors them."""
+    rules = parse_gitignore("# comment\n*.log\n/build\ndocs/**/*.tmp\n")
+
+    def matches(path: str) -> bool:
+        return any(rule.regex.match(path) for rule in rules)
+
+    assert matches("app.log")
+    assert matches("nested/dir/app.log")
+    assert matches("build")
+    assert not matches("src/build")
+    assert matches("docs/a/b/c.tmp")
+    assert matches("docs/c.tmp")
+    assert not matches("src/c.tmp")
+
+
+def test_list_local_tree_respects_gitignore(tmp_path: Path) -> None:
+    """Ignored, negated, nested and vendored entries are handled like git."""
+    (tmp_path / ".gitignore").write_text("*.log\n!keep.log\ndist/\n/secret.txt\n")
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / ".gitignore").write_text("generated_*.py\n")
+    _write(
+        tmp_path,
+        "README.md",
+        "debug.log",
+        "keep.log",
+        "secret.txt",
+        "dist/bundle.js",
+        "pkg/secret.txt",
+        "pkg/core.py",
+        "pkg/generated_models.py",
+        "node_modules/left-pad/index.js",
+        ".git/HEAD",
+    )
+
+    assert _paths(tmp_path) == [
+        ".gitignore",
+        "README.md",
+        "keep.log",
+        "pkg/.gitignore",
+        "pkg/core.py",
+        "pkg/secret.txt",
+    ]
+
+
+def test_local_repo_path_distinguishes_urls(tmp_path: Path) -> None:
+    """Only existing directories count as local checkouts."""
+    assert local_repo_path(str(tmp_path)) == tmp_path.resolve()
+    assert local_repo_path("https://github.com/owner/repo") is None
+    assert local_repo_path(str(tmp_path / "missing")) is None
+
+
+def test_local_checkouts_are_confined_to_roots(tmp_path: Path) -> None:
+    """Only remote URLs pass as such; paths must resolve inside a root."""
+    assert is_remote_url("https://github.com/owner/repo")
+    assert is_remote_url("git@github.com:owner/repo.git")
+    assert not is_remote_url("file:///etc")
+    assert not is_remote_url("/etc")
+
+    root = tmp_path / "checkouts"
+    (root / "app").mkdir(parents=True)
+    (tmp_path / "escape").symlink_to(tmp_path)
+    assert local_repo_under(str(root / "app"), [str(root)]) == (root / "app").resolve()
+    assert local_repo_under(str(root / ".." / "checkouts"), [str(root)]) is not None
+    assert local_repo_under(str(root / ".."), [str(root)]) is None
+    assert local_repo_under(str(tmp_path / "escape"), [str(root)]) is None
+    assert local_repo_under(str(root / "app"), [""]) is None
+
+
+def test_codebase_context_from_local_checkout(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """A local --repo is answered from file reads without ask_github."""
+    _write(tmp_path, "src/auth/login.py", "src/billing/invoice.py")
+    prompts: List[str] = []
+
+    async def fake_call_ai_api(prompt, tools=None):
+        prompts.append(prompt)
+        return "How does login work?" if len(prompts) == 1 else "Login is in login.py"
+
+    monkeypatch.setattr(activities, "call_ai_api_async", fake_call_ai_api)
+    monkeypatch.setitem(sys.modules, "ask_github", None)
+
+    workflow_input = WorkflowInput(
+        prd_content="PRD", tech_spec_content="", repo_url=str(tmp_path)
+    )
+    context = asyncio.run(activities.get_codebase_context(workflow_input))
+
+    assert context == "### Q1: How does login work?\n\nLogin is in login.py"
+    assert "  auth/\n    login.py" in prompts[0]
+    assert '<file path="src/auth/login.py">' in prompts[1]
+    assert '<file path="src/billing/invoice.py">' not in prompts[1]
@@ -0,0 +1,84 @@
+"""Tests for memory module."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from storymachine import ai, memory
+from storymachine.memory import ConversationMemory
+from storymachine.session import Session, using
+from storymachine.tokens import estimate_tokens
+from storymachine.types import WorkflowInput
+
+
+def test_history_keeps_recent_turns_and_summarises_older() -> None:
+    """Older turns become summary lines; the latest are sent verbatim."""
+    store = ConversationMemory(max_tokens=10_000, recent_turns=1)
+    store.record("stories", "Break down the PRD", "1. Login\n2. Export")
+    store.record("stories", "Merge 1 and 2", "1. Login and export")
+    store.record("story.0.criteria", "Criteria for Login", "AC")
+
+    messages = store.history("stories")
+
+    assert messages[0]["role"] == "system"
+    assert "Break down the PRD → 1. Login 2. Export" in messages[0]["content"]
+    assert messages[1:] == [
+        {"role": "user", "content": "Merge 1 and 2"},
+        {"role": "assistant", "content": "1. Login and export"},
+    ]
+    assert store.history("story.1.criteria") == []
+
+
+def test_history_stays_within_the_token_cap() -> None:
+    """Long prompts are clipped before replies are dropped."""
+    store = ConversationMemory(max_tokens=100, recent_turns=2, summary_chars=40)
+    store.record("stories", "PRD " * 500, "1. Login")
+    store.record("stories", "Revise " * 500, "1. Login\n2. Export")
+
+    messages = store.history("stories")
+
+    assert sum(estimate_tokens(m["content"]) for m in messages) <= 100
+    assert [m["content"] for m in messages if m["role"] == "assistant"] == [
+        "1. Login",
+        "1. Login\n2. Export",
+    ]
+
+
+def test_calls_share_history_only_within_a_topic(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Each call gets the history of its own topic and of its own run."""
+    sent = []
+
+    async def fake_call_api_async(prompt, tools=None, history=None):
+        sent.append((prompt, history))
+        return f"reply to {prompt}"
+
+    monkeypatch.setattr(
+        ai, "_provider", lambda: SimpleNamespace(call_api_async=fake_call_api_async)
+    )
+
+    async def run():
+        session = Session.create(WorkflowInput("PRD", "", ""))
+        with using(session):
+            with memory.topic("stories"):
+                await ai.call_ai_api_async("draft")
+                await ai.call_ai_api_async("revise")
+            with memory.topic("story.0.criteria"):
+                await ai.call_ai_api_async("criteria")
+            # Outside a topic nothing is sent or remembered
+            await ai.call_ai_api_async("question")
+
+    asyncio.run(run())
+
+    assert sent[0] == ("draft", [])
+    assert sent[1] == (
+        "revise",
+        [
+            {"role": "user", "content": "draft"},
+            {"role": "assistant", "content": "reply to draft"},
+        ],
+    )
+    assert sent[2] == ("criteria", [])
+    assert sent[3] == ("question", None)
@@ -0,0 +1,170 @@
+"""Tests for metrics module."""
+
+import asyncio
+import io
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from storymachine import ai, metrics
+from storymachine.activities import parse_stories_from_response
+from storymachine.config import Settings
+from storymachine.progress import ProgressRenderer, add_tokens
+from storymachine.singleflight import SingleFlight
+
+
+def test_render_text_format() -> None:
+    """Metrics render with HELP and TYPE lines and escaped, sorted labels."""
+    registry = metrics.Registry()
+    requests = registry.register(
+        metrics.Counter("requests_total", "Requests.", ("path",))
+    )
+    latency = registry.register(
+        metrics.Histogram("latency_seconds", "Latency.", buckets=(0.5, 1))
+    )
+    requests.inc(path='/a"b')
+    requests.inc(2, path="/")
+    latency.observe(0.2)
+    latency.observe(0.7)
+    latency.observe(3)
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{path="/"} 2',
+        'requests_total{path="/a\\"b"} 1',
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.5"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 3.9",
+        "latency_seconds_count 3",
+    ]
+    with pytest.raises(ValueError):
+        requests.inc(method="GET")
+
+
+def test_provider_calls_are_counted_by_stage_and_outcome(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Latency, outcome and tokens are labelled with the normalized stage."""
+
+    class RateLimited(Exception):
+        status_code = 429
+
+    async def call_api_async(prompt, tools, history):
+        if prompt == "busy":
+            raise RateLimited("slow down")
+        add_tokens(40)
+        return "reply"
+
+    monkeypatch.setattr(
+        ai, "_provider", lambda: SimpleNamespace(call_api_async=call_api_async)
+    )
+    monkeypatch.setattr(ai, "_flights", SingleFlight())
+    monkeypatch.setenv("API_PROVIDER", "openai")
+    monkeypatch.setenv("MODEL", "test-model")
+    monkeypatch.setenv("STORYMACHINE_PROVIDER_MAX_RETRIES", "0")
+    model = {"provider": "openai", "model": "test-model"}
+    labels = {**model, "stage": "Detailing story"}
+    before = {
+        "ok": metrics.PROVIDER_REQUESTS.value(**labels, outcome="ok"),
+        "limited": metrics.PROVIDER_REQUESTS.value(**labels, outcome="rate_limited"),
+        "rate_limited": metrics.RATE_LIMITED.value(**model),
+        "latency": metrics.PROVIDER_LATENCY.count(**labels),
+        "tokens": metrics.TOKENS.value(**labels),
+    }
+    renderer = ProgressRenderer(io.StringIO(), is_tty=False)
+
+    async def run():
+        with renderer.track("Detailing story 3"):
+            await ai.call_ai_api_async("PRD")
+        with renderer.track("Detailing story 12"):
+            with pytest.raises(RateLimited):
+                await ai.call_ai_api_async("busy")
+
+    asyncio.run(run())
+
+    assert metrics.PROVIDER_REQUESTS.value(**labels, outcome="ok") == before["ok"] + 1
+    assert (
+        metrics.PROVIDER_REQUESTS.value(**labels, outcome="rate_limited")
+        == before["limited"] + 1
+    )
+    assert metrics.RATE_LIMITED.value(**model) == before["rate_limited"] + 1
+    assert metrics.PROVIDER_LATENCY.count(**labels) == before["latency"] + 2
+    assert metrics.TOKENS.value(**labels) == before["tokens"] + 40
+    assert 'stage="Detailing story"' in metrics.render()
+
+
+def test_provider_retries_are_counted(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Transient failures are retried here, each attempt and retry counted."""
+
+    class ProviderError(Exception):
+        def __init__(self, status_code: int):
+            super().__init__(f"HTTP {status_code}")
+            self.status_code = status_code
+
+    class Dropped(Exception):
+        pass
+
+    failures = {"busy": [429, 503], "dropped": [Dropped()], "bad": [400]}
+
+    async def call_api_async(prompt, tools, history):
+        if failures[prompt]:
+            failure = failures[prompt].pop(0)
+            raise failure if isinstance(failure, Dropped) else ProviderError(failure)
+        return "reply"
+
+    provider = SimpleNamespace(
+        call_api_async=call_api_async, CONNECTION_ERRORS=(Dropped,)
+    )
+    monkeypatch.setattr(ai, "_provider", lambda: provider)
+    monkeypatch.setattr(ai, "RETRY_BASE_DELAY", 0)
+    monkeypatch.setenv("API_PROVIDER", "openai")
+    monkeypatch.setenv("MODEL", "test-model")
+    model = {"provider": "openai", "model": "test-model"}
+    before = {
+        "retries": metrics.RETRIES.value(kind="provider"),
+        "rate_limited": metrics.RATE_LIMITED.value(**model),
+    }
+
+    async def run():
+        assert await ai.call_ai_api_async("busy") == "reply"
+        assert await ai.call_ai_api_async("dropped") == "reply"
+        with pytest.raises(ProviderError):
+            await ai.call_ai_api_async("bad")
+
+    asyncio.run(run())
+
+    assert failures == {"busy": [], "dropped": [], "bad": []}
+    assert metrics.RETRIES.value(kind="provider") == before["retries"] + 3
+    assert metrics.RATE_LIMITED.value(**model) == before["rate_limited"] + 1
+
+
+def test_parse_failures_are_counted() -> None:
+    provider = Settings().api_provider  # pyright: ignore[reportCallIssue]
+    before = metrics.PARSE_FAILURES.value(provider=provider)
+
+    assert parse_stories_from_response("no stories here") == []
+    assert metrics.PARSE_FAILURES.value(provider=provider) == before + 1
+
+
+def test_textfile_export(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """The textfile is written only when configured, per process in a pool."""
+    metrics.record_queue_stats(
+        {"depth": {"interactive": 2, "batch": 0}, "oldest_wait": {"interactive": 1.5}}
+    )
+    metrics.export(Settings())  # pyright: ignore[reportCallIssue]
+    assert list(tmp_path.glob("*.prom")) == []
+
+    path = tmp_path / "textfile" / "storymachine.prom"
+    monkeypatch.setenv("STORYMACHINE_METRICS_TEXTFILE", str(path))
+    metrics.export(Settings(), index=1)  # pyright: ignore[reportCallIssue]
+
+    text = (tmp_path / "textfile" / "storymachine-1.prom").read_text()
+    assert 'storymachine_queue_depth{priority="interactive"} 2' in text
+    assert 'storymachine_queue_oldest_wait_seconds{priority="interactive"} 1.5' in text
+    assert "# TYPE storymachine_coalesced_requests_total counter" in text
+    assert not path.exists()
@@ -0,0 +1,61 @@
+"""Tests for progress module."""
+
+import asyncio
+import io
+
+from storymachine.progress import SHOW_CURSOR, ProgressRenderer, add_tokens
+
+
+def test_plain_lines_when_not_a_terminal() -> None:
+    """Without a terminal each stage logs a start and a finish line."""
+    stream = io.StringIO()
+    renderer = ProgressRenderer(stream, is_tty=False)
+
+    async def run():
+        with renderer.track("Machining Stories"):
+            # Tokens reported from a worker thread reach the stage
+            await asyncio.to_thread(add_tokens, 120)
+
+    asyncio.run(run())
+
+    lines = stream.getvalue().splitlines()
+    assert lines[0] == "Machining Stories..."
+    assert lines[1].startswith("Machining Stories done (")
+    assert lines[1].endswith(", 120 tokens)")
+    assert "\x1b" not in stream.getvalue()
+
+
+def test_live_line_per_concurrent_stage() -> None:
+    """Concurrent stages share one display and are cleared when done."""
+    stream = io.StringIO()
+    renderer = ProgressRenderer(stream, interval=0.01, is_tty=True)
+
+    async def stage(label: str, background: bool = False) -> None:
+        with renderer.track(label, background):
+            await asyncio.sleep(0.05)
+
+    async def run():
+        await asyncio.gather(
+            stage("Detailing the story"), stage("Detailing story 2", background=True)
+        )
+
+    asyncio.run(run())
+
+    output = stream.getvalue()
+    assert "Detailing the story (0s)\n" in output
+    assert "Detailing story 2 (0s)\n" in output
+    assert output.endswith(SHOW_CURSOR)
+
+
+def test_background_stages_alone_are_not_drawn() -> None:
+    """Background work doesn't draw over prompts and printed output."""
+    stream = io.StringIO()
+    renderer = ProgressRenderer(stream, interval=0.01, is_tty=True)
+
+    async def run():
+        with renderer.track("Detailing story 2", background=True):
+            await asyncio.sleep(0.03)
+
+    asyncio.run(run())
+
+    assert stream.getvalue() == ""
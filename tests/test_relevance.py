@@ -0,0 +1,64 @@
+"""Tests for relevance module."""
+
+from storymachine.relevance import document_terms, rank_paths, tokenize
+
+PATHS = [
+    "services/auth/login_controller.py",
+    "services/auth/password_reset.py",
+    "services/billing/invoice_service.py",
+    "services/billing/payment_gateway.py",
+    "services/search/indexer.py",
+    "web/components/LoginForm.tsx",
+    "README.md",
+]
+
+
+def test_tokenize_splits_identifiers() -> None:
+    """camelCase, snake_case and plural forms reduce to shared terms."""
+    assert tokenize("UserAuthService password_resets") == [
+        "user",
+        "auth",
+        "service",
+        "password",
+        "reset",
+    ]
+
+
+def test_rank_paths_prefers_prd_terms() -> None:
+    """Paths sharing PRD terms rank first and unrelated paths are dropped."""
+    terms = document_terms(
+        "Users can login with a password and reset a forgotten password.",
+        "The login endpoint issues a JWT.",
+    )
+
+    ranked = rank_paths(PATHS, terms)
+
+    assert set(ranked) == {
+        "services/auth/login_controller.py",
+        "services/auth/password_reset.py",
+        "web/components/LoginForm.tsx",
+    }
+    assert ranked[0] == "services/auth/password_reset.py"
+
+
+def test_rank_paths_uses_file_heads() -> None:
+    """Identifiers in sampled file heads lift otherwise equal candidates."""
+    terms = document_terms("Billing must support refunds")
+    heads = {"services/billing/payment_gateway.py": "def refund(charge_id): ..."}
+
+    without_heads = rank_paths(PATHS, terms)
+    with_heads = rank_paths(PATHS, terms, read_head=lambda p: heads.get(p, ""))
+
+    assert without_heads[:2] == [
+        "services/billing/invoice_service.py",
+        "services/billing/payment_gateway.py",
+    ]
+    assert with_heads[:2] == [
+        "services/billing/payment_gateway.py",
+        "services/billing/invoice_service.py",
+    ]
+
+
+def test_rank_paths_without_terms_is_empty() -> None:
+    """Documents without usable terms rank nothing, so callers keep every path."""
+    assert rank_paths(PATHS, document_terms("用户可以登录")) == []
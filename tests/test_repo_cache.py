@@ -0,0 +1,207 @@
+"""Tests for repo_cache module."""
+
+import asyncio
+import base64
+import os
+import subprocess
+import sys
+import types
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from storymachine import activities, repo_cache
+from storymachine.repo_cache import RepoContextCache
+from storymachine.repo_questions import NO_ANSWER
+from storymachine.types import WorkflowInput
+
+REPO_URL = "https://github.com/owner/repo"
+
+
+def test_cache_keys_on_commit_and_prompt(repo_cache_dir: Path) -> None:
+    """Context is only reused for the same commit SHA and questions prompt."""
+    cache = RepoContextCache(repo_cache_dir)
+    cache.put_context(REPO_URL, "sha1", "prompt", "context")
+
+    assert cache.get_context(REPO_URL, "sha1", "prompt") == "context"
+    assert cache.get_context(REPO_URL, "sha2", "prompt") is None
+    assert cache.get_context(REPO_URL, "sha1", "other prompt") is None
+
+
+def test_cache_evicts_least_recently_used(repo_cache_dir: Path) -> None:
+    """Writing beyond max_entries drops the entry that was read least recently."""
+    cache = RepoContextCache(repo_cache_dir, max_entries=2)
+    cache.put_tree(REPO_URL, "a", [{"path": "a.py", "type": "blob"}])
+    cache.put_tree(REPO_URL, "b", [{"path": "b.py", "type": "blob"}])
+    # Age both entries, then touch "a" so "b" becomes the oldest
+    for path in repo_cache_dir.glob("*.json"):
+        os.utime(path, (0, 0))
+    assert cache.get_tree(REPO_URL, "a") is not None
+
+    cache.put_tree(REPO_URL, "c", [{"path": "c.py", "type": "blob"}])
+
+    assert cache.get_tree(REPO_URL, "a") is not None
+    assert cache.get_tree(REPO_URL, "b") is None
+    assert cache.get_tree(REPO_URL, "c") is not None
+
+
+def test_cache_tolerates_entries_vanishing_and_concurrent_writers(
+    monkeypatch: pytest.MonkeyPatch, repo_cache_dir: Path
+) -> None:
+    """Another process evicting an entry is a miss, not an error."""
+    cache = RepoContextCache(repo_cache_dir, max_entries=4)
+    cache.put_context(REPO_URL, "sha", "prompt", "context")
+
+    def evicted_meanwhile(path, *args):
+        os.remove(path)
+        raise FileNotFoundError(path)
+
+    with monkeypatch.context() as m:
+        m.setattr(repo_cache.os, "utime", evicted_meanwhile)
+        assert cache.get_context(REPO_URL, "sha", "prompt") == "context"
+    assert cache.get_context(REPO_URL, "sha", "prompt") is None
+    assert repo_cache._mtime(repo_cache_dir / "missing.json") == float("-inf")
+
+    # Jobs of one process writing the same entry don't share a temporary file
+    def write(i: int) -> None:
+        cache.put_context(REPO_URL, "sha", "prompt", f"context {i}")
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(write, range(64)))
+    assert cache.get_context(REPO_URL, "sha", "prompt").startswith("context ")  # pyright: ignore[reportOptionalMemberAccess]
+    assert list(repo_cache_dir.glob("*.tmp")) == []
+
+
+@pytest.fixture
+def fake_remote(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    """Stub ask_github, the commit lookup and the LLM, recording remote calls."""
+    calls: List[str] = []
+
+    def list_tree(repo_url, token=None):
+        calls.append("list_tree")
+        return [{"path": "src/app.py", "type": "blob"}]
+
+    def ask(repo_url, prompt, token=None, max_iterations=100):
+        calls.append("ask")
+        return "The app lives in src/app.py"
+
+    module = types.ModuleType("ask_github")
+    module.list_tree = list_tree  # pyright: ignore[reportAttributeAccessIssue]
+    module.ask = ask  # pyright: ignore[reportAttributeAccessIssue]
+    monkeypatch.setitem(sys.modules, "ask_github", module)
+    monkeypatch.setattr(repo_cache, "resolve_commit_sha", lambda url, token: "abc123")
+
+    async def fake_call_ai_api(prompt):
+        return "Where is the app?"
+
+    monkeypatch.setattr(activities, "call_ai_api_async", fake_call_ai_api)
+    return calls
+
+
+def test_repeat_run_skips_remote_calls(fake_remote: List[str]) -> None:
+    """A second run against the same commit is served from the cache."""
+    workflow_input = WorkflowInput(
+        prd_content="PRD", tech_spec_content="", repo_url=REPO_URL
+    )
+
+    first = asyncio.run(activities.get_codebase_context(workflow_input))
+    second = asyncio.run(activities.get_codebase_context(workflow_input))
+
+    assert first == second == "### Q1: Where is the app?\n\nThe app lives in src/app.py"
+    assert fake_remote == ["list_tree", "ask"]
+
+
+def test_refresh_repo_context_bypasses_cache(fake_remote: List[str]) -> None:
+    """refresh_repo_context queries the repository even when a cache entry exists."""
+    workflow_input = WorkflowInput(
+        prd_content="PRD", tech_spec_content="", repo_url=REPO_URL
+    )
+    asyncio.run(activities.get_codebase_context(workflow_input))
+
+    workflow_input.refresh_repo_context = True
+    asyncio.run(activities.get_codebase_context(workflow_input))
+
+    assert fake_remote == ["list_tree", "ask", "list_tree", "ask"]
+
+
+def test_digest_is_cached_next_to_raw_context(
+    fake_remote: List[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Long context is compacted once and the digest is reused on repeat runs."""
+    monkeypatch.setenv("STORYMACHINE_REPO_CONTEXT_MAX_CHARS", "40")
+    compactions: List[str] = []
+
+    async def fake_compact(repo_context: str, max_chars: int) -> str:
+        compactions.append(repo_context)
+        return "digest"
+
+    monkeypatch.setattr(activities, "compact_repo_context", fake_compact)
+    workflow_input = WorkflowInput(
+        prd_content="PRD", tech_spec_content="", repo_url=REPO_URL
+    )
+
+    first = asyncio.run(activities.get_codebase_context(workflow_input))
+    second = asyncio.run(activities.get_codebase_context(workflow_input))
+
+    assert first == second == "digest"
+    assert compactions == ["### Q1: Where is the app?\n\nThe app lives in src/app.py"]
+
+
+def test_token_is_passed_to_git_outside_argv(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The token reaches git as a host-scoped header, never on the command line."""
+    calls = []
+    run = subprocess.run
+
+    def fake_run(args, **kwargs):
+        calls.append((args, kwargs["env"]))
+        return subprocess.CompletedProcess(args, 0, stdout="abc123\tHEAD\n")
+
+    monkeypatch.setattr(repo_cache.subprocess, "run", fake_run)
+
+    assert repo_cache.resolve_commit_sha(REPO_URL, "secret-token") == "abc123"
+    args, env = calls[0]
+    assert args == ["git", "ls-remote", REPO_URL, "HEAD"]
+    assert not any("secret-token" in arg for arg in args)
+
+    # git applies the header to the repository's host only
+    header = run(
+        ["git", "config", "--get-urlmatch", "http.extraHeader", REPO_URL],
+        capture_output=True,
+        text=True,
+        env=env,
+    ).stdout.strip()
+    basic = base64.b64encode(b"x-access-token:secret-token").decode("ascii")
+    assert header == f"Authorization: Basic {basic}"
+    elsewhere = run(
+        ["git", "config", "--get-urlmatch", "http.extraHeader", "https://example.com/"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert elsewhere.stdout == ""
+
+
+def test_context_with_unanswered_questions_is_not_cached(
+    fake_remote: List[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A run that missed answers doesn't leave its gaps for later runs."""
+    module = sys.modules["ask_github"]
+    answer = module.ask  # pyright: ignore[reportAttributeAccessIssue]
+
+    def failing_ask(repo_url, prompt, token=None, max_iterations=100):
+        fake_remote.append("ask")
+        raise RuntimeError("rate limited")
+
+    monkeypatch.setattr(module, "ask", failing_ask)
+    workflow_input = WorkflowInput(
+        prd_content="PRD", tech_spec_content="", repo_url=REPO_URL
+    )
+    first = asyncio.run(activities.get_codebase_context(workflow_input))
+    monkeypatch.setattr(module, "ask", answer)
+    second = asyncio.run(activities.get_codebase_context(workflow_input))
+
+    assert NO_ANSWER in first
+    assert second.endswith("The app lives in src/app.py")
+    assert fake_remote == ["list_tree", "ask", "ask"]
@@ -0,0 +1,42 @@
+"""Tests for repo_digest module."""
+
+from storymachine.repo_digest import (
+    TRUNCATION_MARKER,
+    deduplicate_context,
+    truncate_context,
+)
+
+
+def test_deduplicate_context_drops_repeated_paragraphs_and_lines() -> None:
+    """Repeats across answers are removed; short lines like braces are kept."""
+    text = """### Q1: Where is auth?
+
+Auth lives in services/auth/login.py.
+}
+
+### Q2: How are sessions stored?
+
+Auth lives in services/auth/login.py.
+Sessions are stored in Redis with a 24h TTL.
+}
+
+Sessions are stored in Redis with a 24h TTL."""
+
+    assert deduplicate_context(text) == (
+        "### Q1: Where is auth?\n\n"
+        "Auth lives in services/auth/login.py.\n}\n\n"
+        "### Q2: How are sessions stored?\n\n"
+        "Sessions are stored in Redis with a 24h TTL.\n}"
+    )
+
+
+def test_truncate_context_cuts_at_line_boundary() -> None:
+    """Text over the cap is cut at a newline and marked as truncated."""
+    text = "\n".join(f"- fact {i}" for i in range(100))
+
+    truncated = truncate_context(text, 100)
+
+    assert len(truncated) <= 100
+    assert truncated.endswith(TRUNCATION_MARKER)
+    assert truncated.split("\n")[-2].startswith("- fact")
+    assert truncate_context("short", 100) == "short"
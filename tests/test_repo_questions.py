@@ -0,0 +1,97 @@
+"""Tests for repo_questions module."""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List
+
+from storymachine.repo_questions import (
+    NO_ANSWER,
+    answer_questions,
+    merge_answers,
+    run_blocking,
+    split_questions,
+)
+
+
+def test_split_questions_handles_numbered_and_bulleted_lists() -> None:
+    """List items become questions; continuation lines and sub-items stay attached."""
+    text = """## Authentication
+1. Where is the login handler defined?
+   - Which framework does it use?
+2) How are sessions
+stored?
+
+## Data
+- What does the users table look like?
+"""
+
+    assert split_questions(text) == [
+        "Where is the login handler defined? - Which framework does it use?",
+        "How are sessions stored?",
+        "What does the users table look like?",
+    ]
+
+
+def test_split_questions_without_list_keeps_text() -> None:
+    """Free-form text is answered as a single question."""
+    assert split_questions("How is auth done?\n") == ["How is auth done?"]
+
+
+def test_answer_questions_runs_concurrently_within_limit() -> None:
+    """Questions run in parallel up to the limit and keep their order."""
+    in_flight: List[int] = []
+    peak: List[int] = [0]
+
+    async def answer_one(question: str) -> str:
+        in_flight.append(1)
+        peak[0] = max(peak[0], len(in_flight))
+        await asyncio.sleep(0.05)
+        in_flight.pop()
+        return question.upper()
+
+    questions = [f"q{i}" for i in range(6)]
+    answers = asyncio.run(answer_questions(questions, answer_one, 3, timeout=5))
+
+    assert answers == [q.upper() for q in questions]
+    assert peak[0] == 3
+
+
+def test_answer_questions_isolates_failures_and_timeouts() -> None:
+    """A failing or slow question doesn't lose the other answers."""
+
+    async def answer_one(question: str) -> str:
+        if question == "fails":
+            raise RuntimeError("boom")
+        if question == "slow":
+            await asyncio.sleep(0.5)
+        return "ok"
+
+    answers = asyncio.run(
+        answer_questions(["fails", "slow", "fast"], answer_one, 3, timeout=0.1)
+    )
+
+    assert answers == [NO_ANSWER, NO_ANSWER, "ok"]
+    assert merge_answers(["fast"], ["ok\n"]) == "### Q1: fast\n\nok"
+
+
+def test_blocking_question_keeps_its_slot_past_the_budget() -> None:
+    """A thread that outlives its budget still counts against the limit."""
+    executor = ThreadPoolExecutor(max_workers=2)
+    events: List[str] = []
+
+    def ask(question: str) -> str:
+        events.append(f"start {question}")
+        time.sleep(0.2)
+        events.append(f"end {question}")
+        return question
+
+    async def answer_one(question: str) -> str:
+        return await run_blocking(executor, partial(ask, question))
+
+    answers = asyncio.run(answer_questions(["a", "b"], answer_one, 1, timeout=0.05))
+    executor.shutdown(wait=True)
+
+    assert answers == [NO_ANSWER, NO_ANSWER]
+    assert events == ["start a", "end a", "start b", "end b"]
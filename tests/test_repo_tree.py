@@ -0,0 +1,61 @@
+"""Tests for repo_tree module."""
+
+from storymachine.repo_tree import render_tree
+from storymachine.tokens import estimate_tokens
+
+
+def test_shared_directories_appear_once() -> None:
+    """Paths are rendered as an indented trie with single-child chains collapsed."""
+    paths = [
+        "README.md",
+        "src/storymachine/cli.py",
+        "src/storymachine/prompts/a.md",
+        "tests/test_cli.py",
+    ]
+
+    assert render_tree(paths).split("\n") == [
+        "src/storymachine/",
+        "  prompts/",
+        "    a.md",
+        "  cli.py",
+        "tests/",
+        "  test_cli.py",
+        "README.md",
+    ]
+
+
+def test_large_directories_are_summarised() -> None:
+    """A directory with many files is shown as counts per extension."""
+    paths = [f"assets/img{i}.png" for i in range(30)] + [
+        f"assets/doc{i}.md" for i in range(5)
+    ]
+
+    assert render_tree(paths, max_files_per_dir=10) == (
+        "assets/\n  [35 files: 30 .png, 5 .md]"
+    )
+
+
+def test_output_fits_token_budget_by_limiting_depth() -> None:
+    """Deep levels are summarised so the rendering stays within the budget."""
+    paths = [
+        f"services/svc{s}/src/module{m}/file{f}.py"
+        for s in range(20)
+        for m in range(20)
+        for f in range(5)
+    ]
+
+    text = render_tree(paths, token_budget=500)
+
+    assert estimate_tokens(text) <= 500
+    assert "services/" in text
+    assert "svc0/src/ [100 files: 100 .py]" in text
+
+
+def test_oversized_top_level_is_truncated() -> None:
+    """When even the top level doesn't fit, the tail is replaced by a marker."""
+    paths = [f"file{i}.txt" for i in range(1000)]
+
+    text = render_tree(paths, token_budget=50, max_files_per_dir=10_000)
+
+    assert text.endswith("more entries]")
+    assert len(text.split("\n")) < 100
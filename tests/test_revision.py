@@ -0,0 +1,167 @@
+"""Tests for revision module."""
+
+import asyncio
+import json
+
+from storymachine import activities
+from storymachine.revision import (
+    ALL_STAGES,
+    CONTEXT,
+    CRITERIA,
+    affected_stories,
+    apply_operations,
+    parse_operations,
+    revision_stages,
+)
+from storymachine.types import Story
+
+STORIES = [
+    Story("[S] 作为用户，我希望注册账号，以便使用系统", ["填写邮箱"], "ctx1"),
+    Story("[M] 作为用户，我希望登录系统，以便访问数据", ["输入密码"], "ctx2"),
+    Story("[S] As an admin, I want to export reports", ["CSV"], "ctx3"),
+    Story("[L] As an admin, I want audit logs", ["Searchable"], "ctx4"),
+]
+
+
+def test_affected_stories_by_number_and_title() -> None:
+    """Numbers, ranges and title words select the stories a comment touches."""
+    assert affected_stories("合并第3个和第4个", STORIES) == [2, 3]
+    assert affected_stories("split 1-2", STORIES) == [0, 1]
+    assert affected_stories("the export reports story is too big", STORIES) == [2]
+    assert affected_stories("登录系统需要支持短信验证码", STORIES) == [1]
+    assert affected_stories("整体语气更正式一些", STORIES) == []
+    assert affected_stories("merge 3 and 4", STORIES) == [2, 3]
+    assert affected_stories("把1和2合并", STORIES) == [0, 1]
+    assert affected_stories("stories 2 and 4 overlap", STORIES) == [1, 3]
+
+
+def test_affected_stories_ignores_quantities() -> None:
+    """Numbers that count something are not story references."""
+    assert affected_stories("Support up to 3 languages and 100 users", STORIES) == []
+    assert affected_stories("需要支持2种登录方式", STORIES) == []
+    assert affected_stories("cache for 1.5 hours at 4% load", STORIES) == []
+
+
+def test_apply_operations_uses_original_numbers() -> None:
+    """Operations refer to the list before the revision."""
+    revised = apply_operations(
+        STORIES,
+        [
+            {
+                "op": "modify",
+                "number": 3,
+                "title": "[M] Export and audit",
+                "acceptance_criteria": ["CSV", "Log"],
+            },
+            {"op": "remove", "number": 4},
+            {
+                "op": "add",
+                "after": 0,
+                "title": "[XS] Landing page",
+                "acceptance_criteria": ["Loads"],
+            },
+            {"op": "order", "numbers": [2, 1, 3, 4]},
+            {"op": "remove", "number": 9},
+        ],
+    )
+
+    assert [s.title for s in revised] == [
+        "[XS] Landing page",
+        STORIES[1].title,
+        STORIES[0].title,
+        "[M] Export and audit",
+    ]
+    # A modified story may have absorbed others, so its old context is dropped
+    assert revised[3].enriched_context is None
+    assert revised[2].enriched_context == "ctx1"
+
+
+def test_parse_operations_rejects_other_replies() -> None:
+    """Replies without an operation list can't be applied."""
+    assert parse_operations(
+        '```json\n{"operations": [{"op": "remove", "number": 1}]}\n```'
+    ) == [{"op": "remove", "number": 1}]
+    assert parse_operations('{"stories": []}') is None
+    assert parse_operations("not json") is None
+
+
+def test_revision_stages_from_prefix_or_wording() -> None:
+    """Comments go to the stage they concern; an explicit prefix wins."""
+    assert revision_stages("ac: split it") == (frozenset({CRITERIA}), "split it")
+    assert revision_stages("上下文：补充接口说明") == (
+        frozenset({CONTEXT}),
+        "补充接口说明",
+    )
+    assert revision_stages("Note: too vague")[0] == ALL_STAGES
+    assert revision_stages("第2条验收标准不可测试")[0] == {CRITERIA}
+    assert revision_stages("add background on the auth module")[0] == {CONTEXT}
+    assert revision_stages("the criteria miss the context limits")[0] == ALL_STAGES
+    assert revision_stages("不够好")[0] == ALL_STAGES
+
+
+def test_revision_stages_ignores_incidental_words() -> None:
+    """Words that merely occur in a comment don't narrow it to one stage."""
+    for comment in [
+        "This story should be split, then we can estimate it",
+        "Given the deadline, drop the export part",
+        "The title is fine but the code and API changes are missing",
+        "mention the files in the auth module",
+        "标题太长，代码部分也要说明",
+        "第2条写得不清楚",
+    ]:
+        assert revision_stages(comment) == (ALL_STAGES, comment)
+
+
+def test_revision_sends_only_affected_stories(monkeypatch) -> None:
+    """Unaffected stories are sent as an index and kept verbatim."""
+    prompts = []
+
+    async def fake_call(prompt, tools=None, with_history=True):
+        prompts.append(prompt)
+        return json.dumps(
+            {
+                "operations": [
+                    {
+                        "op": "modify",
+                        "number": 4,
+                        "title": "[M] As an admin, I want audit logs",
+                        "acceptance_criteria": ["Exportable"],
+                    }
+                ]
+            }
+        )
+
+    monkeypatch.setattr(activities, "call_ai_api_async", fake_call)
+
+    revised = asyncio.run(
+        activities.problem_break_down(None, STORIES, comments="Story 4 is smaller")  # type: ignore[arg-type]
+    )
+
+    assert len(prompts) == 1
+    assert '"number": 4' in prompts[0]
+    assert "Searchable" in prompts[0]
+    assert "CSV" not in prompts[0]
+    assert "3. [S] As an admin, I want to export reports" in prompts[0]
+    assert revised[:3] == STORIES[:3]
+    assert revised[3].acceptance_criteria == ["Exportable"]
+
+
+def test_revision_falls_back_to_full_regeneration(monkeypatch) -> None:
+    """An unusable revision reply regenerates the whole list."""
+    replies = iter(
+        [
+            "sorry",
+            json.dumps({"stories": [{"title": "New", "acceptance_criteria": []}]}),
+        ]
+    )
+
+    async def fake_call(prompt, tools=None, with_history=True):
+        return next(replies)
+
+    monkeypatch.setattr(activities, "call_ai_api_async", fake_call)
+
+    revised = asyncio.run(
+        activities.problem_break_down(None, STORIES, comments="redo")  # type: ignore[arg-type]
+    )
+
+    assert [s.title for s in revised] == ["New"]
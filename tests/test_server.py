@@ -0,0 +1,124 @@
+"""Tests for server module."""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from storymachine import workflow  # noqa: E402
+from storymachine.jobs import JobManager  # noqa: E402
+from storymachine.server import create_app  # noqa: E402
+from storymachine.types import Story  # noqa: E402
+
+
+def test_submit_poll_and_cancel(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A submitted job can be polled for its stories; unknown jobs are 404."""
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        return [Story("Login", [])]
+
+    async def fake_criteria(story, comments=""):
+        return Story(story.title, ["AC"])
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        return story
+
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", fake_criteria)
+    monkeypatch.setattr(workflow, "enrich_context", fake_enrich)
+
+    with TestClient(create_app(JobManager(max_running=2), warm=False)) as client:
+        response = client.post("/jobs", json={"prd_content": "PRD"})
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+
+        for _ in range(100):
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] == "succeeded":
+                break
+            time.sleep(0.01)
+        assert job["status"] == "succeeded"
+        assert job["stories"][0]["acceptance_criteria"] == ["AC"]
+
+        assert [j["id"] for j in client.get("/jobs").json()] == [job_id]
+        assert client.delete(f"/jobs/{job_id}").json()["status"] == "succeeded"
+        assert client.get("/jobs/missing").status_code == 404
+        assert client.post("/jobs", json={"prd_content": " "}).status_code == 422
+
+        scrape = client.get("/metrics")
+        assert scrape.headers["content-type"].startswith("text/plain")
+        assert 'storymachine_queue_depth{priority="normal"} 0' in scrape.text
+        assert 'storymachine_active_workflows{workflow="auto"} 0' in scrape.text
+
+
+def test_jobs_only_take_remote_repositories(
+    monkeypatch: pytest.MonkeyPatch, tmp_path
+) -> None:
+    """A path as repo_url is refused unless it lies under an allowed root."""
+    submitted = []
+
+    def fake_submit(self, workflow_input, interactive=False):
+        submitted.append(workflow_input.repo_url)
+        return SimpleNamespace(to_dict=lambda: {})
+
+    def status(client, repo_url: str) -> int:
+        body = {"prd_content": "PRD", "repo_url": repo_url}
+        return client.post("/jobs", json=body).status_code
+
+    monkeypatch.setattr(JobManager, "submit", fake_submit)
+    with TestClient(create_app(JobManager(), warm=False)) as client:
+        for repo_url in ("/etc", "~", "file:///etc", str(tmp_path)):
+            assert status(client, repo_url) == 422
+        assert status(client, "https://github.com/owner/repo") == 202
+
+    monkeypatch.setenv("STORYMACHINE_SERVER_LOCAL_REPO_ROOTS", str(tmp_path))
+    with TestClient(create_app(JobManager(), warm=False)) as client:
+        assert status(client, str(tmp_path)) == 202
+        assert status(client, "/etc") == 422
+
+    assert submitted == ["https://github.com/owner/repo", str(tmp_path.resolve())]
+
+
+def test_events_websocket_drives_an_interactive_job(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Reviews of an interactive job are answered over the events socket."""
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        return [Story("Login", [])]
+
+    async def fake_criteria(story, comments=""):
+        return Story(story.title, ["AC"])
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        return story
+
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", fake_criteria)
+    monkeypatch.setattr(workflow, "enrich_context", fake_enrich)
+
+    with TestClient(create_app(JobManager(max_running=2), warm=False)) as client:
+        job_id = client.post(
+            "/jobs", json={"prd_content": "PRD", "interactive": True}
+        ).json()["id"]
+
+        types = []
+        with client.websocket_connect(f"/jobs/{job_id}/events") as websocket:
+            while True:
+                event = websocket.receive_json()
+                types.append(event["type"])
+                if event["type"] == "review":
+                    websocket.send_json(
+                        {"type": "feedback", "key": event["key"], "approved": True}
+                    )
+                if event["type"] == "end":
+                    assert event["status"] == "succeeded"
+                    break
+
+        assert types.count("review") == 2
+        assert client.get(f"/jobs/{job_id}").json()["completed"] == 1
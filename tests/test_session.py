@@ -0,0 +1,68 @@
+"""Tests for session module."""
+
+import asyncio
+from typing import List
+
+import pytest
+
+from storymachine import workflow
+from storymachine.config import Settings
+from storymachine.session import Session, current_session, get_settings
+from storymachine.types import Story, WorkflowInput
+
+
+def test_concurrent_sessions_share_no_state(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Hundreds of runs on one loop each see only their own input and settings."""
+    seen: List[tuple] = []
+
+    async def fake_context(workflow_input):
+        await asyncio.sleep(0.01)
+        return f"context for {workflow_input.prd_content}"
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        await asyncio.sleep(0)
+        return [Story(title=workflow_input.prd_content, acceptance_criteria=[])]
+
+    async def fake_criteria(story, comments=""):
+        await asyncio.sleep(0)
+        return story
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        await asyncio.sleep(0)
+        session = current_session()
+        assert session is not None
+        seen.append((story.title, workflow_input.repo_context, get_settings().model))
+        return story
+
+    monkeypatch.setattr(workflow, "get_codebase_context", fake_context)
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", fake_criteria)
+    monkeypatch.setattr(workflow, "enrich_context", fake_enrich)
+
+    base = Settings()  # pyright: ignore[reportCallIssue]
+    inputs = [
+        WorkflowInput(f"PRD {i}", "", "https://example.com/repo") for i in range(200)
+    ]
+    sessions = [
+        Session.create(
+            workflow_input, settings=base.model_copy(update={"model": f"model {i}"})
+        )
+        for i, workflow_input in enumerate(inputs)
+    ]
+
+    async def run():
+        await asyncio.gather(
+            *(
+                workflow.generate_stories_auto(session.workflow_input, session=session)
+                for session in sessions
+            )
+        )
+
+    asyncio.run(run())
+
+    assert sorted(seen) == sorted(
+        (f"PRD {i}", f"context for PRD {i}", f"model {i}") for i in range(200)
+    )
+    # The callers' inputs are left as they were
+    assert all(workflow_input.repo_context is None for workflow_input in inputs)
+    assert current_session() is None
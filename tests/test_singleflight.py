@@ -0,0 +1,140 @@
+"""Tests for singleflight module."""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from storymachine import ai
+from storymachine.singleflight import SingleFlight
+
+
+def test_threads_and_tasks_share_one_call() -> None:
+    """Callers on threads and on an event loop all get the one call's result."""
+    flights = SingleFlight()
+    release = threading.Event()
+    calls: List[str] = []
+
+    def slow() -> str:
+        calls.append("sync")
+        release.wait(5)
+        return "response"
+
+    async def fast() -> str:
+        calls.append("async")
+        return "other"
+
+    results: List[str] = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("k", slow)))
+    leader.start()
+    while not calls:
+        time.sleep(0.001)
+    followers = [
+        threading.Thread(target=lambda: results.append(flights.do("k", slow)))
+        for _ in range(3)
+    ]
+    for follower in followers:
+        follower.start()
+
+    async def tasks():
+        waiting = [asyncio.ensure_future(flights.do_async("k", fast)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*waiting)
+
+    results.extend(asyncio.run(tasks()))
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert calls == ["sync"]
+    assert results == ["response"] * 6
+    assert flights.stats() == {"calls": 1, "coalesced": 5}
+    # Nothing is cached once the call is over
+    assert asyncio.run(flights.do_async("k", fast)) == "other"
+
+
+def test_errors_are_shared_but_cancellation_is_not() -> None:
+    flights = SingleFlight()
+
+    async def run():
+        started = asyncio.Event()
+        attempts: List[int] = []
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("rate limited")
+
+        results = await asyncio.gather(
+            flights.do_async("error", failing),
+            flights.do_async("error", failing),
+            return_exceptions=True,
+        )
+        assert [str(r) for r in results] == ["rate limited", "rate limited"]
+
+        async def hanging():
+            attempts.append(1)
+            started.set()
+            if len(attempts) == 1:
+                await asyncio.Event().wait()
+            return "second try"
+
+        leader = asyncio.ensure_future(flights.do_async("cancel", hanging))
+        await started.wait()
+        follower = asyncio.ensure_future(flights.do_async("cancel", hanging))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        # The follower makes its own call instead of failing with the leader
+        assert await follower == "second try"
+        assert len(attempts) == 2
+
+        async def timing_out():
+            attempts.append(1)
+            if len(attempts) == 3:
+                await asyncio.sleep(0.02)
+                raise TimeoutError("leader's deadline")
+            return "in time"
+
+        results = await asyncio.gather(
+            flights.do_async("timeout", timing_out),
+            flights.do_async("timeout", timing_out),
+            return_exceptions=True,
+        )
+        assert isinstance(results[0], TimeoutError) and results[1] == "in time"
+
+    asyncio.run(run())
+
+
+def test_call_ai_api_async_coalesces_identical_requests(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Concurrent identical prompts reach the provider once; others don't wait."""
+    prompts: List[str] = []
+
+    async def call_api_async(prompt, tools, history):
+        prompts.append(prompt)
+        await asyncio.sleep(0.02)
+        return f"reply to {prompt}"
+
+    monkeypatch.setattr(
+        ai, "_provider", lambda: SimpleNamespace(call_api_async=call_api_async)
+    )
+    monkeypatch.setattr(ai, "_flights", SingleFlight())
+
+    async def run():
+        return await asyncio.gather(
+            ai.call_ai_api_async("PRD"),
+            ai.call_ai_api_async("PRD"),
+            ai.call_ai_api_async("other"),
+        )
+
+    assert asyncio.run(run()) == ["reply to PRD", "reply to PRD", "reply to other"]
+    assert sorted(prompts) == ["PRD", "other"]
+    assert ai.coalescing_stats() == {"calls": 2, "coalesced": 1}
+
+    monkeypatch.setenv("STORYMACHINE_COALESCE_REQUESTS", "false")
+    prompts.clear()
+    asyncio.run(run())
+    assert sorted(prompts) == ["PRD", "PRD", "other"]
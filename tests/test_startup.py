@@ -0,0 +1,75 @@
+"""Tests for CLI startup cost."""
+
+import os
+import subprocess
+import sys
+import time
+
+# Generous enough for a cold CI runner, far below the cost of importing the SDKs
+STARTUP_BUDGET_SECONDS = 1.5
+
+HEAVY_MODULES = ("openai", "zhipuai", "structlog")
+
+
+def _run_python(*args: str) -> subprocess.CompletedProcess[str]:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.run(
+        [sys.executable, *args],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+
+def test_cli_import_does_not_load_provider_sdks() -> None:
+    """Importing the CLI must not import provider SDKs or structlog."""
+    result = _run_python(
+        "-c",
+        "import sys, storymachine.cli; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))",
+    )
+
+    assert result.stdout.strip() == ""
+
+
+def test_cli_help_does_not_open_log_file(tmp_path) -> None:
+    """Running --help must not configure logging or create the log file."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.run(
+        [sys.executable, "-m", "storymachine.cli", "--help"],
+        capture_output=True,
+        cwd=tmp_path,
+        env=env,
+        check=True,
+    )
+
+    assert not (tmp_path / "storymachine.log").exists()
+
+
+def test_cli_help_within_startup_budget() -> None:
+    """`storymachine --help` must start within the startup budget."""
+    # Warm the filesystem and bytecode caches so we measure startup, not disk
+    _run_python("-m", "storymachine.cli", "--help")
+
+    start = time.perf_counter()
+    result = _run_python("-m", "storymachine.cli", "--help")
+    duration = time.perf_counter() - start
+
+    assert "--prd" in result.stdout
+    assert duration < STARTUP_BUDGET_SECONDS, (
+        f"--help took {duration:.2f}s (budget {STARTUP_BUDGET_SECONDS}s)"
+    )
+
+
+def test_only_selected_provider_is_imported() -> None:
+    """call_ai_api imports only the provider selected in Settings.api_provider."""
+    result = _run_python(
+        "-c",
+        "import sys\n"
+        "from storymachine.ai import get_provider\n"
+        "get_provider('zhipuai')\n"
+        "print('openai' in sys.modules, 'zhipuai' in sys.modules)",
+    )
+
+    assert result.stdout.split() == ["False", "True"]
@@ -0,0 +1,56 @@
+"""Tests for story_output module."""
+
+import io
+import json
+
+import pytest
+
+from storymachine.story_output import StoryWriter, format_stories_text
+from storymachine.types import Story
+
+STORY = Story("Login", ["Accepts email", "Rejects bad password"], "Uses auth.py\n\n")
+
+
+def test_jsonl_writes_one_record_per_story() -> None:
+    """Each story is a complete JSON line as soon as it is written."""
+    stream = io.StringIO()
+    writer = StoryWriter(stream, "jsonl")
+    writer.begin(2)
+    writer.write(2, STORY)
+
+    assert json.loads(stream.getvalue()) == {
+        "number": 2,
+        "title": "Login",
+        "acceptance_criteria": ["Accepts email", "Rejects bad password"],
+        "enriched_context": "Uses auth.py\n\n",
+    }
+
+
+def test_json_is_an_array_once_finished() -> None:
+    """JSON output is a valid array after end()."""
+    stream = io.StringIO()
+    writer = StoryWriter(stream, "json")
+    writer.begin(2)
+    writer.write(1, STORY)
+    writer.write(2, STORY)
+    writer.end()
+
+    assert [r["number"] for r in json.loads(stream.getvalue())] == [1, 2]
+
+
+def test_text_matches_whole_list_format() -> None:
+    """Streaming text output is the same as formatting the finished list."""
+    stream = io.StringIO()
+    writer = StoryWriter(stream, "text")
+    writer.begin(1)
+    writer.write(1, STORY)
+    writer.end()
+
+    assert stream.getvalue() == format_stories_text([STORY])
+    assert "     Uses auth.py\n" in stream.getvalue()
+
+
+def test_unknown_format_is_rejected() -> None:
+    """Only the supported formats are accepted."""
+    with pytest.raises(ValueError, match="Unknown output format"):
+        StoryWriter(io.StringIO(), "yaml")
@@ -0,0 +1,150 @@
+"""Tests for worker module."""
+
+import asyncio
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from storymachine import workflow
+from storymachine.config import Settings
+from storymachine.job_queue import FAILED, SUCCEEDED, JobQueue, Priority
+from storymachine.types import Story, WorkflowInput
+from storymachine.worker import Worker
+
+
+@pytest.fixture
+def settings(monkeypatch: pytest.MonkeyPatch) -> Settings:
+    # Heartbeats every 0.1s
+    monkeypatch.setenv("STORYMACHINE_QUEUE_VISIBILITY_TIMEOUT", "0.3")
+    return Settings()  # pyright: ignore[reportCallIssue]
+
+
+@pytest.fixture
+def queue(tmp_path: Path) -> JobQueue:
+    return JobQueue(tmp_path / "queue.db", retry_backoff=0, preempt_after=0)
+
+
+async def _run_until(worker: Worker, done) -> None:
+    stop = asyncio.Event()
+    running = asyncio.create_task(worker.run(stop))
+    for _ in range(500):
+        if done():
+            break
+        await asyncio.sleep(0.01)
+    stop.set()
+    await running
+
+
+def test_worker_runs_jobs_and_retries_failures(
+    monkeypatch: pytest.MonkeyPatch, queue: JobQueue, settings: Settings
+) -> None:
+    attempts: List[str] = []
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        attempts.append(workflow_input.prd_content)
+        if workflow_input.prd_content == "broken":
+            raise RuntimeError("model unavailable")
+        if attempts.count("flaky") == 1 and workflow_input.prd_content == "flaky":
+            raise RuntimeError("rate limited")
+        return [Story(workflow_input.prd_content, [])]
+
+    async def fake_criteria(story, comments=""):
+        return Story(story.title, ["AC"])
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        return story
+
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", fake_criteria)
+    monkeypatch.setattr(workflow, "enrich_context", fake_enrich)
+
+    ids = [queue.enqueue(WorkflowInput(prd, "", "")) for prd in ("flaky", "broken")]
+    worker = Worker(queue, "w", concurrency=2, settings=settings)
+
+    def done():
+        return all(queue.get(job_id).status in (SUCCEEDED, FAILED) for job_id in ids)  # pyright: ignore[reportOptionalMemberAccess]
+
+    asyncio.run(_run_until(worker, done))
+
+    flaky, broken = (queue.get(job_id) for job_id in ids)
+    assert flaky is not None and broken is not None
+    assert (flaky.status, flaky.attempts) == (SUCCEEDED, 2)
+    assert flaky.result is not None and flaky.result[0]["acceptance_criteria"] == ["AC"]
+    assert (broken.status, broken.attempts) == (FAILED, 3)
+    assert broken.error == "model unavailable"
+
+
+# With a long lease, preemption doesn't wait for the next heartbeat
+@pytest.mark.parametrize("visibility_timeout", ["0.3", "600"])
+def test_interactive_job_preempts_a_running_batch_job(
+    monkeypatch: pytest.MonkeyPatch, queue: JobQueue, visibility_timeout: str
+) -> None:
+    monkeypatch.setenv("STORYMACHINE_QUEUE_VISIBILITY_TIMEOUT", visibility_timeout)
+    monkeypatch.setenv("STORYMACHINE_QUEUE_PREEMPT_AFTER", "0")
+    settings = Settings()  # pyright: ignore[reportCallIssue]
+    finished: List[str] = []
+    started = asyncio.Event()
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        return [Story(workflow_input.prd_content, [])]
+
+    async def fake_criteria(story, comments=""):
+        if story.title == "batch" and not finished:
+            started.set()
+            # Only finishes once the interactive job has run
+            await asyncio.Event().wait()
+        finished.append(story.title)
+        return Story(story.title, ["AC"])
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        return story
+
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", fake_criteria)
+    monkeypatch.setattr(workflow, "enrich_context", fake_enrich)
+
+    batch = queue.enqueue(WorkflowInput("batch", "", ""), Priority.BATCH)
+    worker = Worker(queue, "w", concurrency=1, settings=settings)
+
+    async def run():
+        stop = asyncio.Event()
+        running = asyncio.create_task(worker.run(stop))
+        await asyncio.wait_for(started.wait(), 5)
+        urgent = queue.enqueue(WorkflowInput("urgent", "", ""), Priority.INTERACTIVE)
+        for _ in range(500):
+            if queue.get(batch).status == SUCCEEDED:  # pyright: ignore[reportOptionalMemberAccess]
+                break
+            await asyncio.sleep(0.01)
+        stop.set()
+        await running
+        return urgent
+
+    urgent = asyncio.run(run())
+
+    assert finished == ["urgent", "batch"]
+    job = queue.get(urgent)
+    assert job is not None and job.status == SUCCEEDED
+    batch_job = queue.get(batch)
+    assert batch_job is not None and batch_job.status == SUCCEEDED
+    assert batch_job.attempts == 1
+
+
+def test_stopping_a_worker_releases_its_jobs(
+    monkeypatch: pytest.MonkeyPatch, queue: JobQueue, settings: Settings
+) -> None:
+    started = asyncio.Event()
+
+    async def hung_break_down(workflow_input, stories, comments="", repo_context=""):
+        started.set()
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(workflow, "problem_break_down", hung_break_down)
+    job_id = queue.enqueue(WorkflowInput("PRD", "", ""))
+    worker = Worker(queue, "w", concurrency=1, settings=settings)
+
+    asyncio.run(_run_until(worker, started.is_set))
+
+    job = queue.get(job_id)
+    assert job is not None
+    assert (job.status, job.attempts, job.worker) == ("queued", 0, None)
@@ -0,0 +1,431 @@
+"""Tests for workflow module."""
+
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from storymachine import ai, workflow
+from storymachine.deadline import DeadlineExceeded
+from storymachine.journal import RunJournal
+from storymachine.types import FeedbackResponse, FeedbackStatus, Story, WorkflowInput
+
+
+async def _criteria(story, comments=""):
+    return Story(title=story.title, acceptance_criteria=["AC"])
+
+
+async def _enrich(story, workflow_input, comments=""):
+    return Story(story.title, story.acceptance_criteria, "context")
+
+
+def test_w1_pipeline_drafts_stories_while_context_is_gathered(
+    monkeypatch: pytest.MonkeyPatch, sample_stories: List[Story]
+) -> None:
+    """In pipelined mode the breakdown runs before the context is ready."""
+    breakdown_started = asyncio.Event()
+    enriched_with: List[str] = []
+
+    async def fake_context(workflow_input):
+        # Only finishes once the breakdown has started, so a sequential
+        # workflow would time out here
+        await asyncio.wait_for(breakdown_started.wait(), 5)
+        return "REPO CONTEXT"
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        breakdown_started.set()
+        return [Story(title=s.title, acceptance_criteria=[]) for s in sample_stories]
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        enriched_with.append(workflow_input.repo_context)
+        return Story(story.title, story.acceptance_criteria, "context")
+
+    monkeypatch.setattr(workflow, "get_codebase_context", fake_context)
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", _criteria)
+    monkeypatch.setattr(workflow, "enrich_context", fake_enrich)
+    monkeypatch.setattr(
+        workflow,
+        "get_human_input",
+        lambda: FeedbackResponse(status=FeedbackStatus.ACCEPTED),
+    )
+
+    workflow_input = WorkflowInput(
+        prd_content="PRD",
+        tech_spec_content="",
+        repo_url="https://github.com/org/repo",
+        pipeline=True,
+    )
+    stories = asyncio.run(workflow.w1(workflow_input))
+
+    assert len(stories) == len(sample_stories)
+    assert enriched_with == ["REPO CONTEXT"] * len(sample_stories)
+
+
+def test_w1_pipeline_revision_receives_arrived_context(
+    monkeypatch: pytest.MonkeyPatch, sample_stories: List[Story]
+) -> None:
+    """A revision after the context has arrived is given the context."""
+    context_ready = threading.Event()
+    revision_context: List[str] = []
+    answers = [
+        FeedbackResponse(status=FeedbackStatus.REJECTED, comment="More detail"),
+        FeedbackResponse(status=FeedbackStatus.ACCEPTED),
+    ]
+
+    async def fake_context(workflow_input):
+        context_ready.set()
+        return "REPO CONTEXT"
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        revision_context.append(repo_context)
+        return [Story(title=s.title, acceptance_criteria=[]) for s in sample_stories]
+
+    def fake_human_input():
+        if not answers:
+            return FeedbackResponse(status=FeedbackStatus.ACCEPTED)
+        if answers[0].status == FeedbackStatus.REJECTED:
+            # Give the finished context task time to be marked done
+            context_ready.wait(5)
+            time.sleep(0.2)
+        return answers.pop(0)
+
+    monkeypatch.setattr(workflow, "get_codebase_context", fake_context)
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", _criteria)
+    monkeypatch.setattr(workflow, "enrich_context", _enrich)
+    monkeypatch.setattr(workflow, "get_human_input", fake_human_input)
+
+    workflow_input = WorkflowInput(
+        prd_content="PRD",
+        tech_spec_content="",
+        repo_url="https://github.com/org/repo",
+        pipeline=True,
+    )
+    asyncio.run(workflow.w1(workflow_input))
+
+    assert revision_context[0] == ""
+    assert revision_context[1] == "REPO CONTEXT"
+
+
+def test_w1_details_stories_while_titles_are_reviewed(
+    monkeypatch: pytest.MonkeyPatch, sample_stories: List[Story]
+) -> None:
+    """Detailing starts during title review and its result is reused."""
+    detailing_started = threading.Event()
+    calls: List[str] = []
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        return [Story(title=s.title, acceptance_criteria=[]) for s in sample_stories]
+
+    async def fake_criteria(story, comments=""):
+        calls.append(f"criteria:{story.title}")
+        detailing_started.set()
+        return Story(title=story.title, acceptance_criteria=["AC"])
+
+    reviews = [0]
+
+    def fake_human_input():
+        reviews[0] += 1
+        if reviews[0] == 1:
+            # Title review: detailing must already be under way
+            assert detailing_started.wait(5)
+        return FeedbackResponse(status=FeedbackStatus.ACCEPTED)
+
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", fake_criteria)
+    monkeypatch.setattr(workflow, "enrich_context", _enrich)
+    monkeypatch.setattr(workflow, "get_human_input", fake_human_input)
+
+    workflow_input = WorkflowInput(prd_content="PRD", tech_spec_content="", repo_url="")
+    stories = asyncio.run(workflow.w1(workflow_input))
+
+    # Each story was detailed exactly once
+    assert sorted(calls) == sorted(f"criteria:{s.title}" for s in sample_stories)
+    assert [s.enriched_context for s in stories] == ["context"] * len(sample_stories)
+
+
+def test_w1_defers_reasoning_of_background_detailing(
+    monkeypatch: pytest.MonkeyPatch,
+    sample_stories: List[Story],
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    """Speculative detailing doesn't print over a prompt; it shows on arrival."""
+    detailed = threading.Event()
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        return [Story(title=s.title, acceptance_criteria=[]) for s in sample_stories]
+
+    async def fake_criteria(story, comments=""):
+        ai.display_reasoning_summaries([f"Thinking about {story.title}"])
+        if story.title == sample_stories[-1].title:
+            detailed.set()
+        return Story(title=story.title, acceptance_criteria=["AC"])
+
+    reviews = [0]
+
+    def fake_human_input():
+        reviews[0] += 1
+        if reviews[0] == 1:
+            assert detailed.wait(5)
+            assert "Thinking about" not in capsys.readouterr().out
+        return FeedbackResponse(status=FeedbackStatus.ACCEPTED)
+
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", fake_criteria)
+    monkeypatch.setattr(workflow, "enrich_context", _enrich)
+    monkeypatch.setattr(workflow, "get_human_input", fake_human_input)
+
+    workflow_input = WorkflowInput(prd_content="PRD", tech_spec_content="", repo_url="")
+    asyncio.run(workflow.w1(workflow_input))
+
+    out = capsys.readouterr().out
+    for story in sample_stories:
+        assert out.count(f"Thinking about {story.title}") == 1
+
+
+def test_w1_discards_speculation_for_rejected_titles(
+    monkeypatch: pytest.MonkeyPatch, sample_stories: List[Story]
+) -> None:
+    """Stories detailed from rejected titles are not shown."""
+    drafts = [["Old A", "Old B"], [s.title for s in sample_stories]]
+    answers = [FeedbackResponse(status=FeedbackStatus.REJECTED, comment="Redo")]
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        return [Story(title=t, acceptance_criteria=[]) for t in drafts.pop(0)]
+
+    def fake_human_input():
+        if answers:
+            # Let the speculative detailing of the first draft finish
+            time.sleep(0.2)
+            return answers.pop(0)
+        return FeedbackResponse(status=FeedbackStatus.ACCEPTED)
+
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", _criteria)
+    monkeypatch.setattr(workflow, "enrich_context", _enrich)
+    monkeypatch.setattr(workflow, "get_human_input", fake_human_input)
+
+    workflow_input = WorkflowInput(prd_content="PRD", tech_spec_content="", repo_url="")
+    stories = asyncio.run(workflow.w1(workflow_input))
+
+    assert [s.title for s in stories] == [s.title for s in sample_stories]
+
+
+def test_w1_forgets_turns_of_discarded_speculation(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Story i of a revised list doesn't get the rejected story i as history."""
+    drafts = [["Old A"], ["New A"]]
+    answers = [FeedbackResponse(status=FeedbackStatus.REJECTED, comment="Redo")]
+    sent: List[tuple] = []
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        return [Story(title=t, acceptance_criteria=[]) for t in drafts.pop(0)]
+
+    async def call_api_async(prompt, tools, history):
+        sent.append((prompt, history))
+        title = "Old A" if "Old A" in prompt else "New A"
+        return json.dumps(
+            {"stories": [{"title": title, "acceptance_criteria": ["AC"]}]}
+        )
+
+    def fake_human_input():
+        if answers:
+            # Let the speculative detailing of the first draft finish
+            time.sleep(0.2)
+            return answers.pop(0)
+        return FeedbackResponse(status=FeedbackStatus.ACCEPTED)
+
+    monkeypatch.setattr(
+        ai, "_provider", lambda: SimpleNamespace(call_api_async=call_api_async)
+    )
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "get_human_input", fake_human_input)
+
+    workflow_input = WorkflowInput(prd_content="PRD", tech_spec_content="", repo_url="")
+    asyncio.run(workflow.w1(workflow_input))
+
+    assert any("Old A" in prompt for prompt, _ in sent)
+    new_calls = [history for prompt, history in sent if "New A" in prompt]
+    assert new_calls and all(history == [] for history in new_calls)
+
+
+def test_w1_routes_story_comments_to_one_stage(
+    monkeypatch: pytest.MonkeyPatch, sample_stories: List[Story]
+) -> None:
+    """A comment about the context reruns only enrichment, keeping the criteria."""
+    monkeypatch.setenv("STORYMACHINE_SPECULATIVE_STORIES", "0")
+    calls: List[str] = []
+    answers = [
+        FeedbackResponse(status=FeedbackStatus.ACCEPTED),
+        FeedbackResponse(
+            status=FeedbackStatus.REJECTED, comment="context: mention auth.py"
+        ),
+    ]
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        return sample_stories[:1]
+
+    async def fake_criteria(story, comments=""):
+        calls.append(f"criteria:{comments}")
+        return Story(title=story.title, acceptance_criteria=[f"AC {len(calls)}"])
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        calls.append(f"enrich:{comments}")
+        if not comments:
+            return Story(story.title, story.acceptance_criteria, "context")
+        # The model may also touch the parts it wasn't asked about
+        return Story("Rewritten title", ["Rewritten AC"], f"context {comments}")
+
+    def fake_human_input():
+        return (
+            answers.pop(0)
+            if answers
+            else FeedbackResponse(status=FeedbackStatus.ACCEPTED)
+        )
+
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", fake_criteria)
+    monkeypatch.setattr(workflow, "enrich_context", fake_enrich)
+    monkeypatch.setattr(workflow, "get_human_input", fake_human_input)
+
+    workflow_input = WorkflowInput(prd_content="PRD", tech_spec_content="", repo_url="")
+    stories = asyncio.run(workflow.w1(workflow_input))
+
+    assert calls == ["criteria:", "enrich:", "enrich:mention auth.py"]
+    assert stories[0] == Story(
+        sample_stories[0].title, ["AC 1"], "context mention auth.py"
+    )
+
+
+def test_w1_runs_concurrently_on_one_loop(
+    monkeypatch: pytest.MonkeyPatch, sample_stories: List[Story]
+) -> None:
+    """Activities are awaitable, so workflows share one event loop."""
+    in_flight: List[int] = []
+    peak = [0]
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        in_flight.append(1)
+        peak[0] = max(peak[0], len(in_flight))
+        await asyncio.sleep(0.05)
+        in_flight.pop()
+        return [Story(title=s.title, acceptance_criteria=[]) for s in sample_stories]
+
+    monkeypatch.setenv("STORYMACHINE_SPECULATIVE_STORIES", "0")
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", _criteria)
+    monkeypatch.setattr(workflow, "enrich_context", _enrich)
+    monkeypatch.setattr(
+        workflow,
+        "get_human_input",
+        lambda: FeedbackResponse(status=FeedbackStatus.ACCEPTED),
+    )
+
+    async def run_both():
+        return await asyncio.gather(
+            *(
+                workflow.w1(
+                    WorkflowInput(prd_content="PRD", tech_spec_content="", repo_url="")
+                )
+                for _ in range(2)
+            )
+        )
+
+    results = asyncio.run(run_both())
+
+    assert peak[0] == 2
+    assert all(len(stories) == len(sample_stories) for stories in results)
+
+
+def test_w1_stage_timeout_cancels_hung_call(
+    monkeypatch: pytest.MonkeyPatch, run_dir
+) -> None:
+    """A hung model call is cancelled once the stage runs out of time."""
+
+    async def hung_break_down(workflow_input, stories, comments="", repo_context=""):
+        await asyncio.sleep(10)
+
+    monkeypatch.setenv("STORYMACHINE_STAGE_TIMEOUT", "0.05")
+    monkeypatch.setattr(workflow, "problem_break_down", hung_break_down)
+
+    workflow_input = WorkflowInput(prd_content="PRD", tech_spec_content="", repo_url="")
+    with pytest.raises(DeadlineExceeded, match="Machining Stories"):
+        asyncio.run(workflow.w1(workflow_input))
+
+
+def test_w1_checkpoints_finished_speculation_on_interrupt(
+    monkeypatch: pytest.MonkeyPatch, run_dir, sample_stories: List[Story]
+) -> None:
+    """Stories detailed ahead are journaled when the run is interrupted."""
+    reviews = [0]
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        return [Story(title=s.title, acceptance_criteria=[]) for s in sample_stories]
+
+    def interrupt_at_first_story():
+        reviews[0] += 1
+        if reviews[0] == 2:
+            # Let the second story's speculative detailing finish first
+            time.sleep(0.2)
+            raise KeyboardInterrupt
+        return FeedbackResponse(status=FeedbackStatus.ACCEPTED)
+
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", _criteria)
+    monkeypatch.setattr(workflow, "enrich_context", _enrich)
+    monkeypatch.setattr(workflow, "get_human_input", interrupt_at_first_story)
+
+    journal = RunJournal.create(run_dir)
+    workflow_input = WorkflowInput(prd_content="PRD", tech_spec_content="", repo_url="")
+    with pytest.raises(KeyboardInterrupt):
+        asyncio.run(workflow.w1(workflow_input, journal))
+
+    assert "story.1.0.enriched" in RunJournal.resume(run_dir, journal.run_id)
+
+
+def test_generate_stories_auto_streams_finished_stories(
+    monkeypatch: pytest.MonkeyPatch, sample_stories: List[Story]
+) -> None:
+    """Each story is written as soon as it is detailed, before slower ones."""
+    first, second = (s.title for s in sample_stories)
+    written: List[str] = []
+
+    async def fake_break_down(workflow_input, stories, comments="", repo_context=""):
+        return [Story(title=s.title, acceptance_criteria=[]) for s in sample_stories]
+
+    async def fake_enrich(story, workflow_input, comments=""):
+        # The first story takes longer than the second
+        await asyncio.sleep(0.1 if story.title == first else 0)
+        return Story(story.title, story.acceptance_criteria, "context")
+
+    class RecordingWriter:
+        def begin(self, count):
+            written.append(f"begin:{count}")
+
+        def write(self, number, story):
+            written.append(f"{number}:{story.title}")
+
+        def end(self):
+            written.append("end")
+
+    monkeypatch.setattr(workflow, "problem_break_down", fake_break_down)
+    monkeypatch.setattr(workflow, "define_acceptance_criteria", _criteria)
+    monkeypatch.setattr(workflow, "enrich_context", fake_enrich)
+
+    workflow_input = WorkflowInput(prd_content="PRD", tech_spec_content="", repo_url="")
+    stories = asyncio.run(
+        workflow.generate_stories_auto(
+            workflow_input,
+            RecordingWriter(),  # pyright: ignore[reportArgumentType]
+        )
+    )
+
+    assert written == ["begin:2", f"2:{second}", f"1:{first}", "end"]
+    assert [s.title for s in stories] == [first, second]
+    assert all(s.enriched_context == "context" for s in stories)